@@ -4,7 +4,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
 import time
-from model.data_processing_L import load_and_clean_data, load_and_clean_data_from_upload, filter_data, calculate_total_revenue, calculate_percentage_change, compare_total_revenue, analyze_seasonality, analyze_country_performance
+from model.data_processing_L import load_and_clean_data, load_and_clean_data_from_upload, load_revenue_cube, filter_cube, calculate_total_revenue, calculate_percentage_change, compare_total_revenue, analyze_seasonality, analyze_country_performance
 from model.analysis_L import *
 from view.plots_L import plot_results, plot_revenue_comparison_ratios
 
@@ -24,9 +24,17 @@ def main():
     try:
         with st.spinner("Đang load và làm sạch dữ liệu..."):
             if data_path.endswith('.csv'):
-                df = load_and_clean_data_from_upload(open(data_path, 'rb'), 'csv')
+                df = load_and_clean_data_from_upload(data_path, 'csv')
             else:
-                df = load_and_clean_data_from_upload(open(data_path, 'rb'), 'excel')
+                # Workbook chỉ được chuyển đổi một lần, hiển thị tiến độ đọc các dòng
+                progress_bar = st.progress(0.0, text="Đang đọc file Excel...")
+                def update_progress(rows_read, total_rows):
+                    if total_rows:
+                        progress_bar.progress(min(rows_read / total_rows, 1.0), text=f"Đã đọc {rows_read:,}/{total_rows:,} dòng")
+                df = load_and_clean_data_from_upload(data_path, 'excel', update_progress)
+                progress_bar.empty()
+            # Khối quốc gia × ngày: đổi khoảng thời gian/quốc gia chỉ cắt khối, không quét lại giao dịch
+            revenue_cube = load_revenue_cube(data_path)
     except Exception as e:
         st.error(f"❌ Lỗi khi đọc file: {str(e)}")
         return
@@ -44,16 +52,16 @@ def main():
     )
     revenue_threshold = st.sidebar.number_input("Ngưỡng doanh thu (£)", min_value=0.0, value=0.0, step=1000.0)
     with st.spinner("Đang lọc dữ liệu..."):
-        df_filtered = filter_data(df, start_date, end_date, selected_countries, revenue_threshold)
-    if df_filtered.empty:
+        cube_filtered = filter_cube(revenue_cube, start_date, end_date, selected_countries, revenue_threshold)
+    if cube_filtered.is_empty:
         st.warning("Không có dữ liệu phù hợp với các tiêu chí đã chọn.")
         return
     with st.spinner("Đang tính toán kết quả..."):
-        pivot_table = calculate_total_revenue(df_filtered)
+        pivot_table = calculate_total_revenue(cube_filtered)
         growth_rate = calculate_percentage_change(pivot_table)
         total_revenue = compare_total_revenue(pivot_table)
-        monthly_revenue, peak_months, quarterly_proportion = analyze_seasonality(df_filtered)
-        country_metrics = analyze_country_performance(df_filtered)
+        monthly_revenue, peak_months, quarterly_proportion = analyze_seasonality(cube_filtered)
+        country_metrics = analyze_country_performance(cube_filtered)
     st.header("Kết quả Phân tích")
     if analysis_type == 'Tổng doanh thu':
         st.subheader("Tổng Doanh thu Theo Thời gian")
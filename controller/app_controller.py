@@ -203,12 +203,45 @@ class AppController:
                     st.session_state['uploaded_file_name'] = uploaded_file.name
                     st.success(f"✅ Đã thay thế file: {uploaded_file.name}")
 
+                # Ghép lô hóa đơn mới (ví dụ file hằng ngày) mà không cần upload lại toàn bộ lịch sử
+                batch_file = st.file_uploader(
+                    "➕ Thêm lô hóa đơn mới",
+                    type=['csv', 'xlsx'],
+                    help="File cùng cấu trúc cột; các dòng trùng hoàn toàn với dữ liệu đã có sẽ được bỏ qua",
+                    key="append_batch_file"
+                )
+                if batch_file is not None:
+                    self._append_batch(batch_file)
+
         # Header thanh ngang để chọn chức năng
         self._display_mode_selection()
 
         # Hiển thị màn hình hướng dẫn, bảng so sánh, ...
         self._display_welcome_screen()
     
+    def _append_batch(self, batch_file):
+        """Ghép một lô hóa đơn vào dataset đang dùng (mỗi file chỉ ghép một lần)"""
+        from model.data_model import DataModel
+        from controller.dol_controller import DolController
+
+        batch_id = (st.session_state.get('uploaded_file_name'), batch_file.name, batch_file.size)
+        appended = st.session_state.setdefault('appended_batches', [])
+        if batch_id in appended:
+            return
+        file_type = 'excel' if batch_file.name.lower().endswith('.xlsx') else 'csv'
+        try:
+            with st.spinner("Đang ghép dữ liệu mới..."):
+                summary = DataModel.append_transactions(st.session_state['uploaded_data_path'], batch_file, file_type)
+            appended.append(batch_id)
+            # Mô hình DOL giữ bản dữ liệu riêng nên cần tạo lại
+            DolController._load_model.clear()
+            st.success(
+                f"✅ Đã ghép {summary['rows_appended']:,} dòng mới từ {batch_file.name} "
+                f"(bỏ qua {summary['duplicates_skipped']:,} dòng trùng)"
+            )
+        except Exception as e:
+            st.error(f"❌ Lỗi khi ghép dữ liệu: {str(e)}")
+    
     def _display_mode_selection(self):
         """Hiển thị thanh ngang để chọn chức năng"""
         st.markdown("""
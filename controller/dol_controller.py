@@ -1,10 +1,12 @@
 import streamlit as st
 import sys
 import os
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from model.decision_model import DecisionModel
+from model.snapshot_cache import source_fingerprint
 from view.dol_view import DolView
 
 class DolController:
@@ -12,7 +14,7 @@ class DolController:
     
     def __init__(self):
         self.view = DolView()
-        self.model = self._load_model()
+        self.model = None
         
         # Initialize session state for DOL
         if 'dol_results_data' not in st.session_state:
@@ -21,9 +23,10 @@ class DolController:
             st.session_state.dol_current_page = "input"
     
     @st.cache_resource
-    def _load_model(_self):
-        """Load the decision model with caching"""
-        return DecisionModel()
+    def _load_model(_self, data_path, fingerprint):
+        """Load the decision model with caching (one per dataset fingerprint)"""
+        # Data loads on a background thread so the input form renders immediately
+        return DecisionModel(data_path, background=True)
     
     def run(self):
         """Main method to run DOL analysis"""
@@ -33,6 +36,8 @@ class DolController:
             st.warning("⚠️ Vui lòng upload file dữ liệu ở dashboard để sử dụng các chức năng phân tích!")
             return
         
+        self.model = self._load_model(data_path, source_fingerprint(data_path))
+        
         # Navigation
         page = self.view.render_navigation(
             st.session_state.dol_current_page,
@@ -51,19 +56,31 @@ class DolController:
     def _show_input_page(self):
         """Display input page for DOL parameters"""
         self.view.render_input_header()
+        loading = not self.model.is_ready
+        
+        if loading:
+            self.view.render_loading_progress(self.model.progress, self.model.status)
+        elif self.model.error:
+            st.error(f"Lỗi khi tải dữ liệu: {self.model.error}")
         
         # Get input data from view
         input_data = self.view.render_input_form(
             available_products=self.model.get_available_products(),
-            available_years=self.model.get_available_years()
+            available_years=self.model.get_available_years(),
+            loading=loading
         )
         
         # Calculate button
-        if self.view.render_calculate_button():
+        if self.view.render_calculate_button(loading=loading):
             if input_data['product_code']:
                 self._calculate_dol(input_data)
             else:
                 st.error("Vui lòng chọn một sản phẩm.")
+        
+        # Poll until the background load finishes, then fill in the product list
+        if loading:
+            time.sleep(0.5)
+            st.rerun()
     
     def _show_results_page(self):
         """Display results page"""
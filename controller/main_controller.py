@@ -28,33 +28,64 @@ class MainController:
     
     def _handle_file_uploaded(self, data_path):
         """Xử lý khi file được upload (data_path)"""
-        time_frame_months = MainPanelComponents.display_time_frame_selector()
-        df_clean = DataModel.load_and_clean_data(data_path, time_frame_months)
-        if df_clean is not None:
-            self._process_data_analysis(df_clean, time_frame_months)
+        # Load & làm sạch một lần; đổi khung thời gian chỉ cắt lại dữ liệu đã sắp theo ngày
+        if DataModel.load_clean_data(data_path) is not None:
+            time_frame_months = MainPanelComponents.display_time_frame_selector()
+            memory_report = DataModel.get_memory_report(data_path)
+            if memory_report is not None:
+                MainPanelComponents.display_memory_usage(memory_report)
+            MainPanelComponents.display_cleaning_report(DataModel.get_cleaning_report(data_path))
+            self._process_data_analysis(data_path, time_frame_months)
     
-    def _process_data_analysis(self, df_clean, time_frame_months):
+    def _process_data_analysis(self, data_path, time_frame_months):
         """Xử lý phân tích dữ liệu"""
-        available_countries = sorted(df_clean['Country'].unique())
+        available_countries = sorted(DataModel.get_revenue_cube(data_path, time_frame_months).active_countries())
         excluded_countries, excluded_products = MainPanelComponents.display_exclusion_lists(available_countries)
         
         self._display_exclusion_info(excluded_countries, excluded_products)
         
-        df_clean = DataModel.filter_excluded_items(df_clean, excluded_countries, excluded_products)
+        # Khung thời gian và loại trừ: lát cắt theo ngày + bitmap theo quốc gia/sản phẩm
+        df_clean = DataModel.apply_time_frame(data_path, time_frame_months, excluded_countries, excluded_products)
+        # Khối quốc gia × ngày cùng khung thời gian và loại trừ: các chỉ số quốc gia chỉ là phép cắt khối
+        revenue_cube = DataModel.get_revenue_cube(data_path, time_frame_months, excluded_countries, excluded_products)
         
-        country_stats = DataModel.get_country_selection_options(df_clean, time_frame_months)
+        customer_counts = DataModel.get_customer_counts(data_path, time_frame_months, excluded_products)
+        country_stats = DataModel.get_country_selection_options(df_clean, time_frame_months, revenue_cube, customer_counts)
         
         country_criteria, num_countries = MainPanelComponents.display_country_selection()
         total_budget, expected_roi = MainPanelComponents.display_budget_parameters()
         min_per_country, max_per_country = MainPanelComponents.display_budget_constraints(total_budget, num_countries)
+        tier_weights = MainPanelComponents.display_product_tier_weights()
+        
+        selected_countries = DataModel.filter_countries_by_criteria(
+            country_stats, country_criteria, num_countries
+        )
+        # Khung thời gian/loại trừ có thể để lại ít quốc gia hơn: ràng buộc được nới thay vì dừng phân tích
+        budget_warning = DataModel.check_budget_constraints(
+            len(selected_countries), total_budget, min_per_country, max_per_country
+        )
+        if budget_warning:
+            st.warning(f"⚠️ {budget_warning}")
+        analysis_key = (
+            DataModel.get_dataset_fingerprint(data_path), time_frame_months, tuple(selected_countries),
+            tuple(sorted(excluded_countries)), tuple(sorted(excluded_products))
+        )
+        
+        # Mọi khung thời gian chuẩn trong một lượt để so sánh mà không chạy lại phân tích
+        UIComponents.display_horizon_comparison(
+            DataModel.analyze_countries_multi_horizon(data_path, selected_countries, excluded_products),
+            time_frame_months
+        )
         
         if MainPanelComponents.display_analyze_button():
             self._run_analysis(
-                df_clean, country_stats, country_criteria, num_countries, 
+                df_clean, revenue_cube, country_stats, selected_countries, analysis_key,
                 time_frame_months, total_budget, expected_roi, 
-                min_per_country, max_per_country,
+                min_per_country, max_per_country, tier_weights,
                 excluded_countries, excluded_products
             )
+        
+        self._display_scenario_grid(analysis_key, total_budget, expected_roi, min_per_country, max_per_country)
     
     def _display_exclusion_info(self, excluded_countries, excluded_products):
         """Hiển thị thông tin về các item bị loại trừ"""
@@ -64,9 +95,23 @@ class MainController:
         if excluded_products:
             st.info(f"🚫 Đã loại trừ {len(excluded_products)} sản phẩm")
     
-    def _run_analysis(self, df_clean, country_stats, country_criteria, num_countries, 
+    def _get_country_analysis(self, df_clean, revenue_cube, selected_countries, analysis_key, time_frame_months):
+        """Phân tích quốc gia, dùng lại kết quả trong phiên nếu dữ liệu và lựa chọn không đổi"""
+        cached = st.session_state.get('country_analysis')
+        if cached is not None and cached['key'] == analysis_key:
+            return cached['analysis_df'], cached['top_products']
+        
+        analysis_df, top_products = DataModel.analyze_countries_with_products(
+            df_clean, selected_countries, time_frame_months, revenue_cube
+        )
+        st.session_state['country_analysis'] = {
+            'key': analysis_key, 'analysis_df': analysis_df, 'top_products': top_products
+        }
+        return analysis_df, top_products
+    
+    def _run_analysis(self, df_clean, revenue_cube, country_stats, selected_countries, analysis_key,
                      time_frame_months, total_budget, expected_roi, 
-                     min_per_country, max_per_country,
+                     min_per_country, max_per_country, tier_weights,
                      excluded_countries, excluded_products):
         """Chạy phân tích và hiển thị kết quả"""
         
@@ -74,28 +119,30 @@ class MainController:
         status_text = st.empty()
         
         try:
-            # Bước 1: Lọc quốc gia
-            status_text.text("🔍 Đang lọc quốc gia theo tiêu chí...")
-            progress_bar.progress(20)
-            
-            selected_countries = DataModel.filter_countries_by_criteria(
-                country_stats, country_criteria, num_countries
-            )
-            
-            # Bước 2: Phân tích chi tiết
+            # Bước 1: Phân tích chi tiết (quốc gia đã được lọc theo tiêu chí)
             status_text.text("🌍 Đang phân tích chi tiết các quốc gia...")
             progress_bar.progress(40)
             
-            country_analysis_with_products, top_products_by_country = DataModel.analyze_countries_with_products(
-                df_clean, selected_countries, time_frame_months
+            country_analysis_with_products, top_products_by_country = self._get_country_analysis(
+                df_clean, revenue_cube, selected_countries, analysis_key, time_frame_months
             )
             
-            # Bước 3: Phân bổ ngân sách
+            # Bước 2: Phân bổ ngân sách
             status_text.text("💰 Đang phân bổ ngân sách...")
             progress_bar.progress(60)
             
             allocation_df = DataModel.allocate_budget_by_country(
-                country_analysis_with_products, total_budget, min_per_country, max_per_country, expected_roi
+                country_analysis_with_products.copy(), total_budget, min_per_country, max_per_country, expected_roi,
+                tier_weights
+            )
+            product_budgets = DataModel.allocate_product_budgets(allocation_df, tier_weights)
+            
+            # Bước 3: Mô phỏng rủi ro lợi nhuận
+            status_text.text("🎲 Đang mô phỏng rủi ro lợi nhuận...")
+            progress_bar.progress(70)
+            
+            risk_df = DataModel.simulate_allocation_risk(
+                revenue_cube, allocation_df, expected_roi, time_frame_months
             )
             
             # Bước 4: Tạo khuyến nghị chiến lược
@@ -103,7 +150,7 @@ class MainController:
             progress_bar.progress(80)
             
             ai_recommendations = AIModel.generate_static_strategy_recommendations(
-                allocation_df, total_budget, expected_roi, time_frame_months
+                allocation_df, total_budget, expected_roi, time_frame_months, tier_weights
             )
             
             progress_bar.progress(100)
@@ -116,7 +163,7 @@ class MainController:
             self._display_results(
                 time_frame_months, selected_countries, total_budget, expected_roi,
                 excluded_countries, excluded_products, country_stats, allocation_df,
-                min_per_country, max_per_country, ai_recommendations
+                min_per_country, max_per_country, ai_recommendations, risk_df, product_budgets
             )
             
         except Exception as e:
@@ -124,9 +171,28 @@ class MainController:
             status_text.empty()
             st.error(f"❌ Lỗi trong quá trình phân tích: {str(e)}")
     
+    def _display_scenario_grid(self, analysis_key, total_budget, expected_roi, min_per_country, max_per_country):
+        """So sánh nhiều kịch bản ngân sách trên kết quả phân tích đã lưu trong phiên"""
+        cached = st.session_state.get('country_analysis')
+        if cached is None or cached['key'] != analysis_key:
+            return
+        
+        grid = MainPanelComponents.display_scenario_grid_parameters(
+            total_budget, expected_roi, min_per_country, max_per_country
+        )
+        if grid is None:
+            return
+        
+        try:
+            scenario_df = DataModel.allocate_budget_scenarios(cached['analysis_df'], *grid)
+            total_scenarios = len(grid[0]) * len(grid[1]) * len(grid[2]) * len(grid[3])
+            UIComponents.display_scenario_results(scenario_df, total_scenarios)
+        except Exception as e:
+            st.error(f"❌ Lỗi khi phân tích kịch bản: {str(e)}")
+    
     def _display_results(self, time_frame_months, selected_countries, total_budget, expected_roi,
                         excluded_countries, excluded_products, country_stats, allocation_df,
-                        min_per_country, max_per_country, ai_recommendations):
+                        min_per_country, max_per_country, ai_recommendations, risk_df, product_budgets):
         """Hiển thị tất cả kết quả phân tích"""
         
         # Hiển thị thông tin cấu hình
@@ -149,6 +215,12 @@ class MainController:
             allocation_df, min_per_country, max_per_country, expected_roi
         )
         
+        # Hiển thị ngân sách theo sản phẩm trong từng quốc gia
+        UIComponents.display_product_budget_table(product_budgets)
+        
+        # Hiển thị mô phỏng rủi ro lợi nhuận
+        UIComponents.display_risk_simulation(risk_df)
+        
         # Hiển thị khuyến nghị chiến lược
         UIComponents.display_ai_recommendations(ai_recommendations)
         
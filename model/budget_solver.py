@@ -0,0 +1,121 @@
+"""
+Phân bổ ngân sách tỷ lệ theo trọng số có ràng buộc cận dưới/cận trên (water-filling)
+"""
+
+import numpy as np
+
+# Trọng số <= 0 được thay bằng giá trị rất nhỏ để vẫn nhận phần ngân sách còn dư
+ZERO_WEIGHT_EPSILON = 1e-12
+
+
+def _prepare_weights(weights) -> np.ndarray:
+    weights = np.asarray(weights, dtype='float64')
+    positive = weights[weights > 0]
+    if positive.size == 0:
+        # Không có trọng số dương: chia đều
+        return np.ones_like(weights)
+    return np.where(weights > 0, weights, positive.max() * ZERO_WEIGHT_EPSILON)
+
+
+def feasible_mask(n: int, totals, lowers, uppers) -> np.ndarray:
+    """Kịch bản nào có thể thỏa mãn: lower <= upper và n·lower <= total <= n·upper"""
+    totals = np.asarray(totals, dtype='float64')
+    lowers = np.asarray(lowers, dtype='float64')
+    uppers = np.asarray(uppers, dtype='float64')
+    tolerance = 1e-9 * np.abs(totals)
+    return (lowers <= uppers) & (n * lowers <= totals + tolerance) & (n * uppers >= totals - tolerance)
+
+
+def feasible_bounds(n: int, total: float, lower: float, upper: float):
+    """
+    Ràng buộc gần nhất có thể thỏa mãn cho một kịch bản: (total, lower, upper).
+
+    Tổng vượt n·upper thì chỉ phân bổ n·upper (phần còn lại không phân bổ);
+    tổng không đủ n·lower thì hạ mức tối thiểu xuống total/n. Mức tối đa nhỏ
+    hơn mức tối thiểu được nâng lên bằng mức tối thiểu.
+    """
+    upper = max(upper, lower)
+    if n * upper < total:
+        total = n * upper
+    if n * lower > total:
+        lower = total / n
+    return total, lower, upper
+
+
+def allocate_bounded_batch(weights, totals, lowers, uppers) -> np.ndarray:
+    """
+    Giải nhiều kịch bản phân bổ cùng lúc trên cùng một bộ trọng số.
+
+    Với mỗi kịch bản s tìm λ sao cho x_i = clip(λ·w_i, lower_s, upper_s) có
+    tổng đúng bằng totals[s]: mỗi phần tử vừa nằm trong cận, vừa tỷ lệ với
+    trọng số ở phần không bị chặn. Tổng f(λ) tuyến tính từng đoạn giữa các điểm
+    gãy lower/w_i và upper/w_i nên chỉ cần sắp xếp điểm gãy (O(n log n)),
+    tính f tại đó bằng tổng tích lũy rồi nội suy trên đoạn chứa nghiệm.
+
+    Trả về mảng (số kịch bản, số phần tử). Raise ValueError nếu ràng buộc
+    không thể thỏa mãn (n·lower > total hoặc n·upper < total).
+    """
+    w = _prepare_weights(weights)
+    totals = np.atleast_1d(np.asarray(totals, dtype='float64'))
+    lowers = np.broadcast_to(np.asarray(lowers, dtype='float64'), totals.shape)
+    uppers = np.broadcast_to(np.asarray(uppers, dtype='float64'), totals.shape)
+    n = w.size
+    if n == 0:
+        return np.zeros((totals.size, 0))
+
+    if np.any(lowers > uppers):
+        raise ValueError("Ngân sách tối thiểu mỗi quốc gia không được lớn hơn mức tối đa")
+    if np.any(n * lowers > totals + 1e-9 * np.abs(totals)):
+        raise ValueError(f"Tổng ngân sách không đủ để cấp mức tối thiểu cho {n} quốc gia")
+    if np.any(n * uppers < totals - 1e-9 * np.abs(totals)):
+        raise ValueError(f"Tổng ngân sách vượt quá tổng mức tối đa của {n} quốc gia, hãy tăng mức tối đa mỗi quốc gia")
+
+    # Trọng số giảm dần và tổng tích lũy (phần tử đầu bằng 0)
+    w_desc = np.sort(w)[::-1]
+    w_asc = w_desc[::-1]
+    cum_w = np.concatenate([[0.0], np.cumsum(w_desc)])
+
+    low = lowers[:, None]
+    high = uppers[:, None]
+    target = totals[:, None]
+
+    # Các điểm gãy của mọi kịch bản, sắp tăng dần theo từng hàng
+    breakpoints = np.sort(np.concatenate([low / w[None, :], high / w[None, :]], axis=1), axis=1)
+
+    def total_at(lam):
+        # Số phần tử đã rời cận dưới (w_i >= lower/λ) và đã chạm cận trên (w_i >= upper/λ)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            left_lower = n - np.searchsorted(w_asc, np.where(lam > 0, low / lam, np.inf), side='left')
+            at_upper = n - np.searchsorted(w_asc, np.where(lam > 0, high / lam, np.inf), side='left')
+        free_w = cum_w[left_lower] - cum_w[at_upper]
+        return high * at_upper + lam * free_w + low * (n - left_lower)
+
+    f = total_at(breakpoints)
+
+    # Đoạn [λ_(j-1), λ_j] đầu tiên có f(λ_j) >= tổng ngân sách
+    j = np.minimum((f < target).sum(axis=1), 2 * n - 1)[:, None]
+    lam_hi = np.take_along_axis(breakpoints, j, axis=1)
+    f_hi = np.take_along_axis(f, j, axis=1)
+    prev = np.maximum(j - 1, 0)
+    lam_lo = np.where(j > 0, np.take_along_axis(breakpoints, prev, axis=1), 0.0)
+    f_lo = np.where(j > 0, np.take_along_axis(f, prev, axis=1), n * low)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (f_hi - f_lo) / (lam_hi - lam_lo)
+        lam = np.where(slope > 0, lam_lo + (target - f_lo) / slope, lam_hi)
+    allocation = np.clip(lam * w[None, :], low, high)
+
+    # Dồn sai số làm tròn vào các phần tử chưa chạm cận để tổng khớp tuyệt đối
+    residual = target[:, 0] - allocation.sum(axis=1)
+    free = (allocation > low) & (allocation < high)
+    free_weight = np.where(free, w[None, :], 0.0)
+    free_sum = free_weight.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(free_sum[:, None] > 0, free_weight / free_sum[:, None], 0.0)
+    allocation = np.clip(allocation + residual[:, None] * share, low, high)
+    return allocation
+
+
+def allocate_bounded(weights, total, lower, upper) -> np.ndarray:
+    """Phân bổ total tỷ lệ theo weights, mỗi phần nằm trong [lower, upper] và tổng đúng bằng total"""
+    return allocate_bounded_batch(weights, [total], [lower], [upper])[0]
@@ -0,0 +1,69 @@
+"""
+Chỉ mục vị trí dòng theo category (dạng CSR) cho các bộ lọc loại trừ/bao gồm
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class CategoryIndex:
+    """
+    Vị trí các dòng của từng giá trị trong một cột, tính một lần cho mỗi view.
+
+    Mỗi đoạn (segment) giữ số thứ tự dòng được nhóm theo mã category (các dòng
+    thiếu giá trị ở đầu), trong mỗi nhóm tăng dần; offsets[code + 1] ..
+    offsets[code + 2] là đoạn của mã code. Lọc theo một giá trị chỉ chạm tới các
+    dòng của giá trị đó, và giới hạn vào một khoảng dòng liên tiếp (khung thời
+    gian trên view đã sắp theo ngày) bằng tìm kiếm nhị phân trong từng đoạn.
+
+    Các dòng ghép thêm vào cuối view (append) thành một đoạn mới, nên chi phí
+    chỉ phụ thuộc số dòng mới.
+    """
+
+    def __init__(self, values: pd.Series):
+        self.n_rows = 0
+        self._segments: List[Tuple[int, int, pd.Index, np.ndarray, np.ndarray]] = []
+        self.append(values)
+
+    @property
+    def n_segments(self) -> int:
+        return len(self._segments)
+
+    def append(self, values: pd.Series):
+        """Thêm chỉ mục cho các dòng nối tiếp sau n_rows dòng đã có"""
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, categories = pd.factorize(values)
+        # Mã category là số nguyên nhỏ: argsort ổn định dùng radix sort
+        positions = np.argsort(codes, kind='stable') + self.n_rows
+        counts = np.bincount(codes.astype('int64') + 1, minlength=len(categories) + 1)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._segments.append((self.n_rows, self.n_rows + len(codes), pd.Index(categories), positions, offsets))
+        self.n_rows += len(codes)
+
+    def positions_of(self, values: Iterable, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Vị trí (tăng dần trong mỗi giá trị của mỗi đoạn) của các dòng thuộc values nằm trong [start, stop)"""
+        stop = self.n_rows if stop is None else stop
+        wanted = pd.Index(list(values)).unique()
+        parts = []
+        for first, last, categories, positions, offsets in self._segments:
+            if last <= start or first >= stop:
+                continue
+            codes = categories.get_indexer(wanted)
+            for code in codes[codes >= 0]:
+                rows = positions[offsets[code + 1]:offsets[code + 2]]
+                lo, hi = np.searchsorted(rows, [start, stop])
+                parts.append(rows[lo:hi])
+        if not parts:
+            return np.zeros(0, dtype='int64')
+        return np.concatenate(parts)
+
+    def mask(self, values: Iterable, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Bitmap độ dài stop - start: True ở các dòng thuộc values"""
+        stop = self.n_rows if stop is None else stop
+        bitmap = np.zeros(stop - start, dtype=bool)
+        bitmap[self.positions_of(values, start, stop) - start] = True
+        return bitmap
@@ -0,0 +1,93 @@
+"""
+Bảng quy tắc ngưỡng để gán nhãn (mức rủi ro, tiềm năng, mức đầu tư, độ nhạy DOL)
+"""
+
+import operator
+from typing import Dict, Mapping, Union
+
+import numpy as np
+import pandas as pd
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+}
+
+# Mỗi bảng: các quy tắc (nhãn, [(cột, toán tử, ngưỡng), ...]) xét theo thứ tự,
+# các điều kiện trong một quy tắc kết hợp AND, nhiều quy tắc cùng nhãn là OR;
+# dòng không khớp quy tắc nào nhận nhãn mặc định. So sánh với NaN luôn sai.
+RULE_TABLES = {
+    'risk_level': {
+        'rules': [
+            ('Thấp', [('Order_Frequency_Score', '>', 7), ('Revenue_Stability', '>', 0.5)]),
+            ('Cao', [('Order_Frequency_Score', '<', 4)]),
+            ('Cao', [('Revenue_Stability', '<', 0.2)]),
+        ],
+        'default': 'Trung Bình',
+    },
+    'investment_potential': {
+        'rules': [
+            ('Cao', [('Overall_Score', '>', 7)]),
+            ('Thấp', [('Overall_Score', '<', 4)]),
+        ],
+        'default': 'Trung Bình',
+    },
+    'investment_level': {
+        'rules': [
+            ('Rất Cao', [('Investment_Percentage', '>=', 25)]),
+            ('Cao', [('Investment_Percentage', '>=', 15)]),
+            ('Trung Bình', [('Investment_Percentage', '>=', 10)]),
+        ],
+        'default': 'Thấp',
+    },
+    # Trang DOL (Streamlit)
+    'dol_sensitivity': {
+        'rules': [
+            ('Cao', [('DOL', '>', 0.5)]),
+            ('Trung bình', [('DOL', '==', 0.5)]),
+        ],
+        'default': 'Thấp',
+    },
+    # Màn hình kết quả DOL (tkinter)
+    'dol_sensitivity_report': {
+        'rules': [
+            ('Cao', [('DOL', '>', 2.0)]),
+            ('Trung bình', [('DOL', '>=', 1.2)]),
+        ],
+        'default': 'Thấp',
+    },
+}
+
+ColumnData = Union[pd.DataFrame, Mapping[str, object]]
+
+
+def classify(data: ColumnData, table: str) -> np.ndarray:
+    """
+    Gán nhãn cho mọi dòng theo bảng quy tắc bằng một lần np.select trên các cột.
+
+    data là DataFrame hoặc dict cột -> mảng/số; trả về mảng nhãn (object).
+    """
+    spec = RULE_TABLES[table]
+    columns: Dict[str, np.ndarray] = {}
+
+    def column(name):
+        if name not in columns:
+            columns[name] = np.atleast_1d(np.asarray(data[name], dtype='float64'))
+        return columns[name]
+
+    conditions, labels = [], []
+    for label, clauses in spec['rules']:
+        condition = True
+        for name, op, threshold in clauses:
+            condition = condition & OPERATORS[op](column(name), threshold)
+        conditions.append(condition)
+        labels.append(label)
+    return np.select(conditions, np.array(labels, dtype=object), default=spec['default'])
+
+
+def classify_value(table: str, **values) -> str:
+    """Nhãn cho một bộ giá trị đơn lẻ, ví dụ classify_value('dol_sensitivity', DOL=0.7)"""
+    return classify(values, table)[0]
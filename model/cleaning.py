@@ -0,0 +1,108 @@
+"""
+Quy trình làm sạch dữ liệu giao dịch dùng chung cho mọi chức năng
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from model.snapshot_cache import apply_types
+
+# Mỗi quy tắc: (mô tả, cột kiểm tra, điều kiện hợp lệ trên mảng của cột)
+CLEANING_RULES = {
+    'unparsable_date': ("Ngày không hợp lệ", 'InvoiceDate', lambda col: col.notna().to_numpy()),
+    'missing_quantity': ("Thiếu số lượng", 'Quantity', lambda col: col.notna().to_numpy()),
+    'negative_quantity': ("Số lượng âm hoặc bằng 0", 'Quantity', lambda col: (col > 0).to_numpy(dtype=bool, na_value=True)),
+    'zero_price': ("Đơn giá bằng 0 hoặc âm", 'UnitPrice', lambda col: (col > 0).to_numpy(dtype=bool, na_value=False)),
+    'missing_customer': ("Thiếu mã khách hàng", 'CustomerID', lambda col: col.notna().to_numpy()),
+    'missing_country': ("Thiếu quốc gia", 'Country', lambda col: col.notna().to_numpy()),
+    'non_positive_revenue': ("Doanh thu không dương", 'Revenue', lambda col: (col > 0).to_numpy(dtype=bool, na_value=False)),
+}
+
+# Bộ quy tắc theo chức năng
+CLEANING_PROFILES = {
+    # Phân bổ ngân sách, clean_data_basic
+    'budget': ['unparsable_date', 'missing_quantity', 'negative_quantity', 'zero_price', 'missing_customer', 'non_positive_revenue'],
+    # Phân tích doanh thu theo quốc gia
+    'revenue': ['unparsable_date', 'missing_country', 'non_positive_revenue'],
+    # Phân tích theo tháng: chỉ cần đặt được giao dịch vào một tháng
+    'dates': ['unparsable_date'],
+}
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Ép kiểu (chỉ khi cần) và bổ sung Revenue mà không sửa bảng của phía gọi"""
+    needs_types = (
+        ('InvoiceDate' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['InvoiceDate'])) or
+        any(col in df.columns and not pd.api.types.is_numeric_dtype(df[col])
+            for col in ('Quantity', 'UnitPrice', 'CustomerID'))
+    )
+    if needs_types:
+        df = apply_types(df.copy(deep=False))
+    if 'Revenue' not in df.columns and 'Quantity' in df.columns and 'UnitPrice' in df.columns:
+        df = df.copy(deep=False)
+        df['Revenue'] = line_revenue(df)
+    return df
+
+
+def line_revenue(df: pd.DataFrame) -> np.ndarray:
+    """Quantity × UnitPrice dạng float64, NaN khi thiếu số lượng hoặc đơn giá"""
+    quantity = df['Quantity'].to_numpy(dtype='float64', na_value=np.nan)
+    return quantity * df['UnitPrice'].to_numpy(dtype='float64', na_value=np.nan)
+
+
+def rule_mask(df: pd.DataFrame, profile: str) -> Tuple[np.ndarray, Dict]:
+    """
+    Tính mọi điều kiện của bộ quy tắc trong một lượt trên các mảng cột.
+
+    Trả về mặt nạ các dòng hợp lệ và báo cáo: số dòng vào/ra cùng số dòng vi
+    phạm từng quy tắc (một dòng có thể vi phạm nhiều quy tắc). Quy tắc có cột
+    không tồn tại được bỏ qua.
+    """
+    keep = np.ones(len(df), dtype=bool)
+    rejected = {}
+    for rule in CLEANING_PROFILES[profile]:
+        _, column, predicate = CLEANING_RULES[rule]
+        if column not in df.columns:
+            continue
+        valid = predicate(df[column])
+        rejected[rule] = int(len(valid) - np.count_nonzero(valid))
+        keep &= valid
+    report = {
+        'profile': profile,
+        'rows_in': len(df),
+        'rows_out': int(np.count_nonzero(keep)),
+        'rejected': rejected,
+    }
+    return keep, report
+
+
+def merge_reports(previous: Dict, report: Dict) -> Dict:
+    """Cộng báo cáo làm sạch của các phần dữ liệu nối tiếp nhau (cùng bộ quy tắc)"""
+    return {
+        'profile': previous['profile'],
+        'rows_in': previous['rows_in'] + report['rows_in'],
+        'rows_out': previous['rows_out'] + report['rows_out'],
+        'rejected': {rule: count + report['rejected'].get(rule, 0)
+                     for rule, count in previous['rejected'].items()},
+    }
+
+
+def clean_frame(df: pd.DataFrame, profile: str) -> Tuple[pd.DataFrame, Dict]:
+    """Làm sạch bảng theo bộ quy tắc; chỉ sao chép dữ liệu một lần khi lấy các dòng hợp lệ"""
+    df = _typed(df)
+    keep, report = rule_mask(df, profile)
+    if report['rows_out'] == len(df):
+        # Bản sao nông: phía gọi gán cột mới không ảnh hưởng bảng gốc
+        return df.copy(deep=False), report
+    return df.take(np.flatnonzero(keep)), report
+
+
+def describe_rejections(report: Dict) -> pd.DataFrame:
+    """Bảng số dòng bị loại theo từng quy tắc để hiển thị"""
+    rows = [
+        {'Quy tắc': CLEANING_RULES[rule][0], 'Số dòng bị loại': count}
+        for rule, count in report['rejected'].items()
+    ]
+    return pd.DataFrame(rows, columns=['Quy tắc', 'Số dòng bị loại'])
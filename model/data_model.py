@@ -1,14 +1,60 @@
+import hashlib
+import json
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import streamlit as st
 
+from model.budget_solver import allocate_bounded, allocate_bounded_batch, feasible_bounds, feasible_mask
+from model.classification_rules import classify
+from model.disk_cache import RECOMMENDATION_CACHE
+from model.horizon_metrics import STANDARD_HORIZONS, horizon_metrics
+from model.risk_simulation import (DEFAULT_SEED, DEFAULT_SIMULATIONS, monthly_revenue_matrix,
+                                   simulate_allocation_risk, summarize_profit_distribution)
+from model.product_allocation import (PRODUCT_TIERS, TIER_LABELS, allocate_product_budgets, normalized_tier_weights,
+                                      product_strategy, strategy_percentages, tier_split_label)
+from model.revenue_cube import RevenueCube
+from model.snapshot_cache import parse_source
+from model.streaming_ingest import get_dataset
+from model.transaction_store import month_index_month
+
 try:
     import google.generativeai as genai
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
 
+# Các model Gemini thử lần lượt cho tới khi có model khả dụng
+GEMINI_MODELS = [
+    'gemini-1.5-flash',
+    'gemini-1.5-pro', 
+    'gemini-pro',
+    'models/gemini-1.5-flash',
+    'models/gemini-1.5-pro'
+]
+
+# Thời gian (giây) dùng lại model đã dò được trước khi kiểm tra lại
+GEMINI_MODEL_TTL = 3600
+
+
+@st.cache_resource(ttl=GEMINI_MODEL_TTL, show_spinner=False)
+def _resolve_gemini_model(api_key):
+    """
+    Model Gemini đầu tiên trả lời được một request thử, dò một lần cho toàn bộ
+    process (dùng chung giữa các phiên). Không có model nào thì ném LookupError
+    để kết quả thất bại không bị cache.
+    """
+    genai.configure(api_key=api_key)
+    for model_name in GEMINI_MODELS:
+        try:
+            model = genai.GenerativeModel(model_name)
+            model.generate_content("Test")
+            return model
+        except Exception:
+            continue
+    raise LookupError("Không tìm thấy model Gemini khả dụng")
+
+
 class DataModel:
     """Model class xử lý tất cả business logic và data processing"""
     
@@ -18,37 +64,89 @@ class DataModel:
         self.allocation_df = None
     
     @staticmethod
-    @st.cache_data
     def load_and_clean_data(uploaded_file, time_frame_months):
         """Load & làm sạch dữ liệu với khung thời gian tùy chỉnh"""
+        if DataModel.load_clean_data(uploaded_file) is None:
+            return None
+        return DataModel.apply_time_frame(uploaded_file, time_frame_months)
+    
+    @staticmethod
+    def load_clean_data(uploaded_file):
+        """Load & làm sạch một lần cho mỗi dataset (đọc file chỉ khi dữ liệu thay đổi)"""
         try:
-            df = pd.read_csv(uploaded_file, encoding='utf-8')
-            
-            df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
-            df['Revenue'] = df['Quantity'] * df['UnitPrice']
-            
-            max_date = df['InvoiceDate'].max()
-            start_date = max_date - timedelta(days=time_frame_months * 30)
-            df = df[df['InvoiceDate'] >= start_date]
-            
-            mask = (
-                (df['Quantity'] > 0) & 
-                (df['UnitPrice'] > 0) & 
-                (df['CustomerID'].notna()) &
-                (df['Revenue'] > 0) &
-                (df['InvoiceDate'].notna())
-            )
-            
-            df_clean = df[mask].copy()
-            df_clean['Country'] = df_clean['Country'].str.strip().str.title()
-            df_clean['YearMonth'] = df_clean['InvoiceDate'].dt.to_period('M')
-            
-            return df_clean
-            
+            return get_dataset(uploaded_file).view('clean')
         except Exception as e:
             st.error(f"❌ Lỗi: {str(e)}")
             return None
     
+    @staticmethod
+    def apply_time_frame(uploaded_file, time_frame_months, excluded_countries=None, excluded_products=None):
+        """
+        Khung thời gian tính từ ngày mới nhất của dữ liệu gốc, cắt bằng tìm kiếm
+        nhị phân trên dữ liệu sạch đã sắp theo ngày (không đọc hay làm sạch lại).
+        Quốc gia/sản phẩm loại trừ được bỏ qua chỉ mục vị trí dòng theo giá trị.
+        """
+        store = get_dataset(uploaded_file)
+        return store.view_since(
+            'clean', DataModel._time_frame_start(store.max_invoice_date, time_frame_months),
+            exclude={'Country': excluded_countries, 'StockCode': excluded_products}
+        )
+    
+    @staticmethod
+    def _time_frame_start(max_date, time_frame_months):
+        """Ngày đầu khung thời gian tính từ ngày mới nhất, lấy trọn ngày để khớp với khối theo ngày"""
+        return (pd.Timestamp(max_date) - timedelta(days=time_frame_months * 30)).normalize()
+    
+    @staticmethod
+    def get_revenue_cube(uploaded_file, time_frame_months, excluded_countries=None, excluded_products=None):
+        """
+        Khối quốc gia × ngày tương ứng với load_and_clean_data + filter_excluded_items:
+        cùng khung thời gian và cùng danh sách loại trừ, nhưng chỉ là phép cắt khối đã tính sẵn
+        """
+        store = get_dataset(uploaded_file)
+        cube = store.revenue_cube('clean', excluded_products or ())
+        countries = cube.countries
+        if excluded_countries:
+            countries = countries[~countries.isin(excluded_countries)]
+        return cube.slice(countries, start=DataModel._time_frame_start(store.max_invoice_date, time_frame_months))
+    
+    @staticmethod
+    def get_customer_counts(uploaded_file, time_frame_months, excluded_products=None):
+        """
+        Số khách hàng mua trong khung thời gian theo quốc gia, từ tổng theo khách hàng
+        (ngày mua cuối trong khung) thay vì đếm lại trên các dòng giao dịch
+        """
+        if excluded_products:
+            # Tổng theo khách hàng gồm mọi sản phẩm: đếm trên các dòng đã loại trừ
+            df_clean = DataModel.apply_time_frame(uploaded_file, time_frame_months, excluded_products=excluded_products)
+            return df_clean.groupby('Country', observed=True)['CustomerID'].nunique()
+        dataset = get_dataset(uploaded_file)
+        customers = dataset.customer_totals()
+        start = DataModel._time_frame_start(dataset.max_invoice_date, time_frame_months)
+        active = customers[customers['LastPurchase'] >= start]
+        return active.groupby(level='Country', observed=True).size()
+    
+    @staticmethod
+    def get_memory_report(uploaded_file):
+        """Bộ nhớ của dataset dùng chung trước/sau khi áp dụng schema"""
+        return get_dataset(uploaded_file).memory_report()
+    
+    @staticmethod
+    def get_dataset_fingerprint(uploaded_file):
+        """Dấu vân tay dữ liệu hiện tại (thay đổi khi ghép thêm lô hóa đơn)"""
+        return get_dataset(uploaded_file).fingerprint
+    
+    @staticmethod
+    def get_cleaning_report(uploaded_file):
+        """Số dòng bị loại theo từng quy tắc làm sạch của dữ liệu phân bổ ngân sách"""
+        return get_dataset(uploaded_file).cleaning_report('clean')
+    
+    @staticmethod
+    def append_transactions(uploaded_file, batch_file, file_type=None):
+        """Ghép lô hóa đơn mới vào dataset dùng chung, trả về số dòng nhận/ghép/trùng"""
+        store = get_dataset(uploaded_file)
+        return store.append(parse_source(batch_file, file_type))
+    
     @staticmethod
     def filter_excluded_items(df_clean, excluded_countries, excluded_products):
         """Lọc bỏ quốc gia và sản phẩm không mong muốn"""
@@ -61,53 +159,46 @@ class DataModel:
         return df_clean
     
     @staticmethod
-    def analyze_countries_comprehensive(df_clean, selected_countries, time_frame_months):
-        """Phân tích toàn diện các quốc gia với khung thời gian tùy chỉnh"""
-        df_filtered = df_clean[df_clean['Country'].isin(selected_countries)]
-        
-        max_date = df_filtered['InvoiceDate'].max()
-        analysis_period = max_date - timedelta(days=time_frame_months * 30)
-        half_period = max_date - timedelta(days=time_frame_months * 15)
-        
-        recent_data = df_filtered[df_filtered['InvoiceDate'] >= analysis_period]
-        recent_half = df_filtered[df_filtered['InvoiceDate'] >= half_period]
-        prev_half = df_filtered[
-            (df_filtered['InvoiceDate'] >= analysis_period) & 
-            (df_filtered['InvoiceDate'] < half_period)
-        ]
-        
-        country_analysis = []
-        
-        for country in selected_countries:
-            country_data = df_filtered[df_filtered['Country'] == country]
-            country_recent = recent_data[recent_data['Country'] == country]
-            
-            total_revenue = country_recent['Revenue'].sum()
-            avg_monthly_revenue = total_revenue / time_frame_months
-            
-            total_orders = country_recent['InvoiceNo'].nunique()
-            avg_orders_per_month = total_orders / time_frame_months
-            
-            avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
-            
-            monthly_revenue = country_recent.groupby(country_recent['InvoiceDate'].dt.to_period('M'))['Revenue'].sum()
-            revenue_stability = 1 / (monthly_revenue.std() / monthly_revenue.mean()) if len(monthly_revenue) > 0 and monthly_revenue.mean() > 0 else 0
-            
-            monthly_pattern = country_data.groupby(country_data['InvoiceDate'].dt.month)['Revenue'].mean()
-            seasonality_score = monthly_pattern.std() / monthly_pattern.mean() if monthly_pattern.mean() > 0 else 0
-            
-            country_analysis.append({
-                'Country': country,
-                'Total_Revenue': total_revenue,
-                'Avg_Monthly_Revenue': avg_monthly_revenue,
-                'Total_Orders': total_orders,
-                'Avg_Orders_Per_Month': avg_orders_per_month,
-                'Avg_Order_Value': avg_order_value,
-                'Revenue_Stability': revenue_stability,
-                'Seasonality_Score': seasonality_score
-            })
-        
-        analysis_df = pd.DataFrame(country_analysis)
+    def analyze_countries_comprehensive(df_clean, selected_countries, time_frame_months, cube=None):
+        """Phân tích toàn diện các quốc gia với khung thời gian tùy chỉnh (trả lời từ khối quốc gia × ngày)"""
+        if not selected_countries:
+            return pd.DataFrame()
+        
+        if cube is None:
+            cube = RevenueCube.from_frame(df_clean)
+        selected = cube.slice(selected_countries)
+        
+        max_date = selected.last_day()
+        recent = selected.slice(start=DataModel._time_frame_start(max_date, time_frame_months)) if max_date is not None else selected
+        
+        # Doanh thu tháng chỉ tính các tháng quốc gia có giao dịch (như groupby theo tháng)
+        recent_lines = recent.monthly('Lines')
+        monthly_revenue = recent.monthly('Revenue').where(recent_lines > 0)
+        
+        # Doanh thu trung bình mỗi dòng theo tháng trong năm (1-12) trên toàn bộ dữ liệu của quốc gia
+        lines = selected.monthly('Lines')
+        calendar_month = month_index_month(lines.index.to_numpy())
+        pattern_lines = lines.groupby(calendar_month).sum()
+        monthly_pattern = (selected.monthly('Revenue').groupby(calendar_month).sum() / pattern_lines).where(pattern_lines > 0)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            monthly_mean, monthly_std = monthly_revenue.mean(), monthly_revenue.std()
+            revenue_stability = np.where(monthly_mean > 0, 1 / (monthly_std / monthly_mean), 0)
+            pattern_mean, pattern_std = monthly_pattern.mean(), monthly_pattern.std()
+            seasonality_score = np.where(pattern_mean > 0, pattern_std / pattern_mean, 0)
+        
+        analysis_df = pd.DataFrame({'Country': selected_countries})
+        analysis_df['Total_Revenue'] = recent.total('Revenue').to_numpy()
+        analysis_df['Avg_Monthly_Revenue'] = analysis_df['Total_Revenue'] / time_frame_months
+        analysis_df['Total_Orders'] = recent.total('Orders').to_numpy()
+        analysis_df['Avg_Orders_Per_Month'] = analysis_df['Total_Orders'] / time_frame_months
+        analysis_df['Avg_Order_Value'] = np.where(
+            analysis_df['Total_Orders'] > 0,
+            analysis_df['Total_Revenue'] / analysis_df['Total_Orders'].where(analysis_df['Total_Orders'] > 0),
+            0
+        )
+        analysis_df['Revenue_Stability'] = revenue_stability
+        analysis_df['Seasonality_Score'] = seasonality_score
         
         if len(analysis_df) > 0:
             analysis_df['Revenue_Score'] = (analysis_df['Avg_Monthly_Revenue'] / analysis_df['Avg_Monthly_Revenue'].max()) * 10
@@ -120,21 +211,28 @@ class DataModel:
                 analysis_df['Stability_Score'] * 0.15
             )
             
-            analysis_df['Risk_Level'] = analysis_df.apply(lambda x: 
-                'Thấp' if x['Order_Frequency_Score'] > 7 and x['Revenue_Stability'] > 0.5 else
-                'Cao' if x['Order_Frequency_Score'] < 4 or x['Revenue_Stability'] < 0.2 else
-                'Trung Bình', axis=1)
-            
-            analysis_df['Investment_Potential'] = analysis_df.apply(lambda x:
-                'Cao' if x['Overall_Score'] > 7 else
-                'Thấp' if x['Overall_Score'] < 4 else
-                'Trung Bình', axis=1)
+            analysis_df['Risk_Level'] = classify(analysis_df, 'risk_level')
+            analysis_df['Investment_Potential'] = classify(analysis_df, 'investment_potential')
         
         return analysis_df
     
     @staticmethod
-    def allocate_budget_by_country(analysis_df, total_budget, min_per_country, max_per_country, expected_roi):
-        """Phân bổ ngân sách theo quốc gia với ROI dự kiến tùy chỉnh"""
+    def analyze_countries_multi_horizon(uploaded_file, selected_countries, excluded_products=None,
+                                        horizons=STANDARD_HORIZONS):
+        """
+        Chỉ số và điểm của các quốc gia đã chọn cho mọi khung thời gian chuẩn trong
+        một lượt (tổng tích lũy trên chuỗi tháng của khối dữ liệu sạch). Mỗi khung
+        là các tháng lịch trọn vẹn tính lùi từ tháng mới nhất của dữ liệu.
+        """
+        if not selected_countries:
+            return pd.DataFrame()
+        cube = get_dataset(uploaded_file).revenue_cube('clean', excluded_products or ())
+        return horizon_metrics(cube.slice(selected_countries), horizons)
+    
+    @staticmethod
+    def allocate_budget_by_country(analysis_df, total_budget, min_per_country, max_per_country, expected_roi,
+                                   tier_weights=None):
+        """Phân bổ ngân sách theo quốc gia với ROI dự kiến tùy chỉnh, rồi chia tiếp cho các bậc sản phẩm"""
         
         if len(analysis_df) == 0:
             return analysis_df
@@ -142,47 +240,136 @@ class DataModel:
         total_score = analysis_df['Overall_Score'].sum()
         analysis_df['Initial_Budget'] = (analysis_df['Overall_Score'] / total_score) * total_budget
         
-        analysis_df['Allocated_Budget'] = analysis_df['Initial_Budget'].clip(
-            lower=min_per_country,
-            upper=max_per_country
+        # Phân bổ tỷ lệ theo điểm, mỗi quốc gia trong [min, max] và tổng đúng bằng ngân sách
+        # (ràng buộc không thỏa mãn được thì nới theo feasible_bounds, xem check_budget_constraints)
+        analysis_df['Allocated_Budget'] = allocate_bounded(
+            analysis_df['Overall_Score'].to_numpy(),
+            *feasible_bounds(len(analysis_df), total_budget, min_per_country, max_per_country)
         )
         
-        total_allocated = analysis_df['Allocated_Budget'].sum()
-        if total_allocated != total_budget:
-            adjustment_factor = total_budget / total_allocated
-            analysis_df['Allocated_Budget'] = analysis_df['Allocated_Budget'] * adjustment_factor
-        
         analysis_df['Expected_Profit'] = analysis_df['Allocated_Budget'] * (expected_roi / 100)
         analysis_df['Total_Return'] = analysis_df['Allocated_Budget'] + analysis_df['Expected_Profit']
         
         analysis_df['Investment_Percentage'] = (analysis_df['Allocated_Budget'] / total_budget) * 100
         
-        def classify_investment_level(percentage):
-            if percentage >= 25:
-                return "Rất Cao"
-            elif percentage >= 15:
-                return "Cao"
-            elif percentage >= 10:
-                return "Trung Bình"
-            else:
-                return "Thấp"
+        analysis_df['Investment_Level'] = classify(analysis_df, 'investment_level')
         
-        analysis_df['Investment_Level'] = analysis_df['Investment_Percentage'].apply(classify_investment_level)
+        if 'Top_Products' in analysis_df.columns:
+            # Chiến lược sản phẩm tính trên ngân sách thực của từng quốc gia
+            product_budgets = DataModel.allocate_product_budgets(analysis_df, tier_weights)
+            strategies = {country: product_strategy(group)
+                          for country, group in product_budgets.groupby('Country', sort=False)}
+            analysis_df['Product_Strategy'] = analysis_df['Country'].map(strategies)
         
         return analysis_df.sort_values('Allocated_Budget', ascending=False)
     
     @staticmethod
-    def get_country_selection_options(df_clean, time_frame_months):
+    def check_budget_constraints(num_countries, total_budget, min_per_country, max_per_country):
+        """
+        Cảnh báo khi ràng buộc ngân sách không thỏa mãn được với số quốc gia hiện có
+        (None nếu hợp lệ); allocate_budget_by_country khi đó phân bổ theo feasible_bounds
+        """
+        if num_countries == 0:
+            return None
+        allocated, lower, _ = feasible_bounds(num_countries, total_budget, min_per_country, max_per_country)
+        if allocated < total_budget:
+            return (f"Tổng ngân sách ${total_budget:,.0f} vượt quá mức tối đa của {num_countries} quốc gia "
+                    f"(${max_per_country:,.0f} mỗi quốc gia): chỉ phân bổ ${allocated:,.0f}, "
+                    f"còn ${total_budget - allocated:,.0f} chưa phân bổ. Hãy tăng mức tối đa hoặc số quốc gia.")
+        if lower < min_per_country:
+            return (f"Tổng ngân sách ${total_budget:,.0f} không đủ cấp mức tối thiểu ${min_per_country:,.0f} "
+                    f"cho {num_countries} quốc gia: mức tối thiểu được hạ xuống ${lower:,.0f} mỗi quốc gia.")
+        return None
+    
+    @staticmethod
+    def allocate_budget_scenarios(analysis_df, total_budgets, expected_rois, min_per_country_values, max_per_country_values):
+        """
+        Phân bổ ngân sách cho mọi tổ hợp (ngân sách, ROI, min, max) trong một lượt.
+
+        Dùng lại analysis_df đã tính (chỉ cần Overall_Score), giải toàn bộ kịch bản
+        bằng allocate_bounded_batch và trả về bảng dạng dài: mỗi dòng là một quốc
+        gia trong một kịch bản. Kịch bản có ràng buộc không thể thỏa mãn bị bỏ qua
+        (số thứ tự Scenario vẫn giữ theo lưới đầy đủ).
+        """
+        columns = ['Scenario', 'Total_Budget', 'Expected_ROI', 'Min_Per_Country', 'Max_Per_Country',
+                   'Country', 'Overall_Score', 'Allocated_Budget', 'Investment_Percentage',
+                   'Expected_Profit', 'Total_Return']
+        grid = pd.MultiIndex.from_product(
+            [total_budgets, expected_rois, min_per_country_values, max_per_country_values],
+            names=['Total_Budget', 'Expected_ROI', 'Min_Per_Country', 'Max_Per_Country']
+        ).to_frame(index=False).astype('float64')
+        grid.insert(0, 'Scenario', np.arange(1, len(grid) + 1))
+
+        n = len(analysis_df)
+        if n == 0 or len(grid) == 0:
+            return pd.DataFrame(columns=columns)
+
+        feasible = feasible_mask(n, grid['Total_Budget'], grid['Min_Per_Country'], grid['Max_Per_Country'])
+        grid = grid[feasible].reset_index(drop=True)
+        if len(grid) == 0:
+            return pd.DataFrame(columns=columns)
+
+        # ROI không ảnh hưởng phân bổ: chỉ giải một lần cho mỗi bộ (ngân sách, min, max)
+        bounds = ['Total_Budget', 'Min_Per_Country', 'Max_Per_Country']
+        unique_bounds, inverse = np.unique(grid[bounds].to_numpy(), axis=0, return_inverse=True)
+        allocation = allocate_bounded_batch(
+            analysis_df['Overall_Score'].to_numpy(),
+            unique_bounds[:, 0], unique_bounds[:, 1], unique_bounds[:, 2]
+        )[inverse.ravel()]
+
+        tidy = grid.loc[grid.index.repeat(n)].reset_index(drop=True)
+        tidy['Country'] = np.tile(analysis_df['Country'].to_numpy(), len(grid))
+        tidy['Overall_Score'] = np.tile(analysis_df['Overall_Score'].to_numpy(), len(grid))
+        tidy['Allocated_Budget'] = allocation.ravel()
+        tidy['Investment_Percentage'] = tidy['Allocated_Budget'] / tidy['Total_Budget'] * 100
+        tidy['Expected_Profit'] = tidy['Allocated_Budget'] * (tidy['Expected_ROI'] / 100)
+        tidy['Total_Return'] = tidy['Allocated_Budget'] + tidy['Expected_Profit']
+        return tidy[columns]
+    
+    @staticmethod
+    def simulate_allocation_risk(revenue_cube, allocation_df, expected_roi, time_frame_months,
+                                 n_simulations=DEFAULT_SIMULATIONS, seed=DEFAULT_SEED):
+        """
+        Phân phối lợi nhuận mô phỏng (P5/P50/P95, xác suất lỗ, CVaR) theo quốc gia và cả danh mục,
+        lấy mẫu từ các tháng trọn vẹn của khối quốc gia × ngày trong khung thời gian
+        """
+        countries = allocation_df['Country'].tolist()
+        simulation = simulate_allocation_risk(
+            monthly_revenue_matrix(revenue_cube, countries),
+            allocation_df['Allocated_Budget'].to_numpy(),
+            expected_roi, time_frame_months, n_simulations, seed
+        )
+        
+        expected_profit = allocation_df['Expected_Profit'].to_numpy(dtype='float64')
+        country_risk = summarize_profit_distribution(simulation['country_profit'], expected_profit)
+        portfolio_risk = summarize_profit_distribution(simulation['portfolio_profit'], expected_profit.sum())
+        
+        country_risk.insert(0, 'Country', countries)
+        country_risk.insert(1, 'Allocated_Budget', allocation_df['Allocated_Budget'].to_numpy())
+        portfolio_risk.insert(0, 'Country', 'Tổng danh mục')
+        portfolio_risk.insert(1, 'Allocated_Budget', allocation_df['Allocated_Budget'].sum())
+        return pd.concat([country_risk, portfolio_risk], ignore_index=True)
+    
+    @staticmethod
+    def get_country_selection_options(df_clean, time_frame_months, cube=None, customer_counts=None):
         """Tạo các tùy chọn lựa chọn quốc gia với khung thời gian tùy chỉnh"""
-        country_stats = df_clean.groupby('Country').agg({
-            'Revenue': ['sum', 'mean', 'count'],
-            'InvoiceNo': 'nunique'
+        if cube is None:
+            cube = RevenueCube.from_frame(df_clean)
+        cube = cube.slice(cube.active_countries())
+        if customer_counts is None:
+            customer_counts = df_clean.groupby('Country', observed=True)['CustomerID'].nunique()
+        
+        total_revenue = cube.total('Revenue')
+        transaction_count = cube.total('Lines')
+        country_stats = pd.DataFrame({
+            'Total_Revenue': total_revenue,
+            'Avg_Revenue': total_revenue / transaction_count,
+            'Transaction_Count': transaction_count,
+            'Order_Count': cube.total('Orders'),
+            'Customer_Count': customer_counts.reindex(cube.countries, fill_value=0).to_numpy(),
         }).round(2)
         
-        country_stats.columns = ['Total_Revenue', 'Avg_Revenue', 'Transaction_Count', 'Order_Count']
-        country_stats = country_stats.reset_index()
-        
-        return country_stats
+        return country_stats.reset_index()
     
     @staticmethod
     def filter_countries_by_criteria(country_stats, criteria, num_countries):
@@ -191,6 +378,8 @@ class DataModel:
             return country_stats.nlargest(num_countries, 'Total_Revenue')['Country'].tolist()
         elif criteria == "Nhiều đơn hàng nhất":
             return country_stats.nlargest(num_countries, 'Order_Count')['Country'].tolist()
+        elif criteria == "Nhiều khách hàng nhất":
+            return country_stats.nlargest(num_countries, 'Customer_Count')['Country'].tolist()
         elif criteria == "Doanh thu trung bình cao nhất":
             return country_stats.nlargest(num_countries, 'Avg_Revenue')['Country'].tolist()
         else:
@@ -201,136 +390,100 @@ class DataModel:
         """Phân tích top sản phẩm với validation tốt hơn"""
         df_filtered = df_clean[df_clean['Country'].isin(selected_countries)]
         
+        # Cùng khung thời gian (lấy trọn ngày đầu) với chỉ số quốc gia tính từ khối
         max_date = df_filtered['InvoiceDate'].max()
-        analysis_period = max_date - timedelta(days=time_frame_months * 30)
+        analysis_period = DataModel._time_frame_start(max_date, time_frame_months)
         recent_data = df_filtered[df_filtered['InvoiceDate'] >= analysis_period]
         
-        country_products = {}
+        # Một lần gom nhóm theo (quốc gia, sản phẩm) cho mọi quốc gia; dữ liệu đọc theo khối
+        # đã gom sẵn theo ngày và số đơn mỗi ngày cộng được (một hóa đơn chỉ thuộc một ngày)
+        orders = ('Orders', 'sum') if 'Orders' in recent_data.columns else ('InvoiceNo', 'nunique')
+        product_analysis = recent_data.groupby(['Country', 'StockCode'], observed=True).agg(
+            Quantity=('Quantity', 'sum'),
+            Revenue=('Revenue', 'sum'),
+            InvoiceNo=orders,
+            Description=('Description', 'first')
+        ).reset_index()
+        
+        # Lọc bỏ sản phẩm có doanh thu quá thấp
+        product_analysis = product_analysis[product_analysis['Revenue'] > 100]
+        
+        # Chuẩn hóa an toàn theo giá trị lớn nhất trong từng quốc gia
+        by_country = product_analysis.groupby('Country', observed=True)
+        for column, score in [('Quantity', 'Quantity_Score'), ('Revenue', 'Revenue_Score'), ('InvoiceNo', 'Orders_Score')]:
+            column_max = by_country[column].transform('max')
+            product_analysis[score] = (product_analysis[column] / column_max.where(column_max > 0)).fillna(0)
+        
+        # Tính điểm tổng hợp
+        product_analysis['Overall_Score'] = (
+            product_analysis['Revenue_Score'] * 0.6 +
+            product_analysis['Quantity_Score'] * 0.3 +
+            product_analysis['Orders_Score'] * 0.1
+        )
         
-        for country in selected_countries:
-            country_data = recent_data[recent_data['Country'] == country]
-            
-            if len(country_data) == 0:
-                country_products[country] = []
-                continue
-            
-            # Phân tích theo StockCode với validation
-            product_analysis = country_data.groupby('StockCode').agg({
-                'Quantity': 'sum',
-                'Revenue': 'sum',
-                'InvoiceNo': 'nunique',
-                'Description': 'first'
-            }).reset_index()
-            
-            # Lọc bỏ sản phẩm có doanh thu quá thấp
-            product_analysis = product_analysis[product_analysis['Revenue'] > 100]
-            
-            if len(product_analysis) > 0:
-                # Chuẩn hóa an toàn
-                max_qty = product_analysis['Quantity'].max()
-                max_rev = product_analysis['Revenue'].max()
-                max_orders = product_analysis['InvoiceNo'].max()
-                
-                if max_qty > 0:
-                    product_analysis['Quantity_Score'] = product_analysis['Quantity'] / max_qty
-                else:
-                    product_analysis['Quantity_Score'] = 0
-                    
-                if max_rev > 0:
-                    product_analysis['Revenue_Score'] = product_analysis['Revenue'] / max_rev
-                else:
-                    product_analysis['Revenue_Score'] = 0
-                    
-                if max_orders > 0:
-                    product_analysis['Orders_Score'] = product_analysis['InvoiceNo'] / max_orders
-                else:
-                    product_analysis['Orders_Score'] = 0
-                
-                # Tính điểm tổng hợp
-                product_analysis['Overall_Score'] = (
-                    product_analysis['Revenue_Score'] * 0.6 +
-                    product_analysis['Quantity_Score'] * 0.3 +
-                    product_analysis['Orders_Score'] * 0.1
-                )
-                
-                # Lấy top N sản phẩm
-                top_products = product_analysis.nlargest(min(top_n, len(product_analysis)), 'Overall_Score')
-                
-                country_products[country] = []
-                for _, product in top_products.iterrows():
-                    # Clean description
-                    description = str(product['Description']).strip() if pd.notna(product['Description']) else f"Sản phẩm {product['StockCode']}"
-                    
-                    country_products[country].append({
-                        'StockCode': str(product['StockCode']),
-                        'Description': description,
-                        'Total_Quantity': int(product['Quantity']),
-                        'Total_Revenue': float(product['Revenue']),
-                        'Total_Orders': int(product['InvoiceNo']),
-                        'Overall_Score': float(product['Overall_Score']),
-                        'Avg_Revenue_Per_Order': float(product['Revenue'] / product['InvoiceNo']) if product['InvoiceNo'] > 0 else 0
-                    })
-            else:
-                country_products[country] = []
+        # Lấy top N sản phẩm mỗi quốc gia (sắp xếp ổn định: điểm bằng nhau giữ thứ tự như nlargest)
+        top_products = product_analysis.sort_values('Overall_Score', ascending=False, kind='stable')
+        top_products = top_products.groupby('Country', observed=True, sort=False).head(top_n)
+        
+        # Clean description
+        stock_codes = top_products['StockCode'].astype(str)
+        descriptions = top_products['Description'].astype(object)
+        top_products = pd.DataFrame({
+            'Country': top_products['Country'].astype(str),
+            'StockCode': stock_codes,
+            'Description': descriptions.where(descriptions.isna(), descriptions.astype(str).str.strip())
+                                       .fillna('Sản phẩm ' + stock_codes),
+            'Total_Quantity': top_products['Quantity'].astype('int64'),
+            'Total_Revenue': top_products['Revenue'].astype('float64'),
+            'Total_Orders': top_products['InvoiceNo'].astype('int64'),
+            'Overall_Score': top_products['Overall_Score'].astype('float64'),
+            'Avg_Revenue_Per_Order': (top_products['Revenue'] / top_products['InvoiceNo'].where(top_products['InvoiceNo'] > 0)).fillna(0)
+        })
+        
+        products_by_country = {
+            country: group.drop(columns='Country').to_dict('records')
+            for country, group in top_products.groupby('Country', sort=False)
+        }
+        country_products = {country: products_by_country.get(country, []) for country in selected_countries}
         
         return country_products
 
     @staticmethod
-    def calculate_product_strategy_allocation(products, total_budget_for_country):
-        """Tính toán phân bổ ngân sách theo chiến lược 70-20-10"""
+    def calculate_product_strategy_allocation(products, total_budget_for_country, tier_weights=None):
+        """Tính toán phân bổ ngân sách của một quốc gia theo các bậc sản phẩm (mặc định 30-10-60)"""
         if not products or len(products) == 0:
             return None
         
-        # Sắp xếp sản phẩm theo doanh thu
-        sorted_products = sorted(products, key=lambda x: x['Total_Revenue'], reverse=True)
-        
-        # Phân loại sản phẩm
-        core_product = sorted_products[0]  # Sản phẩm chủ lực
-        growth_products = sorted_products[1:2] if len(sorted_products) > 1 else []  # Sản phẩm tiềm năng
-        diversify_products = sorted_products[2:] if len(sorted_products) > 2 else []  # Đa dạng hóa
-        
-        strategy = {
-            'core': {
-                'percentage': 30,
-                'budget': total_budget_for_country * 0.3,
-                'products': [core_product],
-                'reason': 'Sản phẩm chủ lực - doanh thu ổn định cao'
-            },
-            'growth': {
-                'percentage': 10,
-                'budget': total_budget_for_country * 0.1,
-                'products': growth_products,
-                'reason': 'Phát triển tiềm năng - cơ hội tăng trưởng'
-            },
-            'diversify': {
-                'percentage': 60,
-                'budget': total_budget_for_country * 0.6,
-                'products': diversify_products,
-                'reason': 'Đa dạng hóa - giảm rủi ro portfolio'
-            }
-        }
-        
-        return strategy
+        product_df = pd.DataFrame(products).assign(Country='')
+        allocation = allocate_product_budgets(product_df, pd.Series({'': total_budget_for_country}), tier_weights)
+        return product_strategy(allocation)
+    
+    @staticmethod
+    def allocate_product_budgets(allocation_df, tier_weights=None):
+        """
+        Bảng dài (Country, StockCode) chia Allocated_Budget thực của mỗi quốc gia
+        cho các sản phẩm top theo bậc chủ lực/tiềm năng/đa dạng hóa
+        """
+        records = [
+            dict(product, Country=country)
+            for country, products in zip(allocation_df['Country'], allocation_df['Top_Products'])
+            if isinstance(products, list)
+            for product in products
+        ]
+        products = pd.DataFrame(records) if records else pd.DataFrame(columns=['Country', 'StockCode', 'Total_Revenue'])
+        budgets = pd.Series(allocation_df['Allocated_Budget'].to_numpy(), index=allocation_df['Country'])
+        return allocate_product_budgets(products, budgets, tier_weights)
 
     @staticmethod
-    def analyze_countries_with_products(df_clean, selected_countries, time_frame_months):
+    def analyze_countries_with_products(df_clean, selected_countries, time_frame_months, cube=None):
         """Phân tích quốc gia với chiến lược sản phẩm"""
         # Lấy phân tích cơ bản
-        country_analysis = DataModel.analyze_countries_comprehensive(df_clean, selected_countries, time_frame_months)
+        country_analysis = DataModel.analyze_countries_comprehensive(df_clean, selected_countries, time_frame_months, cube)
         top_products = DataModel.analyze_top_products_by_country(df_clean, selected_countries, time_frame_months, top_n=5)  # Tăng lên 5 sản phẩm
         
         if len(country_analysis) > 0:
             country_analysis['Top_Products'] = country_analysis['Country'].map(top_products)
             
-            # Thêm product strategy cho mỗi quốc gia
-            country_analysis['Product_Strategy'] = country_analysis.apply(
-                lambda row: DataModel.calculate_product_strategy_allocation(
-                    row['Top_Products'], 
-                    50000  # Placeholder budget, sẽ được update sau khi có allocated budget
-                ), 
-                axis=1
-            )
-            
             # Tính product diversity
             country_analysis['Product_Diversity'] = country_analysis['Top_Products'].apply(
                 lambda products: len([p for p in products if p['Total_Revenue'] > 1000]) if products else 0
@@ -342,7 +495,7 @@ class AIModel:
     """Model class xử lý AI recommendations"""
     
     @staticmethod
-    def generate_gemini_recommendations(allocation_df, total_budget, expected_roi, time_frame_months):
+    def generate_gemini_recommendations(allocation_df, total_budget, expected_roi, time_frame_months, tier_weights=None):
         """Tạo khuyến nghị với chiến lược đầu tư đa dạng sản phẩm"""
         
         # HARDCODE API KEY - THAY ĐỔI NÀY
@@ -355,85 +508,143 @@ class AIModel:
             }]
         
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            
-            models_to_try = [
-                'gemini-1.5-flash',
-                'gemini-1.5-pro', 
-                'gemini-pro',
-                'models/gemini-1.5-flash',
-                'models/gemini-1.5-pro'
-            ]
+            prompt = AIModel._build_recommendation_prompt(allocation_df, total_budget, expected_roi, time_frame_months,
+                                                          tier_weights)
+            # Cùng dữ liệu đầu vào cho ra cùng prompt: trả lời ngay từ cache trên đĩa
+            cache_key = AIModel._recommendation_cache_key(prompt)
+            cached = RECOMMENDATION_CACHE.get_json(cache_key)
+            if cached is not None:
+                return cached
             
-            model = None
-            for model_name in models_to_try:
-                try:
-                    model = genai.GenerativeModel(model_name)
-                    test_response = model.generate_content("Test")
-                    break
-                except Exception as e:
-                    continue
-            
-            if model is None:
+            try:
+                model = _resolve_gemini_model(GEMINI_API_KEY)
+            except LookupError:
                 return [{
                     'title': '❌ Lỗi Model',
                     'content': 'Không thể tìm thấy model Gemini khả dụng. Vui lòng kiểm tra API key và kết nối internet, sau đó thử lại.'
                 }]
             
-            # Tạo dữ liệu đơn giản và rõ ràng
-            top_3_countries = allocation_df.head(3)
-            bottom_2_countries = allocation_df.tail(2)
+            try:
+                response = model.generate_content(prompt)
+                recommendations_text = response.text.strip()
+            except Exception:
+                # Model đã chọn không còn dùng được: lần sau dò lại từ đầu danh sách
+                _resolve_gemini_model.clear()
+                raise
+
+            # Validation: Check if response contains required sections
+            required_sections = ["🔍 PHÂN TÍCH PORTFOLIO", "🎯 CHIẾN LƯỢC", "📈 KẾT QUẢ DỰ KIẾN"]
+            missing_sections = [section for section in required_sections if section not in recommendations_text]
+
+            recommendations = [{
+                'title': 'Khuyến Nghị Chiến Lược Phân Bổ Vốn',  
+                'content': recommendations_text
+            }]
+            # Chỉ lưu câu trả lời thành công; các lỗi bên dưới luôn được thử lại ở lần sau
+            if recommendations_text:
+                RECOMMENDATION_CACHE.put_json(cache_key, recommendations)
+            return recommendations
+            
+        except Exception as e:
+            error_msg = str(e)
+            
+            if "API key" in error_msg.lower() or "invalid" in error_msg.lower():
+                return [{
+                    'title': '🔑 Lỗi API Key',
+                    'content': 'API Key không hợp lệ hoặc đã hết hạn. Vui lòng kiểm tra lại Gemini API Key tại Google AI Studio.'
+                }]
+            elif "quota" in error_msg.lower() or "limit" in error_msg.lower():
+                return [{
+                    'title': '📊 Lỗi Quota',
+                    'content': 'Đã vượt quá giới hạn sử dụng API miễn phí. Vui lòng thử lại sau 24 giờ hoặc nâng cấp tài khoản.'
+                }]
+            elif "404" in error_msg or "not found" in error_msg.lower():
+                return [{
+                    'title': '🔄 Model đang cập nhật',
+                    'content': 'Gemini model hiện đang được cập nhật bởi Google. Vui lòng thử lại sau 10-15 phút.'
+                }]
+            elif "network" in error_msg.lower() or "connection" in error_msg.lower():
+                return [{
+                    'title': '🌐 Lỗi kết nối',
+                    'content': 'Không thể kết nối tới Google AI. Vui lòng kiểm tra kết nối internet và thử lại.'
+                }]
+            else:
+                return [{
+                    'title': '⚠️ Lỗi hệ thống',
+                    'content': f'Đã xảy ra lỗi khi tạo khuyến nghị AI. Chi tiết: {error_msg[:100]}... Vui lòng thử lại sau.'
+                }]
+
+    @staticmethod
+    def _recommendation_cache_key(prompt):
+        """Khóa cache: băm prompt (đã chứa toàn bộ số liệu đầu vào) cùng danh sách model"""
+        payload = json.dumps({'prompt': prompt, 'models': GEMINI_MODELS}, ensure_ascii=False, sort_keys=True)
+        return 'gemini-' + hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+    
+    @staticmethod
+    def _build_recommendation_prompt(allocation_df, total_budget, expected_roi, time_frame_months, tier_weights=None):
+        """Prompt khuyến nghị từ bảng phân bổ (chỉ phụ thuộc vào dữ liệu truyền vào)"""
+        tier_label = tier_split_label(normalized_tier_weights(tier_weights))
+        # Tạo dữ liệu đơn giản và rõ ràng
+        top_3_countries = allocation_df.head(3)
+        bottom_2_countries = allocation_df.tail(2)
+        
+        # Format dữ liệu với nhiều sản phẩm hơn
+        countries_data = ""
+        for i, (_, country_row) in enumerate(top_3_countries.iterrows(), 1):
+            country = country_row['Country']
+            products = country_row.get('Top_Products', [])
+            
+            countries_data += f"\n{i}. QUỐC GIA: {country}\n"
+            countries_data += f"   - Ngân sách được phân bổ: ${country_row['Allocated_Budget']:,.0f}\n"
+            countries_data += f"   - Doanh thu {time_frame_months} tháng: ${country_row['Total_Revenue']:,.0f}\n"
+            countries_data += f"   - Điểm đánh giá: {country_row['Overall_Score']:.1f}/10\n"
+            countries_data += f"   - Mức rủi ro: {country_row['Risk_Level']}\n"
             
-            # Format dữ liệu với nhiều sản phẩm hơn
-            countries_data = ""
-            for i, (_, country_row) in enumerate(top_3_countries.iterrows(), 1):
-                country = country_row['Country']
-                products = country_row.get('Top_Products', [])
+            if products and len(products) > 0:
+                countries_data += f"   - DANH MỤC SẢN PHẨM:\n"
+                for j, product in enumerate(products, 1):  # Lấy tất cả sản phẩm top
+                    product_name = str(product['Description'])[:25] if product['Description'] else f"SP-{product['StockCode']}"
+                    performance = "Cao" if product['Total_Revenue'] > 10000 else "Trung bình" if product['Total_Revenue'] > 5000 else "Thấp"
+                    countries_data += f"     + #{j}: {product['StockCode']} ({product_name}) - DT ${product['Total_Revenue']:,.0f} - Hiệu quả {performance}\n"
                 
-                countries_data += f"\n{i}. QUỐC GIA: {country}\n"
-                countries_data += f"   - Ngân sách được phân bổ: ${country_row['Allocated_Budget']:,.0f}\n"
-                countries_data += f"   - Doanh thu {time_frame_months} tháng: ${country_row['Total_Revenue']:,.0f}\n"
-                countries_data += f"   - Điểm đánh giá: {country_row['Overall_Score']:.1f}/10\n"
-                countries_data += f"   - Mức rủi ro: {country_row['Risk_Level']}\n"
+                # Thêm thông tin tổng quan
+                total_product_revenue = sum(p['Total_Revenue'] for p in products)
+                countries_data += f"   - Tổng DT top sản phẩm: ${total_product_revenue:,.0f}\n"
+                countries_data += f"   - Số sản phẩm tiềm năng: {len(products)}\n"
                 
-                if products and len(products) > 0:
-                    countries_data += f"   - DANH MỤC SẢN PHẨM:\n"
-                    for j, product in enumerate(products, 1):  # Lấy tất cả sản phẩm top
-                        product_name = str(product['Description'])[:25] if product['Description'] else f"SP-{product['StockCode']}"
-                        performance = "Cao" if product['Total_Revenue'] > 10000 else "Trung bình" if product['Total_Revenue'] > 5000 else "Thấp"
-                        countries_data += f"     + #{j}: {product['StockCode']} ({product_name}) - DT ${product['Total_Revenue']:,.0f} - Hiệu quả {performance}\n"
-                    
-                    # Thêm thông tin tổng quan
-                    total_product_revenue = sum(p['Total_Revenue'] for p in products)
-                    countries_data += f"   - Tổng DT top sản phẩm: ${total_product_revenue:,.0f}\n"
-                    countries_data += f"   - Số sản phẩm tiềm năng: {len(products)}\n"
-                else:
-                    countries_data += f"   - Chưa có dữ liệu sản phẩm chi tiết\n"
-
-            # Format bottom countries
-            bottom_countries_data = ""
-            for _, country_row in bottom_2_countries.iterrows():
-                bottom_countries_data += f"- {country_row['Country']}: Doanh thu ${country_row['Total_Revenue']:,.0f}, Điểm {country_row['Overall_Score']:.1f}/10, Rủi ro {country_row['Risk_Level']}\n"
-
-            # Tính toán thêm insights
-            total_current_revenue = allocation_df['Total_Revenue'].sum()
-            total_allocated_budget = allocation_df['Allocated_Budget'].sum()
-            total_expected_profit = allocation_df['Expected_Profit'].sum()
-            average_score = allocation_df['Overall_Score'].mean()
-
-            # Phân tích gap giữa top và bottom
-            top_avg_score = top_3_countries['Overall_Score'].mean()
-            bottom_avg_score = bottom_2_countries['Overall_Score'].mean()
-            score_gap = top_avg_score - bottom_avg_score
-
-            # Thêm vào countries_data
-            countries_data += f"\n=== THỐNG KÊ TỔNG QUAN ===\n"
-            countries_data += f"- Doanh thu trung bình top 3: ${top_3_countries['Total_Revenue'].mean():,.0f}\n"
-            countries_data += f"- Điểm trung bình top 3: {top_avg_score:.1f}/10\n"
-            countries_data += f"- Khoảng cách điểm top vs bottom: {score_gap:.1f} điểm\n"
-            countries_data += f"- Tỷ lệ ngân sách top 3: {(top_3_countries['Allocated_Budget'].sum() / total_allocated_budget * 100):.1f}%\n"
-
-            prompt = f"""
+                # Tỷ trọng thực tế theo bậc (đã chuẩn hóa trên các bậc quốc gia có sản phẩm)
+                percentages = strategy_percentages(country_row.get('Product_Strategy'))
+                if percentages is not None:
+                    countries_data += f"   - Tỷ trọng ngân sách theo bậc: " + ", ".join(
+                        f"{TIER_LABELS[tier]} {percentages[tier]:.1f}%" for tier in PRODUCT_TIERS
+                    ) + "\n"
+            else:
+                countries_data += f"   - Chưa có dữ liệu sản phẩm chi tiết\n"
+
+        # Format bottom countries
+        bottom_countries_data = ""
+        for _, country_row in bottom_2_countries.iterrows():
+            bottom_countries_data += f"- {country_row['Country']}: Doanh thu ${country_row['Total_Revenue']:,.0f}, Điểm {country_row['Overall_Score']:.1f}/10, Rủi ro {country_row['Risk_Level']}\n"
+
+        # Tính toán thêm insights
+        total_current_revenue = allocation_df['Total_Revenue'].sum()
+        total_allocated_budget = allocation_df['Allocated_Budget'].sum()
+        total_expected_profit = allocation_df['Expected_Profit'].sum()
+        average_score = allocation_df['Overall_Score'].mean()
+
+        # Phân tích gap giữa top và bottom
+        top_avg_score = top_3_countries['Overall_Score'].mean()
+        bottom_avg_score = bottom_2_countries['Overall_Score'].mean()
+        score_gap = top_avg_score - bottom_avg_score
+
+        # Thêm vào countries_data
+        countries_data += f"\n=== THỐNG KÊ TỔNG QUAN ===\n"
+        countries_data += f"- Doanh thu trung bình top 3: ${top_3_countries['Total_Revenue'].mean():,.0f}\n"
+        countries_data += f"- Điểm trung bình top 3: {top_avg_score:.1f}/10\n"
+        countries_data += f"- Khoảng cách điểm top vs bottom: {score_gap:.1f} điểm\n"
+        countries_data += f"- Tỷ lệ ngân sách top 3: {(top_3_countries['Allocated_Budget'].sum() / total_allocated_budget * 100):.1f}%\n"
+
+        return f"""
 Bạn là chuyên gia đầu tư vốn quốc tế với 15 năm kinh nghiệm phân tích ROI và dự báo kết quả. Dựa trên dữ liệu:
 
 === TỔNG QUAN DỰ ÁN ===
@@ -458,9 +669,10 @@ Bạn là chuyên gia đầu tư vốn quốc tế với 15 năm kinh nghiệm p
 
 Cho mỗi quốc gia, viết theo format:
 🌍 **[Tên quốc gia]** (Ngân sách: $[số tiền])
-- **30% Sản phẩm chủ lực**: [Mã SP] ([Tên SP ngắn]) - Lý do: [lý do cụ thể dựa trên doanh thu/hiệu quả]
-- **10% Sản phẩm tiềm năng**: [Mã SP] ([Tên SP ngắn]) - Lý do: [lý do phát triển]  
-- **60% Đa dạng hóa**: Phân bổ cho [số lượng] sản phẩm còn lại để giảm rủi ro
+- **[X]% Sản phẩm chủ lực**: [Mã SP] ([Tên SP ngắn]) - Lý do: [lý do cụ thể dựa trên doanh thu/hiệu quả]
+- **[Y]% Sản phẩm tiềm năng**: [Mã SP] ([Tên SP ngắn]) - Lý do: [lý do phát triển]  
+- **[Z]% Đa dạng hóa**: Phân bổ cho [số lượng] sản phẩm còn lại để giảm rủi ro
+X, Y, Z lấy ĐÚNG "Tỷ trọng ngân sách theo bậc" của quốc gia đó trong dữ liệu; bỏ dòng của bậc có tỷ trọng 0%)
 
 **📈 KẾT QUẢ DỰ KIẾN & CẢI THIỆN**
 (300 từ - BẮT BUỘC chia thành 3 phần con rõ ràng:
@@ -477,7 +689,7 @@ Cho mỗi quốc gia, viết theo format:
 - **[Tên quốc gia]**: [Vấn đề cụ thể từ dữ liệu] → **Giải pháp**: [Hành động cụ thể có thể thực hiện]
 
 💡 **Logic đạt được kết quả dự kiến:**
-Giải thích chi tiết tại sao chiến lược 30-10-60 sẽ đạt được kết quả trên:
+Giải thích chi tiết tại sao chiến lược {tier_label} sẽ đạt được kết quả trên:
 - Dựa trên hiệu quả sản phẩm từ dữ liệu {time_frame_months} tháng
 - Tính toán ROI từ allocated budget: ${total_allocated_budget:,.0f}
 - Xu hướng tăng trưởng dự báo từ performance hiện tại
@@ -489,55 +701,19 @@ QUAN TRỌNG:
 - Tính toán logic dựa trên dữ liệu thực tế được cung cấp
 - Viết bằng tiếng Việt, chuyên nghiệp và có căn cứ rõ ràng
 - Đảm bảo 3 phần trong KẾT QUẢ DỰ KIẾN tách biệt rõ ràng
-            """
-            
-            response = model.generate_content(prompt)
-            recommendations_text = response.text.strip()
+        """
 
-            # Validation: Check if response contains required sections
-            required_sections = ["🔍 PHÂN TÍCH PORTFOLIO", "🎯 CHIẾN LƯỢC", "📈 KẾT QUẢ DỰ KIẾN"]
-            missing_sections = [section for section in required_sections if section not in recommendations_text]
-
-            return [{
-                'title': 'Khuyến Nghị Chiến Lược Phân Bổ Vốn',  
-                'content': recommendations_text
-            }]
-            
-        except Exception as e:
-            error_msg = str(e)
-            
-            if "API key" in error_msg.lower() or "invalid" in error_msg.lower():
-                return [{
-                    'title': '🔑 Lỗi API Key',
-                    'content': 'API Key không hợp lệ hoặc đã hết hạn. Vui lòng kiểm tra lại Gemini API Key tại Google AI Studio.'
-                }]
-            elif "quota" in error_msg.lower() or "limit" in error_msg.lower():
-                return [{
-                    'title': '📊 Lỗi Quota',
-                    'content': 'Đã vượt quá giới hạn sử dụng API miễn phí. Vui lòng thử lại sau 24 giờ hoặc nâng cấp tài khoản.'
-                }]
-            elif "404" in error_msg or "not found" in error_msg.lower():
-                return [{
-                    'title': '🔄 Model đang cập nhật',
-                    'content': 'Gemini model hiện đang được cập nhật bởi Google. Vui lòng thử lại sau 10-15 phút.'
-                }]
-            elif "network" in error_msg.lower() or "connection" in error_msg.lower():
-                return [{
-                    'title': '🌐 Lỗi kết nối',
-                    'content': 'Không thể kết nối tới Google AI. Vui lòng kiểm tra kết nối internet và thử lại.'
-                }]
-            else:
-                return [{
-                    'title': '⚠️ Lỗi hệ thống',
-                    'content': f'Đã xảy ra lỗi khi tạo khuyến nghị AI. Chi tiết: {error_msg[:100]}... Vui lòng thử lại sau.'
-                }]
 
     @staticmethod
-    def generate_static_strategy_recommendations(allocation_df, total_budget, expected_roi, time_frame_months):
-        """Tạo khuyến nghị chiến lược tĩnh với công thức 30-10-60 và dự báo chi tiết"""
+    def generate_static_strategy_recommendations(allocation_df, total_budget, expected_roi, time_frame_months,
+                                                 tier_weights=None):
+        """Tạo khuyến nghị chiến lược tĩnh theo tỷ trọng bậc sản phẩm đã áp dụng và dự báo chi tiết"""
         if len(allocation_df) == 0:
             return []
         
+        weights = normalized_tier_weights(tier_weights)
+        tier_label = tier_split_label(weights)
+        
         # Phân tích dữ liệu cơ bản
         top_country = allocation_df.iloc[0]['Country']
         top_budget = allocation_df.iloc[0]['Allocated_Budget']
@@ -553,7 +729,7 @@ QUAN TRỌNG:
         # Tạo nội dung khuyến nghị chính
         main_recommendation = f"""**🎯 KHUYẾN NGHỊ CHIẾN LƯỢC CHÍNH:**
 
-Dựa trên phân tích {len(allocation_df)} quốc gia với tổng ngân sách ${total_budget:,}, hệ thống đề xuất chiến lược phân bổ theo mô hình **30-10-60** nhằm tối ưu hóa hiệu quả đầu tư và đa dạng hóa rủi ro.
+Dựa trên phân tích {len(allocation_df)} quốc gia với tổng ngân sách ${total_budget:,}, hệ thống đề xuất chiến lược phân bổ theo mô hình **{tier_label}** nhằm tối ưu hóa hiệu quả đầu tư và đa dạng hóa rủi ro.
 
 **📊 ĐÁNH GIÁ TỔNG QUAN:**
 - Quốc gia được ưu tiên nhất: **{top_country}** ({top_percentage:.1f}% ngân sách)
@@ -561,14 +737,15 @@ Dựa trên phân tích {len(allocation_df)} quốc gia với tổng ngân sách
 - Số quốc gia đầu tư mạnh: **{len(high_investment_countries)}** quốc gia
 - Số quốc gia rủi ro thấp: **{len(low_risk_countries)}** quốc gia
 
-**🔄 MÔ HÌNH PHÂN BỔ 30-10-60:**
-- **30%** cho sản phẩm chủ lực (doanh thu ổn định cao)
-- **10%** cho sản phẩm tiềm năng (cơ hội tăng trưởng)
-- **60%** cho đa dạng hóa danh mục (giảm thiểu rủi ro)"""
+**🔄 MÔ HÌNH PHÂN BỔ {tier_label}:**
+- **{weights['core']:.1f}%** cho sản phẩm chủ lực (doanh thu ổn định cao)
+- **{weights['growth']:.1f}%** cho sản phẩm tiềm năng (cơ hội tăng trưởng)
+- **{weights['diversify']:.1f}%** cho đa dạng hóa danh mục (giảm thiểu rủi ro)"""
+        main_recommendation += AIModel._describe_adjusted_tier_splits(allocation_df, weights)
 
-        # Tạo phần gợi ý đầu tư chi tiết với công thức 30-10-60
+        # Tạo phần gợi ý đầu tư chi tiết theo tỷ trọng bậc sản phẩm đã áp dụng
         investment_suggestions = AIModel._generate_detailed_investment_suggestions(
-            allocation_df, total_budget, time_frame_months
+            allocation_df, total_budget, time_frame_months, weights
         )
 
         # Tạo phần dự báo chi tiết
@@ -584,8 +761,22 @@ Dựa trên phân tích {len(allocation_df)} quốc gia với tổng ngân sách
         }]
     
     @staticmethod
-
-    def _generate_detailed_investment_suggestions(allocation_df, total_budget, time_frame_months):
+    def _describe_adjusted_tier_splits(allocation_df, weights):
+        """Các quốc gia có tỷ trọng bậc khác mô hình chung (thiếu sản phẩm cho một số bậc)"""
+        if 'Product_Strategy' not in allocation_df.columns:
+            return ""
+        adjusted = []
+        for country, strategy in zip(allocation_df['Country'], allocation_df['Product_Strategy']):
+            percentages = strategy_percentages(strategy)
+            if percentages is not None and any(abs(percentages[tier] - weights[tier]) > 0.05 for tier in PRODUCT_TIERS):
+                adjusted.append(f"{country} ({tier_split_label(percentages)})")
+        if not adjusted:
+            return ""
+        return ("\n- Quốc gia không đủ sản phẩm cho mọi bậc được chia lại trên các bậc có sản phẩm: "
+                + ", ".join(adjusted))
+    
+    @staticmethod
+    def _generate_detailed_investment_suggestions(allocation_df, total_budget, time_frame_months, weights):
         """Sinh khuyến nghị chiến lược đầu tư theo phân bổ vốn"""
         suggestions = "\n\n"
 
@@ -617,10 +808,10 @@ Dựa trên phân tích {len(allocation_df)} quốc gia với tổng ngân sách
 
         # 3. Phân bổ theo sản phẩm tăng trưởng
         suggestions += f"3. **Ưu tiên phân bổ vốn cho sản phẩm có mức tăng trưởng cao hoặc doanh thu vượt trội**\n"
-        suggestions += f"   • Trong mỗi quốc gia, ngân sách sẽ chia theo tỉ lệ 30-10-60:\n"
-        suggestions += f"     - 30%: Sản phẩm chủ lực (hiệu suất cao, doanh thu ổn định)\n"
-        suggestions += f"     - 10%: Sản phẩm tiềm năng (có dấu hiệu tăng trưởng nhanh)\n"
-        suggestions += f"     - 60%: Các sản phẩm còn lại để thử nghiệm và giảm rủi ro\n\n"
+        suggestions += f"   • Trong mỗi quốc gia, ngân sách sẽ chia theo tỉ lệ {tier_split_label(weights)}:\n"
+        suggestions += f"     - {weights['core']:.1f}%: Sản phẩm chủ lực (hiệu suất cao, doanh thu ổn định)\n"
+        suggestions += f"     - {weights['growth']:.1f}%: Sản phẩm tiềm năng (có dấu hiệu tăng trưởng nhanh)\n"
+        suggestions += f"     - {weights['diversify']:.1f}%: Các sản phẩm còn lại để thử nghiệm và giảm rủi ro\n\n"
 
         # 4. Tái phân bổ linh hoạt
         suggestions += f"4. **Cho phép tái phân bổ theo tín hiệu hiệu suất hoặc thị trường**\n"
@@ -3,77 +3,72 @@ import numpy as np
 import streamlit as st
 from datetime import datetime, timedelta
 
+from model.cleaning import clean_frame
+from model.revenue_cube import RevenueCube
+from model.streaming_ingest import get_dataset
+from model.transaction_store import month_index_of, month_index_labels, month_index_year, month_index_month
+
 # Hàm để đọc và làm sạch dữ liệu
-@st.cache_data(ttl=3600)  # Cache dữ liệu trong 1 giờ
 def load_and_clean_data(file_path):
-    df = pd.read_excel(
-        file_path,
-        usecols=['InvoiceDate', 'Country', 'Revenue'],
-        parse_dates=['InvoiceDate']
-    )
-    df = df.loc[df['Revenue'] > 0]
-    df['MonthYear'] = df['InvoiceDate'].dt.to_period('M').astype(str)
-    df = df.reset_index(drop=True)
-    return df
+    df = get_dataset(file_path).view('revenue')
+    return df[['InvoiceDate', 'Country', 'Revenue', 'MonthYear', 'MonthIndex']]
 
 # Hàm để đọc và làm sạch dữ liệu từ file upload
-@st.cache_data(ttl=3600)
-def load_and_clean_data_from_upload(uploaded_file, file_type):
-    """Load và clean dữ liệu từ file upload"""
+def load_and_clean_data_from_upload(uploaded_file, file_type, progress_callback=None):
+    """Load và clean dữ liệu từ file upload (progress_callback nhận tiến độ đọc file Excel)"""
     try:
-        if file_type == 'csv':
-            df = pd.read_csv(uploaded_file, encoding='utf-8')
-        else:  # excel
-            df = pd.read_excel(uploaded_file)
-        
-        # Xử lý cột ngày
-        df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
-        
-        # Tính Revenue nếu chưa có
-        if 'Revenue' not in df.columns:
-            if 'Quantity' in df.columns and 'UnitPrice' in df.columns:
-                df['Revenue'] = df['Quantity'] * df['UnitPrice']
-            else:
-                raise ValueError("File cần có cột 'Revenue' hoặc cả 'Quantity' và 'UnitPrice'")
-        
-        # Lọc dữ liệu hợp lệ
-        df = df.loc[df['Revenue'] > 0]
-        df = df.dropna(subset=['InvoiceDate', 'Country', 'Revenue'])
-        
-        # Tạo cột MonthYear
-        df['MonthYear'] = df['InvoiceDate'].dt.to_period('M').astype(str)
-        df = df.reset_index(drop=True)
-        
-        return df
+        # View doanh thu dương dùng chung từ TransactionStore (đã có MonthYear, MonthIndex)
+        return get_dataset(uploaded_file, file_type, progress_callback).view('revenue')
         
     except Exception as e:
         raise Exception(f"Lỗi xử lý file: {str(e)}")
 
+def load_revenue_cube(file_path):
+    """Khối quốc gia × ngày của view doanh thu, tính một lần cho mỗi dataset"""
+    return get_dataset(file_path).revenue_cube('revenue')
+
+def _as_cube(data):
+    """Nhận bảng giao dịch hoặc RevenueCube; bảng được gom thành khối"""
+    if isinstance(data, RevenueCube):
+        return data
+    return RevenueCube.from_frame(data)
+
+def filter_cube(cube, start_date, end_date, countries, revenue_threshold):
+    """Giống filter_data nhưng chỉ cắt khối: trọn các tháng từ start_date tới end_date"""
+    start = pd.Timestamp(start_date).to_period('M').start_time
+    end = pd.Timestamp(end_date).to_period('M').end_time
+    cube = cube.slice(start=start, end=end)
+    if countries:
+        cube = cube.slice([c for c in cube.countries if c in set(countries)])
+    active = cube.active_countries()
+    if revenue_threshold > 0:
+        country_revenue = cube.slice(active).total('Revenue')
+        active = country_revenue.index[country_revenue >= revenue_threshold]
+    return cube.slice(active)
+
 @st.cache_data(ttl=3600)
 def filter_data(df, start_date, end_date, countries, revenue_threshold):
     df_filtered = df.copy(deep=False)
-    start_period = pd.Period(start_date.strftime('%Y-%m'))
-    end_period = pd.Period(end_date.strftime('%Y-%m'))
-    df_periods = pd.Series(df_filtered['MonthYear'].map(lambda x: pd.Period(x)))
-    mask = (df_periods >= start_period) & (df_periods <= end_period)
+    month_idx = df_filtered['MonthIndex']
+    mask = (month_idx >= month_index_of(start_date)) & (month_idx <= month_index_of(end_date))
     df_filtered = df_filtered.loc[mask]
     if countries:
         df_filtered = df_filtered[df_filtered['Country'].isin(countries)]
     if revenue_threshold > 0:
-        country_revenue = df_filtered.groupby('Country')['Revenue'].sum()
+        country_revenue = df_filtered.groupby('Country', observed=True)['Revenue'].sum()
         valid_countries = country_revenue[country_revenue >= revenue_threshold].index
         df_filtered = df_filtered[df_filtered['Country'].isin(valid_countries)]
     return df_filtered
 
-@st.cache_data(ttl=3600)
-def calculate_total_revenue(df):
-    pivot_table = df.pivot_table(
-        values='Revenue',
-        index='MonthYear',
-        columns='Country',
-        aggfunc='sum',
-        fill_value=0
-    )
+def _active_monthly(cube, measure):
+    """Bảng tháng × quốc gia, bỏ các tháng không có giao dịch nào"""
+    lines = cube.monthly('Lines')
+    return cube.monthly(measure)[lines.sum(axis=1) > 0], lines[lines.sum(axis=1) > 0]
+
+def calculate_total_revenue(data):
+    cube = _as_cube(data)
+    pivot_table, _ = _active_monthly(cube, 'Revenue')
+    pivot_table.index = month_index_labels(pivot_table.index).rename('MonthYear')
     return pivot_table
 
 @st.cache_data(ttl=3600)
@@ -86,35 +81,38 @@ def compare_total_revenue(pivot_table):
     total_revenue = pivot_table.sum()
     return total_revenue
 
-@st.cache_data(ttl=3600)
-def analyze_seasonality(df):
-    df['Month'] = df['InvoiceDate'].dt.month
-    monthly_revenue = df.groupby('Month')['Revenue'].mean()
+def analyze_seasonality(data):
+    cube = _as_cube(data)
+    revenue, lines = _active_monthly(cube, 'Revenue')
+    revenue, lines = revenue.sum(axis=1), lines.sum(axis=1)
+    month_index = revenue.index.to_numpy()
+    # Doanh thu trung bình mỗi dòng giao dịch theo tháng trong năm
+    month = pd.Index(month_index_month(month_index), name='Month')
+    monthly_revenue = revenue.groupby(month).sum() / lines.groupby(month).sum()
+    monthly_revenue.name = 'Revenue'
     threshold = monthly_revenue.mean() + monthly_revenue.std()
     peak_months = monthly_revenue[monthly_revenue >= threshold].index.tolist()
-    df['Quarter'] = df['InvoiceDate'].dt.quarter
-    quarterly_revenue = df.groupby('Quarter')['Revenue'].sum()
+    quarter = pd.Index((month_index_month(month_index) - 1) // 3 + 1, name='Quarter')
+    quarterly_revenue = revenue.groupby(quarter).sum()
+    quarterly_revenue.name = 'Revenue'
     quarterly_proportion = (quarterly_revenue / quarterly_revenue.sum() * 100).round(2)
     return monthly_revenue, peak_months, quarterly_proportion
 
-@st.cache_data(ttl=3600)
-def analyze_country_performance(df):
+def analyze_country_performance(data):
+    cube = _as_cube(data)
+    cube = cube.slice(cube.active_countries())
     country_metrics = pd.DataFrame()
-    country_metrics['Total_Revenue'] = df.groupby('Country')['Revenue'].sum()
-    df['Year'] = df['InvoiceDate'].dt.year
-    yearly_revenue = df.pivot_table(
-        values='Revenue', 
-        index='Country',
-        columns='Year',
-        aggfunc='sum',
-        fill_value=0
-    )
-    years = sorted(df['Year'].unique())
-    if len(years) >= 2:
-        yoy_growth = ((yearly_revenue[years[-1]] / yearly_revenue[years[-2]]) - 1) * 100
+    country_metrics['Total_Revenue'] = cube.total('Revenue')
+    revenue, lines = _active_monthly(cube, 'Revenue')
+    years = month_index_year(revenue.index.to_numpy())
+    yearly_revenue = revenue.groupby(years).sum().T
+    present_years = sorted(set(years))
+    if len(present_years) >= 2:
+        yoy_growth = ((yearly_revenue[present_years[-1]] / yearly_revenue[present_years[-2]]) - 1) * 100
         country_metrics['YoY_Growth'] = yoy_growth
-    monthly_revenue = df.groupby(['Country', 'MonthYear'])['Revenue'].sum().reset_index()
-    country_metrics['Stability'] = monthly_revenue.groupby('Country')['Revenue'].agg(lambda x: (x.std() / x.mean()) * 100)
+    # Độ biến động chỉ tính trên các tháng quốc gia có giao dịch
+    monthly_revenue = revenue.where(lines > 0)
+    country_metrics['Stability'] = monthly_revenue.std() / monthly_revenue.mean() * 100
     return country_metrics
 
 def apply_currency_threshold(df, threshold_amount):
@@ -126,7 +124,7 @@ def apply_currency_threshold(df, threshold_amount):
 def apply_quantity_threshold(df, threshold_qty):
     """Áp dụng ngưỡng số lượng để lọc giao dịch"""
     if threshold_qty > 0:
-        df = df[df['Quantity'] >= threshold_qty]
+        df = df[(df['Quantity'] >= threshold_qty).to_numpy(dtype=bool, na_value=False)]
     return df
 
 def apply_product_filter(df, excluded_products):
@@ -163,7 +161,7 @@ def calculate_growth_rate(current, previous):
 
 def analyze_product_performance(df):
     """Phân tích hiệu quả sản phẩm"""
-    product_stats = df.groupby(['StockCode', 'Description']).agg({
+    product_stats = df.groupby(['StockCode', 'Description'], observed=True).agg({
         'Quantity': 'sum',
         'Revenue': 'sum',
         'InvoiceNo': 'nunique'
@@ -238,32 +236,21 @@ def detect_outliers(df, column='Revenue', method='iqr'):
     return pd.DataFrame()
 
 def clean_data_basic(df):
-    """Làm sạch dữ liệu cơ bản"""
-    df = df.copy()
-    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce').fillna(0)
-    df['UnitPrice'] = pd.to_numeric(df['UnitPrice'], errors='coerce').fillna(0)
-    df['Revenue'] = df['Quantity'] * df['UnitPrice']
-    
-    df = df.dropna(subset=['InvoiceDate', 'CustomerID'])
-    df = df[df['Quantity'] > 0]
-    df = df[df['UnitPrice'] > 0]
-    
+    """Làm sạch dữ liệu cơ bản (cùng bộ quy tắc với phân bổ ngân sách)"""
+    df, _ = clean_frame(df, 'budget')
     return df
 
 # Functions from src/utils/data_processing.py
 def load_data(file_path):
     """Load the dataset from a CSV file or file-like object."""
-    data = pd.read_csv(file_path)
+    data = get_dataset(file_path).view('all')
     return data
 
 def preprocess_data(data):
-    """Tiền xử lý dữ liệu: tạo cột Month và tính lại Revenue."""
-    data['InvoiceDate'] = pd.to_datetime(data['InvoiceDate'])
-    data['Month'] = data['InvoiceDate'].dt.month
-    data['Quantity'] = pd.to_numeric(data['Quantity'], errors='coerce').fillna(0)
-    data['UnitPrice'] = pd.to_numeric(data['UnitPrice'], errors='coerce').fillna(0)
-    data['Revenue'] = data['Quantity'] * data['UnitPrice']
+    """Tiền xử lý dữ liệu: bỏ dòng không có ngày hợp lệ, bảo đảm có cột Month và Revenue."""
+    data, _ = clean_frame(data, 'dates')
+    if 'Month' not in data.columns:
+        data['Month'] = data['InvoiceDate'].dt.month
     return data
 
 def calculate_monthly_revenue(data):
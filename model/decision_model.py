@@ -2,15 +2,55 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import os
+import threading
 from typing import Optional, List, Dict, Any
 
+from model.snapshot_cache import read_header, sniff_date_columns, source_exists
+from model.transaction_store import get_transaction_store, month_index, month_index_year, month_index_month
+
+REQUIRED_COLUMNS = ['InvoiceDate', 'StockCode', 'Quantity', 'UnitPrice']
+
 class DecisionModel:
-    def __init__(self):
+    def __init__(self, csv_path: Optional[str] = None, background: bool = False):
         self.data = []
-        # Use flexible path for CSV data
-        self.csv_path = self._find_data_file()
+        # Prefer the uploaded dataset, fall back to the flexible CSV lookup
+        self.csv_path = csv_path or self._find_data_file()
         self.df: Optional[pd.DataFrame] = None
-        self.load_data()
+        self.date_columns: List[str] = []
+        
+        # Loading state, readable while a background load is running
+        self.progress = 0.0
+        self.status = "Chưa tải dữ liệu"
+        self.error: Optional[str] = None
+        self._ready = threading.Event()
+        
+        if background:
+            self.start_loading()
+        else:
+            self.load_data()
+    
+    @property
+    def is_ready(self) -> bool:
+        """True once loading has finished (successfully or not)"""
+        return self._ready.is_set()
+    
+    def start_loading(self):
+        """Load data on a daemon thread so the UI can render immediately"""
+        thread = threading.Thread(target=self.load_data, name="DecisionModelLoader", daemon=True)
+        thread.start()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading finishes or the timeout expires"""
+        return self._ready.wait(timeout)
+    
+    def _set_progress(self, progress: float, status: str):
+        self.progress = progress
+        self.status = status
+    
+    def _on_rows_read(self, rows_read: int, total_rows: Optional[int]):
+        """Map workbook read progress onto the 0.3-0.95 loading range"""
+        if total_rows:
+            self._set_progress(0.3 + 0.65 * min(rows_read / total_rows, 1.0), f"Đang đọc {rows_read:,}/{total_rows:,} dòng...")
     
     def _find_data_file(self) -> str:
         """Find the online_retail.csv file in various possible locations"""
@@ -31,22 +71,21 @@ class DecisionModel:
     def load_data(self):
         """Load data from CSV file"""
         try:
-            if os.path.exists(self.csv_path):
-                # Read first few rows to check columns
-                sample_df = pd.read_csv(self.csv_path, nrows=1)
-                date_columns = []
+            # csv_path may also be a directory or glob of monthly shards
+            if source_exists(self.csv_path):
+                # Sniff date columns and validate the schema from the header alone
+                self._set_progress(0.1, "Đang đọc header...")
+                header = read_header(self.csv_path)
+                missing = [col for col in REQUIRED_COLUMNS if col not in header]
+                if missing:
+                    raise ValueError(f"Thiếu cột bắt buộc: {', '.join(missing)}")
+                self.date_columns = sniff_date_columns(header)
                 
-                # Check for common date column names
-                for col in sample_df.columns:
-                    if 'date' in col.lower() or 'time' in col.lower():
-                        date_columns.append(col)
-                
-                # Load with date parsing if date columns found
-                if date_columns:
-                    self.df = pd.read_csv(self.csv_path, parse_dates=date_columns)
-                else:
-                    self.df = pd.read_csv(self.csv_path)
-                    
+                # Shared store view: one parsed copy reused by every mode
+                self._set_progress(0.3, "Đang nạp dữ liệu giao dịch...")
+                self.df = get_transaction_store(self.csv_path, progress_callback=self._on_rows_read).view('all')
+                self._set_progress(1.0, "Đã tải xong dữ liệu")
+
                 print(f"✅ Data loaded successfully from: {self.csv_path}")
                 print(f"📊 Dataset shape: {self.df.shape}")
                 print(f"📋 Columns: {list(self.df.columns)}")
@@ -61,9 +100,20 @@ class DecisionModel:
                 ]:
                     status = "✅ Found" if os.path.exists(path) else "❌ Not found"
                     print(f"   {status}: {path}")
+                self.error = f"Không tìm thấy file dữ liệu: {self.csv_path}"
                     
         except Exception as e:
+            self.error = str(e)
             print(f"❌ Error loading data: {str(e)}")
+        finally:
+            self._ready.set()
+    
+    @staticmethod
+    def _month_index(df: pd.DataFrame) -> pd.Series:
+        """Integer month index (year*12 + month), computed once at load by the store"""
+        if 'MonthIndex' in df.columns:
+            return df['MonthIndex']
+        return month_index(pd.to_datetime(df['InvoiceDate'], errors='coerce'))
     
     def get_available_products(self) -> List[str]:
         """Get list of available product codes"""
@@ -78,8 +128,8 @@ class DecisionModel:
         if self.df is None:
             return None
         
-        # Filter data for the specific product
-        product_data = self.df[self.df['StockCode'].astype(str) == str(product_code)].copy()
+        # Filter data for the specific product (StockCode is a string category)
+        product_data = self.df[self.df['StockCode'] == str(product_code)].copy()
         
         if product_data.empty:
             return None
@@ -95,12 +145,10 @@ class DecisionModel:
         if self.df is None or 'InvoiceDate' not in self.df.columns:
             return []
         
-        # Handle non-datetime columns
         try:
-            if not pd.api.types.is_datetime64_any_dtype(self.df['InvoiceDate']):
-                self.df['InvoiceDate'] = pd.to_datetime(self.df['InvoiceDate'], errors='coerce')
-            
-            available_years = sorted(self.df['InvoiceDate'].dt.year.dropna().unique().astype(int).tolist())
+            # Years come from the distinct month indexes (0 marks a missing date)
+            month_indexes = self._month_index(self.df).unique()
+            available_years = sorted(set(month_index_year(month_indexes[month_indexes > 0]).tolist()))
             return available_years
         except Exception as e:
             print(f"Error getting available years: {str(e)}")
@@ -124,19 +172,17 @@ class DecisionModel:
         # Filter data for the specific year
         if 'InvoiceDate' in product_data.columns:
             try:
-                # Ensure InvoiceDate is datetime
-                if not pd.api.types.is_datetime64_any_dtype(product_data['InvoiceDate']):
-                    product_data['InvoiceDate'] = pd.to_datetime(product_data['InvoiceDate'], errors='coerce')
-                
-                year_data = product_data[product_data['InvoiceDate'].dt.year == year].copy()
+                product_months = self._month_index(product_data)
+                in_year = month_index_year(product_months) == year
+                year_data = product_data[in_year].copy()
                 
                 if year_data.empty:
                     return {}
                 
-                # Calculate DOL for each month
-                for month in range(1, 13):
-                    month_data = year_data[year_data['InvoiceDate'].dt.month == month]
-                    
+                # Calculate DOL for each month, grouping once on the integer month
+                year_months = month_index_month(product_months[in_year])
+                for month, month_data in year_data.groupby(year_months.to_numpy()):
+                    month = int(month)
                     if not month_data.empty:
                         # Calculate DOL for this month
                         avg_unit_price = month_data['UnitPrice'].mean()
@@ -185,7 +231,7 @@ class DecisionModel:
             return 0.0
         
         # Calculate average quantity per transaction
-        avg_quantity = recent_data['Quantity'].mean()
+        avg_quantity = recent_data['Quantity'].astype('float64').mean()
         
         # Simple forecast: average quantity * number of months
         months_map = {"1 tháng tới": 1, "2 tháng tới": 2, "3 tháng tới": 3}
@@ -0,0 +1,175 @@
+"""
+Bộ nhớ đệm trên đĩa theo khóa (dấu vân tay) với giới hạn dung lượng và loại bỏ LRU
+"""
+
+import json
+import os
+import time
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', '.snapshots')
+
+# Giới hạn mặc định, có thể đổi qua biến môi trường khi triển khai
+DEFAULT_MAX_BYTES = int(float(os.environ.get('DSS_CACHE_MAX_MB', 2048)) * 1024 * 1024)
+
+
+class DiskCache:
+    """
+    Thư mục cache lưu mỗi mục thành một file tên theo khóa.
+
+    Thời điểm truy cập (atime) của file được đặt lại mỗi lần đọc trúng nên là
+    thời điểm dùng gần nhất: khi tổng dung lượng vượt max_bytes, các mục lâu
+    không dùng nhất bị xóa trước. mtime giữ nguyên thời điểm ghi, mục cũ hơn
+    ttl giây (nếu có) được coi là hết hạn.
+    Cache tạo với budget=cache khác dùng chung giới hạn dung lượng của cache đó:
+    mục của mọi cache chung ngân sách được cộng dồn và loại theo cùng một thứ tự LRU.
+    Cache chỉ là tối ưu hóa: mọi lỗi đọc/ghi đều được bỏ qua.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, ttl: Optional[float] = None,
+                 budget: Optional['DiskCache'] = None):
+        self.directory = directory
+        self.ttl = ttl
+        self.budget = budget if budget is not None else self
+        self.max_bytes = self.budget.max_bytes if budget is not None else max_bytes
+        self._members: List['DiskCache'] = [self]
+        if budget is not None:
+            budget._members.append(self)
+
+    def path_for(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def lookup(self, key: str, extension: str) -> Optional[str]:
+        """Trả về đường dẫn của mục còn hạn (và đánh dấu vừa dùng), hoặc None"""
+        path = self.path_for(key, extension)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        now = time.time()
+        if self.ttl is not None and now - stat.st_mtime > self.ttl:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path, (now, stat.st_mtime))
+        except OSError:
+            pass
+        return path
+
+    def store(self, key: str, extension: str, writer: Callable[[str], None]) -> Optional[str]:
+        """Ghi một mục qua hàm writer(tmp_path) rồi đổi tên nguyên tử và dọn cache"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(key, extension)
+        tmp_path = f"{path}.tmp"
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ Không thể ghi cache {path}: {str(e)}")
+            self._remove(tmp_path)
+            return None
+        self.budget.evict()
+        return path
+
+    def evict(self):
+        """Xóa các mục dùng lâu nhất (của mọi cache chung ngân sách) cho tới khi tổng dung lượng không vượt max_bytes"""
+        entries = []
+        for member in self._members:
+            try:
+                for entry in os.scandir(member.directory):
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        stat = entry.stat()
+                        entries.append((stat.st_atime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # --- DataFrame ---
+
+    @property
+    def frame_extension(self) -> str:
+        return 'parquet' if PARQUET_AVAILABLE else 'pkl'
+
+    def get_frame(self, key: str, columns=None) -> Optional[pd.DataFrame]:
+        """Đọc DataFrame đã lưu (chỉ các cột cần thiết nếu có), None nếu chưa có"""
+        path = self.lookup(key, self.frame_extension)
+        if path is None:
+            return None
+        try:
+            if path.endswith('.parquet'):
+                return pd.read_parquet(path, columns=columns)
+            df = pd.read_pickle(path)
+            return df[columns] if columns else df
+        except Exception as e:
+            # File hỏng (ví dụ ghi dở khi pod bị tắt): xóa để lần sau ghi lại
+            print(f"⚠️ Bỏ qua cache hỏng {path}: {str(e)}")
+            self._remove(path)
+            return None
+
+    def put_frame(self, key: str, df: pd.DataFrame, index: bool = False) -> Optional[str]:
+        """Lưu DataFrame dưới khóa key, trả về đường dẫn (None nếu không ghi được)"""
+        if PARQUET_AVAILABLE:
+            writer = lambda tmp: df.to_parquet(tmp, index=index)
+        else:
+            writer = lambda tmp: (df if index else df.reset_index(drop=True)).to_pickle(tmp)
+        return self.store(key, self.frame_extension, writer)
+
+    # --- JSON ---
+
+    def get_json(self, key: str):
+        """Đọc giá trị JSON đã lưu, None nếu chưa có hoặc đã hết hạn"""
+        path = self.lookup(key, 'json')
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ Bỏ qua cache hỏng {path}: {str(e)}")
+            self._remove(path)
+            return None
+
+    def put_json(self, key: str, value) -> Optional[str]:
+        """Lưu giá trị JSON dưới khóa key, trả về đường dẫn (None nếu không ghi được)"""
+        def writer(tmp):
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+        return self.store(key, 'json', writer)
+
+
+# Cache dùng chung cho snapshot dữ liệu gốc và các view đã làm sạch
+DATASET_CACHE = DiskCache(CACHE_ROOT)
+
+# Cache câu trả lời của Gemini theo prompt: nhỏ, có hạn dùng vì khuyến nghị có thể được cải thiện
+RECOMMENDATION_CACHE = DiskCache(
+    os.path.join(CACHE_ROOT, 'recommendations'),
+    max_bytes=int(float(os.environ.get('DSS_LLM_CACHE_MAX_MB', 16)) * 1024 * 1024),
+    ttl=float(os.environ.get('DSS_LLM_CACHE_TTL_HOURS', 24)) * 3600,
+)
+
+# Các lô hóa đơn đã ghép thêm vào dataset: là dữ liệu chứ không phải bản sao tính lại được,
+# nên không giới hạn dung lượng (không bao giờ bị loại) và nằm ngoài ngân sách của DATASET_CACHE
+APPENDED_BATCHES = DiskCache(
+    os.path.join(os.path.dirname(CACHE_ROOT), '.batches'),
+    max_bytes=float('inf'),
+)
@@ -0,0 +1,87 @@
+"""
+Chỉ số quốc gia cho mọi khung thời gian chuẩn trong một lượt bằng tổng tích lũy theo tháng
+"""
+
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from model.revenue_cube import RevenueCube
+
+# Các khung thời gian (tháng) chọn được trên trang phân bổ ngân sách
+STANDARD_HORIZONS = (3, 6, 9, 12, 18, 24)
+
+
+def _trailing_sums(monthly: np.ndarray) -> np.ndarray:
+    """
+    Tổng tích lũy từ tháng mới nhất về trước, có thêm hàng 0 ở đầu:
+    kết quả[h] là tổng của h tháng gần nhất (h lớn hơn số tháng thì lấy toàn bộ).
+    """
+    trailing = np.cumsum(monthly[::-1], axis=0)
+    return np.vstack([np.zeros((1, monthly.shape[1])), trailing])
+
+
+def horizon_metrics(cube: RevenueCube, horizons: Sequence[int] = STANDARD_HORIZONS) -> pd.DataFrame:
+    """
+    Doanh thu, số đơn, độ ổn định doanh thu tháng và tăng trưởng nửa sau so với
+    nửa trước của h tháng gần nhất, cho mọi quốc gia trong khối và mọi h.
+
+    Mỗi đại lượng chỉ cần một lần tổng tích lũy trên chuỗi tháng × quốc gia; mỗi
+    khung thời gian là phép trừ hai hàng. Độ lệch chuẩn tính từ tổng và tổng bình
+    phương trên các tháng quốc gia có giao dịch (giống groupby theo tháng). Với h
+    lẻ, hai nửa là h//2 tháng gần nhất và h//2 tháng liền trước; khi lịch sử
+    ngắn hơn h, hai nửa chia đều số tháng hiện có để vẫn so sánh được.
+
+    Trả về bảng dài: một dòng cho mỗi (Horizon_Months, Country), kèm các điểm
+    Revenue/Order_Frequency/Stability/Overall_Score tính trong từng khung.
+    """
+    revenue = cube.monthly('Revenue').to_numpy(dtype='float64')
+    orders = cube.monthly('Orders').to_numpy(dtype='float64')
+    active = (cube.monthly('Lines').to_numpy() > 0).astype('float64')
+    n_months = len(revenue)
+
+    revenue_sum = _trailing_sums(revenue)
+    orders_sum = _trailing_sums(orders)
+    active_revenue_sum = _trailing_sums(revenue * active)
+    active_square_sum = _trailing_sums(revenue ** 2 * active)
+    active_months = _trailing_sums(active)
+
+    frames = []
+    for horizon in horizons:
+        h = min(horizon, n_months)
+        half = min(horizon // 2, n_months // 2)
+        n = active_months[h]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = active_revenue_sum[h] / n
+            variance = np.maximum(active_square_sum[h] - n * mean ** 2, 0) / (n - 1)
+            std = np.where(n > 1, np.sqrt(variance), np.nan)
+            stability = np.where(mean > 0, mean / std, 0)
+            recent_half = revenue_sum[half]
+            previous_half = revenue_sum[2 * half] - revenue_sum[half]
+            half_growth = np.where(previous_half > 0, (recent_half / previous_half - 1) * 100, np.nan)
+        frames.append(pd.DataFrame({
+            'Horizon_Months': horizon,
+            'Country': cube.countries,
+            'Total_Revenue': revenue_sum[h],
+            'Avg_Monthly_Revenue': revenue_sum[h] / horizon,
+            'Total_Orders': orders_sum[h],
+            'Avg_Orders_Per_Month': orders_sum[h] / horizon,
+            'Revenue_Stability': stability,
+            'Recent_Half_Revenue': recent_half,
+            'Previous_Half_Revenue': previous_half,
+            'Half_Period_Growth': half_growth,
+        }))
+    metrics = pd.concat(frames, ignore_index=True)
+
+    # Điểm như analyze_countries_comprehensive, chuẩn hóa theo giá trị lớn nhất trong từng khung
+    by_horizon = metrics.groupby('Horizon_Months', sort=False)
+    metrics['Revenue_Score'] = metrics['Avg_Monthly_Revenue'] / by_horizon['Avg_Monthly_Revenue'].transform('max') * 10
+    metrics['Order_Frequency_Score'] = metrics['Avg_Orders_Per_Month'] / by_horizon['Avg_Orders_Per_Month'].transform('max') * 10
+    metrics['Stability_Score'] = np.clip(metrics['Revenue_Stability'] * 2, 0, 10)
+    metrics['Overall_Score'] = (
+        metrics['Revenue_Score'] * 0.5 +
+        metrics['Order_Frequency_Score'] * 0.35 +
+        metrics['Stability_Score'] * 0.15
+    )
+    return metrics
@@ -5,6 +5,9 @@ Model cho chức năng phân tích doanh thu theo tháng
 import pandas as pd
 import numpy as np
 
+from model.cleaning import clean_frame
+from model.streaming_ingest import get_dataset
+
 class MonthlyRevenueModel:
     def __init__(self):
         self.data = None
@@ -13,19 +16,17 @@ class MonthlyRevenueModel:
     def load_data(self, file_path):
         """Load the dataset from a CSV file or file-like object."""
         try:
-            data = pd.read_csv(file_path)
+            data = get_dataset(file_path).view('all')
             return data, None
         except Exception as e:
             return None, str(e)
     
     def preprocess_data(self, data):
-        """Tiền xử lý dữ liệu: tạo cột Month và tính lại Revenue."""
+        """Tiền xử lý dữ liệu: bỏ dòng không có ngày hợp lệ, bảo đảm có cột Month và Revenue."""
         try:
-            data['InvoiceDate'] = pd.to_datetime(data['InvoiceDate'])
-            data['Month'] = data['InvoiceDate'].dt.month
-            data['Quantity'] = pd.to_numeric(data['Quantity'], errors='coerce').fillna(0)
-            data['UnitPrice'] = pd.to_numeric(data['UnitPrice'], errors='coerce').fillna(0)
-            data['Revenue'] = data['Quantity'] * data['UnitPrice']
+            data, _ = clean_frame(data, 'dates')
+            if 'Month' not in data.columns:
+                data['Month'] = data['InvoiceDate'].dt.month
             self.data = data
             return data, None
         except Exception as e:
@@ -0,0 +1,130 @@
+"""
+Phân bổ ngân sách hai cấp: quốc gia → các bậc sản phẩm → từng sản phẩm
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Bậc sản phẩm theo thứ hạng doanh thu trong quốc gia: (số sản phẩm, None = phần còn lại)
+PRODUCT_TIERS = {
+    'core': 1,
+    'growth': 1,
+    'diversify': None,
+}
+
+# Tỷ trọng ngân sách mặc định (%) của mỗi bậc - mô hình 30-10-60
+DEFAULT_TIER_WEIGHTS = {
+    'core': 30,
+    'growth': 10,
+    'diversify': 60,
+}
+
+TIER_LABELS = {
+    'core': 'Sản phẩm chủ lực',
+    'growth': 'Sản phẩm tiềm năng',
+    'diversify': 'Đa dạng hóa',
+}
+
+TIER_REASONS = {
+    'core': 'Sản phẩm chủ lực - doanh thu ổn định cao',
+    'growth': 'Phát triển tiềm năng - cơ hội tăng trưởng',
+    'diversify': 'Đa dạng hóa - giảm rủi ro portfolio',
+}
+
+
+def normalized_tier_weights(tier_weights: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Tỷ trọng (%) của các bậc sau khi chuẩn hóa tổng về 100, như allocate_product_budgets áp dụng"""
+    weights = {**DEFAULT_TIER_WEIGHTS, **(tier_weights or {})}
+    total = sum(weights[tier] for tier in PRODUCT_TIERS)
+    if total <= 0:
+        return {tier: 100 / len(PRODUCT_TIERS) for tier in PRODUCT_TIERS}
+    return {tier: weights[tier] / total * 100 for tier in PRODUCT_TIERS}
+
+
+def strategy_percentages(strategy: Optional[Dict]) -> Optional[Dict[str, float]]:
+    """Tỷ trọng (%) thực tế của các bậc trong chiến lược của một quốc gia (None nếu chưa có)"""
+    if not isinstance(strategy, dict):
+        return None
+    return {tier: strategy[tier]['percentage'] for tier in PRODUCT_TIERS}
+
+
+def tier_split_label(percentages: Dict[str, float]) -> str:
+    """Nhãn kiểu '30-10-60' theo thứ tự các bậc"""
+    return '-'.join(f"{round(percentages[tier], 1):g}" for tier in PRODUCT_TIERS)
+
+
+def allocate_product_budgets(products: pd.DataFrame, country_budgets: pd.Series,
+                             tier_weights: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    Chia ngân sách của từng quốc gia cho các sản phẩm trong một lượt trên bảng dài.
+
+    products có một dòng cho mỗi (Country, StockCode) với Total_Revenue;
+    country_budgets là ngân sách theo quốc gia. Sản phẩm được xếp hạng theo
+    doanh thu trong quốc gia rồi gán bậc theo PRODUCT_TIERS. Ngân sách quốc gia
+    chia cho các bậc theo tier_weights, chuẩn hóa lại trên các bậc thực sự có
+    sản phẩm để không bỏ sót ngân sách; trong một bậc chia theo doanh thu.
+
+    Trả về products kèm Rank, Tier, Tier_Percentage, Tier_Budget, Product_Budget.
+    """
+    weights = {**DEFAULT_TIER_WEIGHTS, **(tier_weights or {})}
+    if any(weight < 0 for weight in weights.values()):
+        raise ValueError("Tỷ trọng ngân sách của các bậc sản phẩm không được âm")
+
+    columns = list(products.columns) + ['Rank', 'Tier', 'Tier_Percentage', 'Tier_Budget', 'Product_Budget']
+    if len(products) == 0:
+        return pd.DataFrame(columns=columns)
+
+    df = products.sort_values(['Country', 'Total_Revenue'], ascending=[True, False], kind='stable')
+    df = df.reset_index(drop=True)
+    df['Rank'] = df.groupby('Country', sort=False).cumcount() + 1
+
+    # Bậc theo thứ hạng: ranh giới là tổng tích lũy số sản phẩm của các bậc có giới hạn
+    tier_names = list(PRODUCT_TIERS)
+    bounded = [size for size in PRODUCT_TIERS.values() if size is not None]
+    tier_codes = np.searchsorted(np.cumsum(bounded), df['Rank'].to_numpy(), side='left')
+    tier_codes = np.minimum(tier_codes, len(tier_names) - 1)
+    df['Tier'] = pd.Categorical.from_codes(tier_codes, categories=tier_names)
+
+    raw_weight = pd.Series([weights[name] for name in tier_names], index=tier_names, dtype='float64')
+    tier_weight = raw_weight.to_numpy()[tier_codes]
+    tiers = df[['Country']].assign(Tier=tier_codes, Weight=tier_weight)
+    # Tổng tỷ trọng các bậc có mặt trong quốc gia (mỗi bậc tính một lần)
+    present = tiers.drop_duplicates(['Country', 'Tier'])
+    country_weight = df['Country'].map(present.groupby('Country')['Weight'].sum())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tier_share = np.where(country_weight > 0, tier_weight / country_weight, 0.0)
+        if not (country_weight > 0).all():
+            # Mọi bậc có mặt đều có tỷ trọng 0: chia đều giữa các bậc
+            n_tiers = df['Country'].map(present.groupby('Country').size()).to_numpy()
+            tier_share = np.where(country_weight > 0, tier_share, 1.0 / n_tiers)
+
+    budget = df['Country'].map(country_budgets).fillna(0).to_numpy(dtype='float64')
+    df['Tier_Percentage'] = tier_share * 100
+    df['Tier_Budget'] = budget * tier_share
+
+    # Trong một bậc: chia theo doanh thu (chia đều nếu tổng doanh thu bằng 0)
+    revenue = df['Total_Revenue'].clip(lower=0)
+    group_keys = [df['Country'], tier_codes]
+    tier_revenue = revenue.groupby(group_keys).transform('sum')
+    tier_size = revenue.groupby(group_keys).transform('size')
+    product_share = np.where(tier_revenue > 0, revenue / tier_revenue.where(tier_revenue > 0), 1.0 / tier_size)
+    df['Product_Budget'] = df['Tier_Budget'] * product_share
+    return df[columns]
+
+
+def product_strategy(country_products: pd.DataFrame) -> Optional[Dict]:
+    """Chiến lược theo bậc của một quốc gia (dạng dict dùng trong khuyến nghị)"""
+    if len(country_products) == 0:
+        return None
+    strategy = {}
+    for tier in PRODUCT_TIERS:
+        rows = country_products[country_products['Tier'] == tier]
+        strategy[tier] = {
+            'percentage': float(rows['Tier_Percentage'].iloc[0]) if len(rows) else 0.0,
+            'budget': float(rows['Tier_Budget'].iloc[0]) if len(rows) else 0.0,
+            'products': rows.drop(columns=['Country', 'Tier']).to_dict('records'),
+            'reason': TIER_REASONS[tier],
+        }
+    return strategy
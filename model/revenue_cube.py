@@ -0,0 +1,182 @@
+"""
+Khối dữ liệu dày đặc quốc gia × ngày (cuộn lên theo tháng) của các độ đo cộng được
+"""
+
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Độ đo cộng được theo ô (quốc gia, ngày)
+CUBE_MEASURES = ('Revenue', 'Orders', 'Quantity', 'Lines')
+
+
+class RevenueCube:
+    """
+    Doanh thu, số đơn, số lượng và số dòng giao dịch theo (quốc gia, ngày).
+
+    Được tính một lần cho mỗi dataset; đổi khoảng thời gian hay lựa chọn quốc
+    gia chỉ là cắt mảng (view NumPy, không sao chép), các bảng theo tháng là
+    phép cộng trên trục ngày. Số đơn đếm số InvoiceNo khác nhau trong mỗi ô nên
+    cộng được theo ngày với giả định một hóa đơn chỉ thuộc một ngày và một quốc gia.
+    """
+
+    def __init__(self, countries: pd.Index, start_day: np.datetime64, measures: Dict[str, np.ndarray]):
+        self.countries = pd.Index(countries, name='Country')
+        self.start_day = np.datetime64(start_day, 'D')
+        self.measures = measures
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'RevenueCube':
+        """Gom các dòng giao dịch vào khối bằng bincount trên chỉ số phẳng (quốc gia, ngày)"""
+        country = df['Country']
+        if isinstance(country.dtype, pd.CategoricalDtype):
+            codes, countries = country.cat.codes.to_numpy(), country.cat.categories
+        else:
+            codes, countries = pd.factorize(country, sort=True)
+        days = df['InvoiceDate'].to_numpy().astype('datetime64[D]')
+        valid = (codes >= 0) & ~np.isnat(days)
+        codes, days = codes[valid], days[valid]
+
+        if len(days) == 0:
+            empty = np.zeros((0, 0))
+            return cls(pd.Index([]), np.datetime64('NaT', 'D'), {m: empty for m in CUBE_MEASURES})
+
+        start_day = days.min()
+        n_days = int((days.max() - start_day).astype('int64')) + 1
+        size = len(countries) * n_days
+        flat = codes.astype('int64') * n_days + (days - start_day).astype('int64')
+
+        def summed(column):
+            if column not in df.columns:
+                return np.zeros(size)
+            weights = df[column].to_numpy(dtype='float64', na_value=0)[valid]
+            return np.bincount(flat, weights=np.nan_to_num(weights), minlength=size)
+
+        measures = {
+            'Revenue': summed('Revenue'),
+            'Quantity': summed('Quantity'),
+            'Lines': np.bincount(flat, minlength=size),
+        }
+        if 'InvoiceNo' in df.columns:
+            invoices, _ = pd.factorize(df['InvoiceNo'])
+            invoices = invoices[valid].astype('int64')
+            n_invoices = int(invoices.max()) + 2
+            # Cặp (ô, hóa đơn) khác nhau; hóa đơn thiếu mã (-1) được đếm như một mã riêng
+            cell_invoice = np.unique(flat * n_invoices + (invoices + 1))
+            measures['Orders'] = np.bincount(cell_invoice // n_invoices, minlength=size)
+        else:
+            measures['Orders'] = np.zeros(size, dtype='int64')
+
+        measures = {name: values.reshape(len(countries), n_days) for name, values in measures.items()}
+        # Bỏ category không có giao dịch (giống groupby observed=True)
+        observed = measures['Lines'].sum(axis=1) > 0
+        return cls(pd.Index(countries)[observed], start_day,
+                   {name: values[observed] for name, values in measures.items()})
+
+    def merged(self, other: 'RevenueCube') -> 'RevenueCube':
+        """
+        Khối tổng của hai khối (hợp các quốc gia và khoảng ngày), dùng khi ghép
+        thêm lô giao dịch: chi phí theo kích thước khối, không theo số dòng.
+        Một hóa đơn có dòng ở cả hai khối trong cùng ô được đếm hai lần.
+        """
+        if other.n_days == 0 or len(other.countries) == 0:
+            return self
+        if self.n_days == 0 or len(self.countries) == 0:
+            return other
+        countries = self.countries.union(other.countries)
+        start_day = min(self.start_day, other.start_day)
+        end_day = max(self.start_day + self.n_days, other.start_day + other.n_days)
+        n_days = int((end_day - start_day).astype('int64'))
+
+        measures = {}
+        for name in CUBE_MEASURES:
+            values = np.zeros((len(countries), n_days),
+                              dtype=np.result_type(self.measures[name], other.measures[name]))
+            for cube in (self, other):
+                rows = countries.get_indexer(cube.countries)
+                first = int((cube.start_day - start_day).astype('int64'))
+                values[rows, first:first + cube.n_days] += cube.measures[name]
+            measures[name] = values
+        return RevenueCube(countries, start_day, measures)
+
+    @property
+    def n_days(self) -> int:
+        return self.measures['Lines'].shape[1]
+
+    @property
+    def days(self) -> np.ndarray:
+        return self.start_day + np.arange(self.n_days)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.measures['Lines'].sum() == 0
+
+    def last_day(self) -> Optional[pd.Timestamp]:
+        """Ngày cuối cùng có giao dịch trong khối"""
+        active = np.flatnonzero(self.measures['Lines'].sum(axis=0))
+        if len(active) == 0:
+            return None
+        return pd.Timestamp(self.start_day + active[-1])
+
+    def slice(self, countries: Optional[Iterable] = None, start=None, end=None) -> 'RevenueCube':
+        """
+        Cắt khối theo danh sách quốc gia (giữ thứ tự truyền vào, quốc gia không có
+        dữ liệu nhận 0) và theo khoảng ngày [start, end] tính cả hai đầu.
+        """
+        first, last = 0, self.n_days
+        if start is not None and self.n_days:
+            first = int(np.clip((np.datetime64(pd.Timestamp(start).date(), 'D') - self.start_day).astype('int64'), 0, self.n_days))
+        if end is not None and self.n_days:
+            last = int(np.clip((np.datetime64(pd.Timestamp(end).date(), 'D') - self.start_day).astype('int64') + 1, first, self.n_days))
+        measures = {name: values[:, first:last] for name, values in self.measures.items()}
+        start_day = self.start_day + first if self.n_days else self.start_day
+
+        if countries is None:
+            return RevenueCube(self.countries, start_day, measures)
+        countries = pd.Index(list(countries))
+        positions = self.countries.get_indexer(countries)
+        if (positions >= 0).all():
+            measures = {name: values[positions] for name, values in measures.items()}
+        else:
+            measures = {
+                name: np.where((positions >= 0)[:, None], values[np.maximum(positions, 0)], 0)
+                if len(self.countries) else np.zeros((len(countries), last - first), dtype=values.dtype)
+                for name, values in measures.items()
+            }
+        return RevenueCube(countries, start_day, measures)
+
+    def active_countries(self) -> pd.Index:
+        """Quốc gia có ít nhất một giao dịch trong khối"""
+        return self.countries[self.measures['Lines'].sum(axis=1) > 0]
+
+    def total(self, measure: str) -> pd.Series:
+        """Tổng độ đo theo quốc gia"""
+        return pd.Series(self.measures[measure].sum(axis=1), index=self.countries, name=measure)
+
+    def month_index(self) -> np.ndarray:
+        """MonthIndex (year*12 + month) liên tục từ tháng đầu tới tháng cuối của khối"""
+        if self.n_days == 0:
+            return np.zeros(0, dtype='int32')
+        months = self.days.astype('datetime64[M]').astype('int64')
+        return np.arange(months[0], months[-1] + 1, dtype='int32') + 1970 * 12 + 1
+
+    def complete_months(self) -> np.ndarray:
+        """Mặt nạ theo month_index(): True ở các tháng có mọi ngày nằm trong khoảng ngày của khối"""
+        if self.n_days == 0:
+            return np.zeros(0, dtype=bool)
+        first_day, last_day = self.start_day, self.start_day + self.n_days - 1
+        months = np.arange(first_day.astype('datetime64[M]'), last_day.astype('datetime64[M]') + 1)
+        month_first = months.astype('datetime64[D]')
+        month_last = (months + 1).astype('datetime64[D]') - 1
+        return (month_first >= first_day) & (month_last <= last_day)
+
+    def monthly(self, measure: str) -> pd.DataFrame:
+        """Bảng tháng × quốc gia của độ đo (tháng đầu/cuối chỉ gồm các ngày trong khối)"""
+        index = pd.Index(self.month_index(), name='MonthIndex')
+        if self.n_days == 0:
+            return pd.DataFrame(index=index, columns=self.countries, dtype='float64')
+        months = self.days.astype('datetime64[M]').astype('int64')
+        boundaries = np.concatenate([[0], np.flatnonzero(np.diff(months)) + 1])
+        values = np.add.reduceat(self.measures[measure], boundaries, axis=1)
+        return pd.DataFrame(values.T, index=index, columns=self.countries)
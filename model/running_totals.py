@@ -0,0 +1,88 @@
+"""
+Bảng tổng theo khóa cộng dồn được qua các khối hoặc lô giao dịch
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Tổng theo khách hàng và theo sản phẩm × tháng của dữ liệu phân bổ ngân sách
+CUSTOMER_KEYS = ['Country', 'CustomerID']
+PRODUCT_MONTH_KEYS = ['StockCode', 'MonthIndex']
+
+# Cách gộp hai phần tổng của cùng một nhóm
+TOTALS_AGGREGATIONS = {
+    'Quantity': 'sum',
+    'Revenue': 'sum',
+    'Orders': 'sum',
+    'Lines': 'sum',
+    'FirstPurchase': 'min',
+    'LastPurchase': 'max',
+}
+
+
+class RunningTotals:
+    """
+    Bảng tổng theo khóa được cộng dồn qua từng khối.
+
+    Mỗi khối thêm một phần đã gom theo khóa; các phần chờ chỉ được gom vào bảng
+    chính khi tổng số dòng của chúng vượt kích thước bảng, nên tổng chi phí gom
+    tỷ lệ với số nhóm chứ không phải số khối × số nhóm.
+    """
+
+    def __init__(self, aggregations: Dict[str, str]):
+        self.aggregations = aggregations
+        self._table: Optional[pd.DataFrame] = None
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows = 0
+
+    def add(self, part: pd.DataFrame):
+        if part.empty:
+            return
+        self._pending.append(part)
+        self._pending_rows += len(part)
+        if self._table is None or self._pending_rows >= len(self._table):
+            self._compact()
+
+    def _compact(self):
+        if not self._pending:
+            return
+        parts = ([self._table] if self._table is not None else []) + self._pending
+        table = pd.concat(parts)
+        levels = list(range(table.index.nlevels))
+        self._table = table.groupby(level=levels, sort=False).agg(self.aggregations)
+        self._pending, self._pending_rows = [], 0
+
+    def frame(self) -> Optional[pd.DataFrame]:
+        """Bảng đã gom (None nếu chưa có dòng nào)"""
+        self._compact()
+        return self._table
+
+
+def _group_invoices(df: pd.DataFrame, keys: List[str]) -> np.ndarray:
+    columns = {key: df[key] for key in keys}
+    columns['InvoiceNo'] = df['InvoiceNo']
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+
+
+def group_totals(rows: pd.DataFrame, keys: List[str], existing: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Quantity, Revenue, Orders, Lines và ngày mua đầu/cuối theo khóa (cột TOTALS_AGGREGATIONS).
+
+    existing là các dòng đã được cộng trước đó của cùng các hóa đơn: một hóa đơn
+    đã có dòng trong cùng nhóm không được đếm thêm vào Orders.
+    """
+    totals = rows.groupby(keys, observed=True, sort=False).agg(
+        Quantity=('Quantity', 'sum'),
+        Revenue=('Revenue', 'sum'),
+        Orders=('InvoiceNo', 'nunique'),
+        Lines=('Revenue', 'size'),
+        FirstPurchase=('InvoiceDate', 'min'),
+        LastPurchase=('InvoiceDate', 'max'),
+    )
+    if existing is not None and len(existing) and len(rows):
+        repeated = rows[np.isin(_group_invoices(rows, keys), _group_invoices(existing, keys))]
+        counted = repeated.groupby(keys, observed=True, sort=False)['InvoiceNo'].nunique()
+        totals['Orders'] = totals['Orders'].sub(counted, fill_value=0).astype(totals['Orders'].dtype)
+    return totals
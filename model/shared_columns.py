@@ -0,0 +1,83 @@
+"""
+Cột số dùng chung giữa các phiên và các process qua file memory-map chỉ đọc
+"""
+
+import os
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from model.disk_cache import CACHE_ROOT, DATASET_CACHE, DiskCache
+
+MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+# File .npy bất biến theo dấu vân tay; tính chung giới hạn dung lượng và LRU với các snapshot
+COLUMN_CACHE = DiskCache(os.path.join(CACHE_ROOT, 'columns'), budget=DATASET_CACHE)
+
+# Mảng memory-map chỉ đọc: mọi phép ghi phải tạo bản riêng (copy-on-write). Đây là
+# mặc định từ pandas 3; với pandas cũ hơn bật tường minh cho toàn bộ process
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+def _column_key(key: str, column: str, part: str) -> str:
+    return f"{key}-{re.sub(r'[^0-9A-Za-z_]', '_', str(column))}-{part}"
+
+
+def _mapped(array: np.ndarray, key: str) -> Optional[np.ndarray]:
+    """Ghi mảng ra file .npy (nếu chưa có) rồi map lại ở chế độ chỉ đọc"""
+    path = COLUMN_CACHE.lookup(key, 'npy')
+    if path is None:
+        def writer(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+        path = COLUMN_CACHE.store(key, 'npy', writer)
+        if path is None:
+            return None
+    try:
+        mapped = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if mapped.shape != array.shape or mapped.dtype != array.dtype:
+        return None
+    return mapped
+
+
+def _share_series(series: pd.Series, key: str) -> pd.Series:
+    values = series.array
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Chỉ mã category được map; danh sách category nhỏ nên giữ trong process
+        codes = _mapped(values.codes, _column_key(key, series.name, 'codes'))
+        if codes is not None:
+            shared = pd.Categorical.from_codes(codes, dtype=series.dtype)
+            return pd.Series(shared, index=series.index, name=series.name, copy=False)
+    elif isinstance(values, MASKED_ARRAYS):
+        # Giá trị (ô thiếu ghi 0) và mặt nạ thiếu lấy qua API công khai rồi dựng lại mảng có mặt nạ
+        na_value = False if series.dtype.kind == 'b' else 0
+        data = _mapped(series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=na_value),
+                       _column_key(key, series.name, 'data'))
+        mask = _mapped(series.isna().to_numpy(), _column_key(key, series.name, 'mask'))
+        if data is not None and mask is not None:
+            return pd.Series(type(values)(data, mask), index=series.index, name=series.name, copy=False)
+    elif series.dtype.kind in 'iufbM':
+        data = _mapped(series.to_numpy(), _column_key(key, series.name, 'values'))
+        if data is not None:
+            return pd.Series(data, index=series.index, name=series.name, copy=False)
+    # Cột chuỗi/object hoặc không ghi được cache: giữ bản trong bộ nhớ
+    return series
+
+
+def share_frame(frame: pd.DataFrame, key: str) -> pd.DataFrame:
+    """
+    Trả về bảng có cùng dữ liệu nhưng các cột số, ngày và mã category nằm trên
+    file memory-map chỉ đọc (khóa theo dấu vân tay).
+
+    Mọi phiên Streamlit, process con hay server khác trên cùng máy mở cùng một
+    dataset đều map cùng các file này, nên hệ điều hành chỉ giữ một bản trong
+    page cache. Các mảng chỉ đọc; ghi vào cột (copy-on-write, bật ở đầu module)
+    sẽ tạo bản riêng cho cột đó ở phía gọi.
+    """
+    columns = {col: _share_series(frame[col], key) for col in frame.columns}
+    return pd.DataFrame(columns, index=frame.index, copy=False)
@@ -0,0 +1,372 @@
+"""
+Snapshot dạng cột (Parquet) cho các file dữ liệu bán lẻ đã upload
+"""
+
+import os
+import glob
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.api.types import union_categoricals
+
+from model.disk_cache import DATASET_CACHE
+
+# Lấy mẫu nội dung cho dấu vân tay: file nhỏ hơn SAMPLE_FULL_BYTES được băm toàn bộ,
+# file lớn hơn băm SAMPLE_BLOCKS khối SAMPLE_BLOCK_BYTES trải đều (gồm khối đầu và cuối)
+SAMPLE_BLOCK_BYTES = 64 * 1024
+SAMPLE_BLOCKS = 16
+SAMPLE_FULL_BYTES = SAMPLE_BLOCK_BYTES * SAMPLE_BLOCKS
+
+# (đường dẫn, kích thước, mtime) -> dấu vân tay, để mỗi lần rerun không phải đọc lại file
+_fingerprint_memo: Dict[Tuple[str, int, int], str] = {}
+_fingerprint_lock = threading.Lock()
+
+# Tăng khi TRANSACTION_SCHEMA hoặc cách parse/ép kiểu thay đổi để bỏ qua các snapshot đã lưu
+RAW_SNAPSHOT_VERSION = 4
+
+# Đuôi file được nhận là một phần (shard) khi nguồn là thư mục
+SHARD_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# Kiểu dữ liệu được ép ngay khi parse file gốc lần đầu
+TEXT_COLUMNS = ['InvoiceNo', 'StockCode', 'Description', 'Country']
+NUMERIC_COLUMNS = ['Quantity', 'UnitPrice', 'CustomerID', 'Revenue']
+
+# Số dòng mỗi khối khi đọc CSV: bộ nhớ đỉnh là bảng đã ép kiểu cộng một khối chuỗi thô
+CSV_CHUNK_ROWS = 200_000
+
+# Các cột được đọc từ workbook Excel; các cột khác trong sheet bị bỏ qua
+EXCEL_COLUMNS = TEXT_COLUMNS + ['InvoiceDate', 'Quantity', 'UnitPrice', 'CustomerID', 'Revenue']
+EXCEL_PROGRESS_EVERY = 50_000
+
+# Schema tối ưu bộ nhớ cho bảng giao dịch: khóa chuỗi dạng category, số lượng
+# và mã khách hàng số nguyên cho phép thiếu (ô trống vẫn bị quy tắc làm sạch nhận
+# là thiếu, không thành 0). Đơn giá giữ float64 để doanh thu, ngân sách và ROI
+# khớp tới từng xu với phép tính trên dữ liệu gốc; đơn giá thiếu giữ NaN (không thành 0)
+# để không kéo giảm các giá trị trung bình
+TRANSACTION_SCHEMA = {
+    'InvoiceNo': 'category',
+    'StockCode': 'category',
+    'Description': 'category',
+    'Country': 'category',
+    'Quantity': 'Int32',
+    'UnitPrice': 'float64',
+    'CustomerID': 'Int32',
+}
+
+
+def resolve_source_path(source) -> Optional[str]:
+    """Lấy đường dẫn file từ str/PathLike hoặc file object đã mở từ đĩa"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    name = getattr(source, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
+
+
+def _sample_digest(path: str, size: int) -> str:
+    """Băm kích thước file cùng các khối nội dung được lấy mẫu"""
+    digest = hashlib.blake2b(str(size).encode('utf-8'), digest_size=20)
+    with open(path, 'rb') as f:
+        if size <= SAMPLE_FULL_BYTES:
+            digest.update(f.read())
+        else:
+            step = (size - SAMPLE_BLOCK_BYTES) / (SAMPLE_BLOCKS - 1)
+            for i in range(SAMPLE_BLOCKS):
+                f.seek(int(i * step))
+                digest.update(f.read(SAMPLE_BLOCK_BYTES))
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    Dấu vân tay của file dựa trên kích thước và các khối nội dung lấy mẫu.
+
+    Khóa không chứa đường dẫn hay mtime nên cùng một file upload lại (luôn ghi đè
+    data/uploaded_data.csv) hoặc sau khi khởi động lại server vẫn trúng cache;
+    (đường dẫn, kích thước, mtime) chỉ dùng để nhớ kết quả băm trong process.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _fingerprint_lock:
+        fingerprint = _fingerprint_memo.get(memo_key)
+    if fingerprint is None:
+        fingerprint = _sample_digest(path, stat.st_size)
+        with _fingerprint_lock:
+            _fingerprint_memo[memo_key] = fingerprint
+    return fingerprint
+
+
+def resolve_shards(path: str) -> Optional[List[str]]:
+    """Danh sách file (đã sắp xếp) nếu nguồn là thư mục hoặc mẫu glob, None nếu là một file"""
+    if os.path.isdir(path):
+        shards = [os.path.join(path, name) for name in os.listdir(path)
+                  if name.lower().endswith(SHARD_EXTENSIONS)]
+    elif any(ch in path for ch in '*?['):
+        shards = glob.glob(path)
+    else:
+        return None
+    if not shards:
+        raise FileNotFoundError(f"Không tìm thấy file dữ liệu trong: {path}")
+    return sorted(shards)
+
+
+def source_exists(path: str) -> bool:
+    """File, thư mục hoặc mẫu glob có ít nhất một file dữ liệu"""
+    try:
+        return resolve_shards(path) is not None or os.path.isfile(path)
+    except FileNotFoundError:
+        return False
+
+
+def source_fingerprint(path: str) -> str:
+    """Dấu vân tay của nguồn: của file, hoặc băm các dấu vân tay shard theo thứ tự"""
+    shards = resolve_shards(path)
+    if shards is None:
+        return file_fingerprint(path)
+    digest = hashlib.blake2b(digest_size=20)
+    for shard in shards:
+        digest.update(file_fingerprint(shard).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def sniff_date_columns(columns) -> List[str]:
+    """Nhận diện cột ngày/giờ chỉ dựa trên tên cột trong header"""
+    return [col for col in columns if 'date' in col.lower() or 'time' in col.lower()]
+
+
+def _is_excel(path_or_type: str) -> bool:
+    return str(path_or_type).lower().endswith(('.xlsx', '.xls', 'excel'))
+
+
+def read_header(path: str) -> pd.Index:
+    """Đọc tên cột từ dòng đầu tiên mà không parse dữ liệu (CSV hoặc workbook .xlsx)"""
+    shards = resolve_shards(path)
+    if shards is not None:
+        # Các shard cùng cấu trúc: header của shard đầu tiên đại diện cho cả nguồn
+        path = shards[0]
+    if path.lower().endswith('.xlsx'):
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            first_row = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        return pd.Index([str(name).strip() for name in first_row if name is not None])
+    if path.lower().endswith('.xls'):
+        return pd.read_excel(path, nrows=0).columns.astype(str).str.strip()
+    return pd.read_csv(path, nrows=0).columns.str.strip()
+
+
+def apply_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Chuẩn hóa tên cột, ép kiểu số và parse sẵn các cột ngày"""
+    df.columns = df.columns.str.strip()
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in sniff_date_columns(df.columns):
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Áp dụng TRANSACTION_SCHEMA cho các cột có mặt (bỏ qua cột đã đúng kiểu)"""
+    for col, dtype in TRANSACTION_SCHEMA.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype == 'Int32':
+            try:
+                df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError):
+                # Cột có giá trị không nguyên (ví dụ số lượng 2.5): giữ nguyên kiểu số thực
+                pass
+        elif dtype == 'category':
+            df[col] = df[col].astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def read_excel_streaming(source, usecols: Optional[List[str]] = None,
+                         progress_callback: Optional[Callable[[int, Optional[int]], None]] = None) -> pd.DataFrame:
+    """
+    Đọc sheet đầu tiên của workbook .xlsx ở chế độ read-only của openpyxl.
+
+    Các dòng được duyệt tuần tự dưới dạng giá trị thuần (không dựng object cell
+    cho cả workbook) và chỉ giữ các cột trong usecols. progress_callback(số dòng
+    đã đọc, tổng số dòng hoặc None) được gọi định kỳ trong lúc đọc.
+    """
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else '' for name in next(rows, ())]
+        wanted = usecols if usecols is not None else header
+        positions = [(i, name) for i, name in enumerate(header) if name in wanted]
+        total_rows = sheet.max_row - 1 if sheet.max_row else None
+
+        values = {name: [] for _, name in positions}
+        rows_read = 0
+        for row in rows:
+            for i, name in positions:
+                values[name].append(row[i] if i < len(row) else None)
+            rows_read += 1
+            if progress_callback and rows_read % EXCEL_PROGRESS_EVERY == 0:
+                progress_callback(rows_read, total_rows)
+        if progress_callback:
+            progress_callback(rows_read, rows_read)
+    finally:
+        workbook.close()
+
+    df = pd.DataFrame(values)
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            # Mã số lưu dạng số trong Excel (ví dụ StockCode 85123) được đưa về chuỗi như read_csv
+            df[col] = df[col].map(lambda v: v if v is None or isinstance(v, str) else str(v))
+    return df
+
+
+def _concat_categoricals(parts: List[pd.Categorical]) -> pd.Categorical:
+    """
+    Nối các cột category với danh sách category đã sắp xếp.
+
+    Khi category mới của mỗi phần đều đứng sau mọi category đã có (ví dụ mã hóa
+    đơn tăng dần khi ghép lô mới), mã của các phần trước giữ nguyên và chỉ phần
+    mới được ánh xạ; ngược lại hợp nhất và sắp lại toàn bộ danh sách category.
+    """
+    categories = parts[0].categories
+    if not categories.is_monotonic_increasing:
+        return union_categoricals(parts, sort_categories=True)
+    codes = [parts[0].codes]
+    for part in parts[1:]:
+        lookup = categories.get_indexer(part.categories)
+        unseen = lookup < 0
+        new_categories = part.categories[unseen].sort_values()
+        if len(new_categories) and len(categories) and not new_categories[0] > categories[-1]:
+            return union_categoricals(parts, sort_categories=True)
+        lookup[unseen] = len(categories) + new_categories.get_indexer(part.categories[unseen])
+        codes.append(np.where(part.codes >= 0, lookup[part.codes], -1))
+        categories = categories.append(new_categories)
+    return pd.Categorical.from_codes(np.concatenate(codes), categories=categories)
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Nối các bảng cùng cột, hợp nhất danh sách category để cột category không bị đổi thành object"""
+    head = frames[0]
+    for frame in frames[1:]:
+        missing = [col for col in head.columns if col not in frame.columns]
+        if missing:
+            raise ValueError(f"Các file dữ liệu không cùng cấu trúc, thiếu cột: {', '.join(missing)}")
+    columns = {}
+    for col in head.columns:
+        if isinstance(head[col].dtype, pd.CategoricalDtype):
+            parts = []
+            for frame in frames:
+                if frame[col].notna().any():
+                    parts.append(frame[col].astype('category').values)
+                else:
+                    parts.append(pd.Categorical.from_codes(np.full(len(frame), -1), head[col].cat.categories))
+            columns[col] = _concat_categoricals(parts)
+        else:
+            columns[col] = pd.concat([frame[col] for frame in frames], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def iter_csv_chunks(source, chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Đọc CSV theo từng khối đã ép kiểu, các cột chuỗi đã chuyển sang category"""
+    text_dtypes = {col: str for col in TEXT_COLUMNS}
+    for chunk in pd.read_csv(source, encoding='utf-8', dtype=text_dtypes, chunksize=chunksize):
+        chunk = apply_types(chunk)
+        for col in TEXT_COLUMNS:
+            if col in chunk.columns:
+                chunk[col] = chunk[col].astype('category')
+        yield chunk
+
+
+def read_csv_chunked(source, chunksize: int = CSV_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Đọc CSV theo từng khối, ép kiểu và chuyển các cột chuỗi sang category ngay
+    trên mỗi khối rồi nối lại.
+
+    Cả file không bao giờ nằm trong bộ nhớ dưới dạng chuỗi Python: bộ nhớ đỉnh
+    là bảng đã tối ưu kiểu cộng một khối thô, thay vì bảng object của read_csv
+    đọc một lần (thường lớn gấp vài lần).
+    """
+    return concat_frames(list(iter_csv_chunks(source, chunksize)))
+
+
+def parse_source(source, file_type: Optional[str] = None,
+                 progress_callback: Optional[Callable[[int, Optional[int]], None]] = None) -> pd.DataFrame:
+    """Parse file CSV/XLSX gốc thành DataFrame đã ép kiểu"""
+    path = resolve_source_path(source)
+    text_dtypes = {col: str for col in TEXT_COLUMNS}
+    if str(path or '').lower().endswith('.xls'):
+        # Định dạng .xls cũ không đọc được bằng openpyxl
+        df = pd.read_excel(source, dtype=text_dtypes)
+    elif _is_excel(file_type or path or ''):
+        df = read_excel_streaming(source, EXCEL_COLUMNS, progress_callback)
+    else:
+        # Mỗi khối đã được ép kiểu trong read_csv_chunked
+        return apply_schema(read_csv_chunked(source))
+    return apply_schema(apply_types(df))
+
+
+def read_table(source, columns: Optional[List[str]] = None, file_type: Optional[str] = None,
+               progress_callback: Optional[Callable[[int, Optional[int]], None]] = None) -> pd.DataFrame:
+    """
+    Đọc dữ liệu qua snapshot dạng cột.
+
+    Lần đầu gặp một file, dữ liệu được parse và lưu thành snapshot; các lần sau
+    (kể cả khi chuyển chức năng) chỉ đọc snapshot và chỉ các cột cần thiết.
+    Workbook Excel vì vậy chỉ phải chuyển đổi một lần. File object không gắn
+    với file trên đĩa được parse trực tiếp.
+    """
+    path = resolve_source_path(source)
+    if path is None:
+        df = parse_source(source, file_type, progress_callback)
+        return df[columns] if columns else df
+
+    shards = resolve_shards(path)
+    if shards is not None:
+        return read_shards(shards, columns)
+
+    key = f"{file_fingerprint(path)}-raw-v{RAW_SNAPSHOT_VERSION}"
+    df = DATASET_CACHE.get_frame(key, columns)
+    if df is not None:
+        return df
+
+    df = parse_source(path, file_type, progress_callback)
+    DATASET_CACHE.put_frame(key, df)
+    return df[columns] if columns else df
+
+
+def _read_shard(path: str, columns: Optional[List[str]]) -> pd.DataFrame:
+    return read_table(path, columns)
+
+
+def read_shards(shards: List[str], columns: Optional[List[str]] = None,
+                max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Đọc nhiều file cùng cấu trúc song song trên một process pool rồi nối lại.
+
+    Mỗi shard đi qua read_table nên được parse, ép kiểu và lưu snapshot riêng:
+    khi có thêm file tháng mới, chỉ file đó phải parse lại.
+    """
+    workers = min(len(shards), max_workers or os.cpu_count() or 1)
+    frames = None
+    if workers > 1:
+        try:
+            # 'spawn' tránh fork một process đang chạy nhiều thread (Streamlit)
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                frames = list(pool.map(_read_shard, shards, [columns] * len(shards)))
+        except Exception as e:
+            print(f"⚠️ Không thể đọc song song, chuyển sang đọc tuần tự: {str(e)}")
+    if frames is None:
+        frames = [_read_shard(shard, columns) for shard in shards]
+    return concat_frames(frames)
@@ -0,0 +1,256 @@
+"""
+Đọc file CSV lớn hơn RAM theo từng khối và cộng dồn các tổng hợp thay cho kho giao dịch
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from model.cleaning import clean_frame, merge_reports
+from model.revenue_cube import RevenueCube
+from model.running_totals import CUSTOMER_KEYS, TOTALS_AGGREGATIONS, RunningTotals, group_totals
+from model.snapshot_cache import (CSV_CHUNK_ROWS, resolve_source_path, resolve_shards, source_fingerprint,
+                                  iter_csv_chunks, apply_schema, concat_frames)
+from model.transaction_store import TransactionStore, get_transaction_store, month_index, month_index_labels
+
+# Nguồn CSV từ kích thước này trở lên được đọc theo khối thay vì nạp vào TransactionStore
+STREAMING_MIN_BYTES = int(float(os.environ.get('DSS_STREAMING_MIN_MB', 1024)) * 1024 * 1024)
+
+
+def should_stream(source) -> bool:
+    """Nguồn là file (hoặc các shard) CSV có tổng kích thước từ STREAMING_MIN_BYTES trở lên"""
+    path = resolve_source_path(source)
+    if path is None:
+        return False
+    try:
+        paths = resolve_shards(path) or [path]
+        if not all(p.lower().endswith('.csv') for p in paths):
+            return False
+        return sum(os.path.getsize(p) for p in paths) >= STREAMING_MIN_BYTES
+    except OSError:
+        return False
+
+
+class StreamingAggregates:
+    """
+    Tổng hợp của một nguồn CSV đọc theo khối, trả lời các view và khối quốc gia
+    × ngày giống TransactionStore cho phân bổ ngân sách, phân tích doanh thu theo
+    quốc gia và theo tháng.
+
+    Mỗi khối được làm sạch bằng đúng các quy tắc của view tương ứng trong kho
+    (mặt nạ của DataModel.load_and_clean_data cho 'clean') rồi cộng vào:
+    - khối quốc gia × ngày của view 'clean' và 'revenue' (doanh thu theo quốc
+      gia × tháng, số đơn theo quốc gia)
+    - tổng theo (quốc gia, sản phẩm, ngày) của view 'clean' (top sản phẩm)
+    - doanh thu theo (sản phẩm, ngày) của các dòng có ngày hợp lệ (phân tích tháng)
+    - tổng theo (quốc gia, khách hàng) của view 'clean'
+
+    Bộ nhớ phụ thuộc số nhóm và kích thước khối, không phụ thuộc số dòng. Các
+    view vì vậy là bảng đã gom theo ngày (cột Orders, Lines thay cho InvoiceNo),
+    không phải dòng giao dịch; DOL và ghép lô vẫn cần TransactionStore.
+    Số đơn được cộng qua các khối với giả định các dòng của một hóa đơn nằm liền
+    nhau trong file (như file export): stream_aggregates giữ hóa đơn cuối mỗi
+    khối lại cho khối sau. Cũng nhờ vậy các dòng trùng lặp hoàn toàn (cùng hóa
+    đơn) luôn nằm trong một khối và được loại như khi nạp TransactionStore.
+    """
+
+    def __init__(self, fingerprint: Optional[str] = None):
+        self.fingerprint = fingerprint
+        self.rows_read = 0
+        self.max_invoice_date = None
+        self._cubes: Dict[str, RevenueCube] = {}
+        self._cleaning_reports: Dict[str, Dict] = {}
+        self._product_days = RunningTotals({
+            'Quantity': 'sum', 'Revenue': 'sum', 'Orders': 'sum', 'Lines': 'sum', 'Description': 'first'
+        })
+        self._description_days = RunningTotals({'Revenue': 'sum', 'Lines': 'sum'})
+        self._customers = RunningTotals(TOTALS_AGGREGATIONS)
+        self.duplicate_lines = 0
+        self._views: Dict[str, pd.DataFrame] = {}
+
+    def update(self, chunk: pd.DataFrame):
+        """Làm sạch một khối đã ép kiểu (các hóa đơn trọn vẹn) và cộng vào các tổng hợp"""
+        chunk = apply_schema(chunk)
+        self.rows_read += len(chunk)
+        unique = TransactionStore._unique_lines(chunk, chunk.columns)
+        self.duplicate_lines += len(chunk) - int(unique.sum())
+        chunk = TransactionStore._add_derived_columns(chunk[unique].reset_index(drop=True))
+        if len(chunk) and chunk['InvoiceDate'].notna().any():
+            chunk_max = chunk['InvoiceDate'].max()
+            self.max_invoice_date = chunk_max if self.max_invoice_date is None else max(self.max_invoice_date, chunk_max)
+
+        clean, report = TransactionStore._clean_rows(chunk)
+        self._add_cube('clean', clean, report)
+        day = clean['InvoiceDate'].dt.normalize()
+        self._product_days.add(clean.groupby(['Country', 'StockCode', day], observed=True, sort=False).agg(
+            Quantity=('Quantity', 'sum'),
+            Revenue=('Revenue', 'sum'),
+            Orders=('InvoiceNo', 'nunique'),
+            Lines=('Revenue', 'size'),
+            Description=('Description', 'first'),
+        ))
+        if 'CustomerID' in clean.columns:
+            self._customers.add(group_totals(clean, CUSTOMER_KEYS))
+
+        if 'Revenue' in chunk.columns:
+            revenue, report = TransactionStore._revenue_rows(chunk)
+            self._add_cube('revenue', revenue, report)
+
+        if 'Description' in chunk.columns:
+            dated, _ = clean_frame(chunk, 'dates')
+            self._description_days.add(
+                dated.groupby(['Description', dated['InvoiceDate'].dt.normalize()], observed=True, sort=False).agg(
+                    Revenue=('Revenue', 'sum'),
+                    Lines=('Revenue', 'size'),
+                )
+            )
+        self._views.clear()
+
+    def _add_cube(self, name: str, rows: pd.DataFrame, report: Dict):
+        cube = RevenueCube.from_frame(rows)
+        self._cubes[name] = self._cubes[name].merged(cube) if name in self._cubes else cube
+        previous = self._cleaning_reports.get(name)
+        self._cleaning_reports[name] = report if previous is None else merge_reports(previous, report)
+
+    def revenue_cube(self, name: str = 'clean', excluded_products: Iterable = ()) -> RevenueCube:
+        """Khối quốc gia × ngày của view 'clean' hoặc 'revenue'"""
+        if tuple(excluded_products):
+            raise ValueError("Dữ liệu đọc theo khối không hỗ trợ loại trừ sản phẩm khỏi khối quốc gia × ngày")
+        if name not in self._cubes:
+            if name == 'revenue':
+                raise ValueError("File cần có cột 'Revenue' hoặc cả 'Quantity' và 'UnitPrice'")
+            return RevenueCube.from_frame(pd.DataFrame({'Country': [], 'InvoiceDate': pd.to_datetime([])}))
+        return self._cubes[name]
+
+    def cleaning_report(self, name: str = 'clean') -> Dict:
+        """Số dòng vào/ra và số dòng bị loại theo từng quy tắc, cộng qua mọi khối"""
+        return TransactionStore._with_duplicates(self._cleaning_reports[name], self.duplicate_lines)
+
+    def customer_totals(self) -> pd.DataFrame:
+        """Tổng theo (Country, CustomerID) của view 'clean' (cột TOTALS_AGGREGATIONS)"""
+        table = self._customers.frame()
+        if table is None:
+            return pd.DataFrame(columns=list(TOTALS_AGGREGATIONS),
+                                index=pd.MultiIndex.from_arrays([[], []], names=CUSTOMER_KEYS))
+        return table
+
+    def memory_report(self) -> Optional[Dict[str, int]]:
+        """Không giữ bảng giao dịch nên không có số liệu bộ nhớ trước/sau tối ưu kiểu"""
+        return None
+
+    def append(self, batch: pd.DataFrame) -> Dict[str, int]:
+        raise ValueError("Dữ liệu đọc theo khối không hỗ trợ ghép lô hóa đơn mới; hãy tải lại toàn bộ file")
+
+    def view(self, name: str = 'all') -> pd.DataFrame:
+        """
+        Bảng đã gom theo ngày thay cho view cùng tên của kho:
+
+        - 'clean': (Country, StockCode, InvoiceDate) với Quantity, Revenue, Orders,
+          Lines, Description, sắp theo InvoiceDate
+        - 'revenue': (Country, InvoiceDate) với Revenue, Orders, Quantity, Lines,
+          MonthIndex, MonthYear (các ô có giao dịch của khối 'revenue')
+        - 'all': (Description, InvoiceDate) với Revenue, Lines, Month của các dòng có ngày hợp lệ
+        """
+        if name not in self._views:
+            builders = {
+                'clean': lambda: self._day_table(self._product_days, ['Country', 'StockCode']),
+                'revenue': self._revenue_table,
+                'all': lambda: self._day_table(self._description_days, ['Description']),
+            }
+            if name not in builders:
+                raise ValueError(f"View không hợp lệ: {name}")
+            self._views[name] = builders[name]()
+        return self._views[name].copy(deep=False)
+
+    def view_since(self, name: str, start_date, exclude: Optional[Dict[str, Iterable]] = None,
+                   include: Optional[Dict[str, Iterable]] = None) -> pd.DataFrame:
+        """Các ngày của view từ start_date (None: mọi ngày) với bộ lọc giá trị như TransactionStore.view_since"""
+        df = self.view(name)
+        if start_date is not None:
+            df = df.iloc[int(df['InvoiceDate'].searchsorted(pd.Timestamp(start_date), side='left')):]
+        for column, values in (include or {}).items():
+            if values:
+                df = df[df[column].isin(values)]
+        for column, values in (exclude or {}).items():
+            if values:
+                df = df[~df[column].isin(values)]
+        return df
+
+    @staticmethod
+    def _day_table(totals: RunningTotals, keys: List[str]) -> pd.DataFrame:
+        table = totals.frame()
+        if table is None:
+            return pd.DataFrame(columns=keys + ['InvoiceDate'] + list(totals.aggregations))
+        table = table.reset_index()
+        for column in keys:
+            table[column] = table[column].astype('category')
+        if 'Description' in table.columns:
+            table['Description'] = table['Description'].astype('category')
+        table['MonthIndex'] = month_index(table['InvoiceDate'])
+        table['Month'] = table['InvoiceDate'].dt.month.astype('Int8')
+        return table.sort_values('InvoiceDate', kind='stable').reset_index(drop=True)
+
+    def _revenue_table(self) -> pd.DataFrame:
+        cube = self.revenue_cube('revenue')
+        rows, days = np.nonzero(cube.measures['Lines'])
+        df = pd.DataFrame({
+            'Country': pd.Categorical.from_codes(rows, cube.countries),
+            'InvoiceDate': pd.to_datetime(cube.start_day + days),
+        })
+        for measure, values in cube.measures.items():
+            df[measure] = values[rows, days]
+        df['MonthIndex'] = month_index(df['InvoiceDate'])
+        month_labels = month_index_labels(df['MonthIndex'])
+        df['MonthYear'] = pd.Categorical(month_labels, categories=month_labels.unique().sort_values())
+        return df
+
+
+def _split_last_invoice(chunk: pd.DataFrame):
+    """Tách các dòng của hóa đơn cuối khối (có thể còn tiếp ở khối sau) khỏi phần còn lại"""
+    if 'InvoiceNo' not in chunk.columns or chunk.empty:
+        return chunk, None
+    invoices = chunk['InvoiceNo']
+    other = np.flatnonzero((invoices != invoices.iloc[-1]).to_numpy())
+    split = other[-1] + 1 if len(other) else 0
+    return chunk.iloc[:split], chunk.iloc[split:]
+
+
+def stream_aggregates(source, chunksize: int = CSV_CHUNK_ROWS, fingerprint: Optional[str] = None) -> StreamingAggregates:
+    """
+    Đọc nguồn CSV (file, thư mục hoặc glob các shard) theo khối và cộng dồn
+    StreamingAggregates; bộ nhớ đỉnh là một khối cộng các bảng tổng hợp.
+    """
+    path = resolve_source_path(source)
+    paths = (resolve_shards(path) if path is not None else None) or [source]
+    aggregates = StreamingAggregates(fingerprint)
+    carry = None
+    for part in paths:
+        for chunk in iter_csv_chunks(part, chunksize):
+            if carry is not None and len(carry):
+                chunk = concat_frames([carry, chunk])
+            complete, carry = _split_last_invoice(chunk)
+            if len(complete):
+                aggregates.update(complete.reset_index(drop=True))
+    if carry is not None and len(carry):
+        aggregates.update(carry.reset_index(drop=True))
+    return aggregates
+
+
+@st.cache_resource(max_entries=4)
+def _stream_source(fingerprint: str, _path: str) -> StreamingAggregates:
+    """Mỗi dấu vân tay nguồn chỉ được đọc theo khối một lần cho toàn bộ process"""
+    return stream_aggregates(_path, fingerprint=fingerprint)
+
+
+def get_dataset(source, file_type: Optional[str] = None, progress_callback=None):
+    """
+    Nguồn dữ liệu cho các chức năng phân tích: StreamingAggregates khi nguồn là
+    CSV từ STREAMING_MIN_BYTES trở lên, ngược lại TransactionStore dùng chung.
+    """
+    if should_stream(source):
+        path = resolve_source_path(source)
+        return _stream_source(source_fingerprint(path), path)
+    return get_transaction_store(source, file_type, progress_callback)
@@ -0,0 +1,539 @@
+"""
+Kho giao dịch dùng chung (TransactionStore) cho cả 4 chức năng phân tích
+"""
+
+import sys
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from model.cleaning import clean_frame, line_revenue, merge_reports, rule_mask
+from model.category_index import CategoryIndex
+from model.disk_cache import APPENDED_BATCHES, DATASET_CACHE
+from model.revenue_cube import RevenueCube
+from model.running_totals import CUSTOMER_KEYS, PRODUCT_MONTH_KEYS, TOTALS_AGGREGATIONS, RunningTotals, group_totals
+from model.shared_columns import share_frame
+from model.snapshot_cache import (resolve_source_path, source_fingerprint, read_table, parse_source,
+                                  apply_schema, apply_types, concat_frames)
+
+# Tăng khi logic làm sạch hoặc cột dẫn xuất thay đổi để bỏ qua các view/cột đã lưu trên đĩa
+VIEW_CACHE_VERSION = 8
+PERSISTED_VIEWS = ('clean', 'revenue')
+
+# Cột Revenue có sẵn trong file nguồn, chỉ dùng cho view 'revenue'
+SOURCE_REVENUE = 'Source_Revenue'
+
+# Tăng khi cách lưu các lô đã ghép thay đổi (danh sách lô cũ bị bỏ qua)
+RAW_BATCH_VERSION = 1
+
+# Số khối quốc gia × ngày giữ lại (mỗi view và bộ sản phẩm loại trừ một khối)
+MAX_CACHED_CUBES = 8
+
+# Số đoạn tối đa của một CategoryIndex sau các lần ghép; vượt quá thì dựng lại khi dùng tới
+MAX_INDEX_SEGMENTS = 32
+
+
+def month_index(dates: pd.Series) -> pd.Series:
+    """Chỉ số tháng int32 = năm*12 + tháng (0 khi thiếu ngày), so sánh/nhóm nhanh hơn Period"""
+    index = dates.dt.year * 12 + dates.dt.month
+    return index.fillna(0).astype('int32')
+
+
+def month_index_of(date) -> int:
+    """Chỉ số tháng của một mốc thời gian đơn lẻ"""
+    date = pd.Timestamp(date)
+    return date.year * 12 + date.month
+
+
+def month_index_year(index):
+    """Năm ứng với chỉ số tháng (dùng được cho số đơn lẻ hoặc mảng)"""
+    return (index - 1) // 12
+
+
+def month_index_month(index):
+    """Tháng (1-12) ứng với chỉ số tháng (dùng được cho số đơn lẻ hoặc mảng)"""
+    return (index - 1) % 12 + 1
+
+
+def month_index_labels(index) -> pd.Index:
+    """Nhãn 'YYYY-MM' cho các chỉ số tháng, chỉ định dạng mỗi giá trị khác nhau một lần"""
+    index = pd.Index(index)
+    uniques = index.unique()
+    labels = pd.Index([f"{month_index_year(i):04d}-{month_index_month(i):02d}" for i in uniques])
+    return pd.Index(labels.take(uniques.get_indexer(index)), name=index.name)
+
+
+def map_categories(series: pd.Series, func) -> pd.Series:
+    """Biến đổi giá trị của cột category trên danh sách category thay vì từng dòng"""
+    categories = func(series.cat.categories)
+    new_categories = pd.Index(categories.unique()).sort_values()
+    lookup = new_categories.get_indexer(categories)
+    codes = series.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, lookup[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, new_categories), index=series.index, name=series.name)
+
+
+class TransactionStore:
+    """Giữ một bản duy nhất của dataset đã parse cùng các cột dẫn xuất và các view đã làm sạch"""
+
+    def __init__(self, fingerprint: Optional[str], frame: pd.DataFrame):
+        self.fingerprint = fingerprint
+        # Khóa của các lô đã ghép trên đĩa: dấu vân tay file nguồn, không đổi khi ghép lô
+        self.source_fingerprint = fingerprint
+        self.source_columns = list(frame.columns)
+        frame = apply_schema(frame)
+        # Cùng quy tắc chống trùng với append(): nạp lại file gồm cả lô đã ghép cho cùng kết quả
+        unique = self._unique_lines(frame, self.source_columns)
+        self.duplicate_lines = len(frame) - int(unique.sum())
+        if self.duplicate_lines:
+            frame = frame[unique].reset_index(drop=True)
+        self.frame = self._add_derived_columns(frame)
+        if fingerprint is not None:
+            # Cột số nằm trên memory-map dùng chung giữa các process trên cùng máy
+            self.frame = share_frame(self.frame, f"{fingerprint}-frame-v{VIEW_CACHE_VERSION}")
+        self._views: Dict[str, pd.DataFrame] = {}
+        self._memory_report: Optional[Dict[str, int]] = None
+        self._cleaning_reports: Dict[str, Dict] = {}
+        self._cubes: Dict[Tuple, RevenueCube] = {}
+        self._category_indexes: Dict[Tuple[str, str], CategoryIndex] = {}
+        self._max_invoice_date = None
+        self._line_hashes: Optional[Set[int]] = None
+        self._totals: Dict[str, RunningTotals] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Thêm MonthIndex, Month, Quarter và Revenue = Quantity × UnitPrice một lần
+        cho toàn bộ dataset. Như trước khi dùng chung kho, phân bổ ngân sách, phân
+        tích tháng và DOL luôn tính lại doanh thu từ số lượng và đơn giá; cột
+        Revenue có sẵn trong file được giữ dưới tên SOURCE_REVENUE cho view 'revenue'.
+        """
+        if 'Quantity' in df.columns and 'UnitPrice' in df.columns:
+            if 'Revenue' in df.columns:
+                df = df.rename(columns={'Revenue': SOURCE_REVENUE})
+            df['Revenue'] = line_revenue(df)
+        if 'InvoiceDate' in df.columns:
+            invoice_date = df['InvoiceDate']
+            df['MonthIndex'] = month_index(invoice_date)
+            df['Month'] = invoice_date.dt.month.astype('Int8')
+            df['Quarter'] = invoice_date.dt.quarter.astype('Int8')
+        return df
+
+    @property
+    def max_invoice_date(self):
+        """Ngày giao dịch mới nhất trên toàn bộ dữ liệu gốc (trước khi làm sạch), tính một lần"""
+        if self._max_invoice_date is None:
+            self._max_invoice_date = self.frame['InvoiceDate'].max()
+        return self._max_invoice_date
+
+    def memory_report(self) -> Dict[str, int]:
+        """
+        Bộ nhớ của dataset trước và sau khi áp dụng schema (bytes).
+
+        'before' ước lượng bố cục chưa tối ưu: cột chuỗi là object Python và
+        cột số là int64/float64; 'after' là bộ nhớ thực tế của kho.
+        """
+        if self._memory_report is None:
+            df = self.frame
+            before = int(df.index.memory_usage())
+            for col in df.columns:
+                series = df[col]
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    # Mỗi dòng là một con trỏ 8 bytes tới object chuỗi riêng
+                    sizes = np.array([sys.getsizeof(v) for v in series.cat.categories] + [sys.getsizeof(np.nan)])
+                    before += 8 * len(series) + int(sizes[series.cat.codes.to_numpy()].sum())
+                elif series.dtype.kind in 'iufb':
+                    before += 8 * len(series)
+                else:
+                    before += int(series.memory_usage(deep=True, index=False))
+            after = int(df.memory_usage(deep=True).sum())
+            self._memory_report = {'before': before, 'after': after}
+        return self._memory_report
+
+    def view(self, name: str = 'all') -> pd.DataFrame:
+        """
+        Trả về view của dataset theo tên.
+
+        - 'all': toàn bộ dữ liệu đã parse (DOL, phân tích tháng)
+        - 'clean': giao dịch hợp lệ cho phân bổ ngân sách, sắp theo InvoiceDate
+        - 'revenue': giao dịch có doanh thu dương cho phân tích quốc gia, dùng
+          cột Revenue của file nguồn nếu có (xem _with_source_revenue)
+
+        View được tính một lần rồi dùng chung; mỗi lời gọi nhận một bản sao nông
+        để việc gán cột mới ở phía gọi không ảnh hưởng tới kho. Các view đã làm
+        sạch được lưu xuống cache đĩa nên server khởi động lại không phải làm sạch lại.
+        """
+        with self._lock:
+            if name not in self._views:
+                builders = {
+                    'all': lambda: self.frame,
+                    'clean': self._build_clean_view,
+                    'revenue': self._build_revenue_view,
+                }
+                if name not in builders:
+                    raise ValueError(f"View không hợp lệ: {name}")
+                self._views[name] = self._load_or_build(name, builders[name])
+            return self._views[name].copy(deep=False)
+
+    def view_since(self, name: str, start_date, exclude: Optional[Dict[str, Iterable]] = None,
+                   include: Optional[Dict[str, Iterable]] = None) -> pd.DataFrame:
+        """
+        Các dòng của view có InvoiceDate >= start_date (None: mọi dòng), bỏ các
+        dòng có giá trị trong exclude[cột] và chỉ giữ giá trị trong include[cột]
+        (danh sách rỗng nghĩa là không lọc).
+
+        View 'clean' đã sắp theo ngày nên khung thời gian chỉ là tìm kiếm nhị phân
+        và một lát cắt liên tiếp. Bộ lọc giá trị dùng CategoryIndex của view: mỗi
+        giá trị chỉ chạm tới các dòng của nó và các bộ lọc kết hợp trên bitmap.
+        """
+        df = self.view(name)
+        first, keep = 0, None
+        if start_date is not None:
+            if name == 'clean':
+                first = int(df['InvoiceDate'].searchsorted(pd.Timestamp(start_date), side='left'))
+            else:
+                keep = (df['InvoiceDate'] >= start_date).to_numpy(dtype=bool, copy=True)
+
+        for column, values in (include or {}).items():
+            if values:
+                rows = self.category_index(name, column).mask(values, first, len(df))
+                keep = rows if keep is None else keep & rows
+        for column, values in (exclude or {}).items():
+            if values:
+                if keep is None:
+                    keep = np.ones(len(df) - first, dtype=bool)
+                keep[self.category_index(name, column).positions_of(values, first, len(df)) - first] = False
+
+        df = df.iloc[first:]
+        if keep is None:
+            return df
+        return df.take(np.flatnonzero(keep))
+
+    def category_index(self, name: str, column: str) -> CategoryIndex:
+        """Chỉ mục vị trí dòng theo giá trị của cột trong view, tính một lần"""
+        key = (name, column)
+        with self._lock:
+            index = self._category_indexes.get(key)
+        if index is None:
+            index = CategoryIndex(self.view(name)[column])
+            with self._lock:
+                self._category_indexes[key] = index
+        return index
+
+    def _load_or_build(self, name: str, builder) -> pd.DataFrame:
+        if self.fingerprint is None or name not in PERSISTED_VIEWS:
+            return builder()
+        key = f"{self.fingerprint}-{name}-v{VIEW_CACHE_VERSION}"
+        df = DATASET_CACHE.get_frame(key)
+        if df is None:
+            df = builder()
+            DATASET_CACHE.put_frame(key, df, index=True)
+        return share_frame(df, key)
+
+    def cleaning_report(self, name: str = 'clean') -> Dict:
+        """Số dòng vào/ra và số dòng bị loại theo từng quy tắc của view 'clean' hoặc 'revenue'"""
+        profiles = {'clean': 'budget', 'revenue': 'revenue'}
+        with self._lock:
+            if name not in self._cleaning_reports:
+                # View nạp từ cache đĩa: chỉ tính lại mặt nạ, không sao chép dữ liệu
+                frame = self._with_source_revenue(self.frame) if name == 'revenue' else self.frame
+                _, self._cleaning_reports[name] = rule_mask(frame, profiles[name])
+            return self._with_duplicates(self._cleaning_reports[name], self.duplicate_lines)
+
+    @staticmethod
+    def _with_duplicates(report: Dict, duplicate_lines: int) -> Dict:
+        """Báo cáo làm sạch kèm số dòng trùng lặp hoàn toàn đã bỏ khi nạp dữ liệu"""
+        if not duplicate_lines:
+            return report
+        return dict(report, rows_in=report['rows_in'] + duplicate_lines,
+                    rejected=dict({'duplicate_line': duplicate_lines}, **report['rejected']))
+
+    def customer_totals(self) -> pd.DataFrame:
+        """
+        Tổng theo (Country, CustomerID) của view 'clean' (cột TOTALS_AGGREGATIONS):
+        tính một lần, sau đó append() chỉ cộng thêm phần của các dòng mới
+        """
+        return self._running_totals('customers', CUSTOMER_KEYS)
+
+    def product_month_totals(self) -> pd.DataFrame:
+        """Tổng theo (StockCode, MonthIndex) của view 'clean', cộng dồn như customer_totals"""
+        return self._running_totals('product_months', PRODUCT_MONTH_KEYS)
+
+    def _running_totals(self, name: str, keys) -> pd.DataFrame:
+        clean = self.view('clean')
+        with self._lock:
+            if name not in self._totals:
+                totals = RunningTotals(TOTALS_AGGREGATIONS)
+                totals.add(group_totals(clean, keys))
+                self._totals[name] = totals
+            table = self._totals[name].frame()
+        if table is None:
+            return group_totals(clean, keys)
+        return table
+
+    def revenue_cube(self, name: str = 'clean', excluded_products: Iterable = ()) -> RevenueCube:
+        """
+        Khối quốc gia × ngày của view (bỏ các sản phẩm bị loại trừ nếu có).
+
+        Khối chỉ tính một lần cho mỗi view và bộ sản phẩm loại trừ; khoảng thời
+        gian và lựa chọn quốc gia được cắt từ khối ở phía gọi.
+        """
+        key = (name, tuple(sorted(excluded_products)))
+        with self._lock:
+            cube = self._cubes.get(key)
+        if cube is None:
+            # Sản phẩm loại trừ: bitmap từ CategoryIndex của view, không quét cột StockCode
+            cube = RevenueCube.from_frame(self.view_since(name, None, exclude={'StockCode': key[1]}))
+            with self._lock:
+                if len(self._cubes) >= MAX_CACHED_CUBES:
+                    self._cubes.pop(next(iter(self._cubes)))
+                self._cubes[key] = cube
+        return cube
+
+    @staticmethod
+    def _hash_lines(df: pd.DataFrame, columns) -> np.ndarray:
+        """Băm toàn bộ giá trị các cột gốc của từng dòng (ngày giờ quy về cùng đơn vị)"""
+        lines = TransactionStore._with_source_revenue(df)[list(columns)]
+        lines = lines.astype({col: 'datetime64[ns]' for col in lines.columns if lines[col].dtype.kind == 'M'})
+        return pd.util.hash_pandas_object(lines, index=False).to_numpy()
+
+    @staticmethod
+    def _unique_lines(df: pd.DataFrame, columns) -> np.ndarray:
+        """Mặt nạ bỏ các dòng trùng hoàn toàn (mọi cột gốc) với một dòng đứng trước"""
+        return ~pd.Series(TransactionStore._hash_lines(df, columns)).duplicated().to_numpy()
+
+    def append(self, batch: pd.DataFrame) -> Dict[str, int]:
+        """
+        Ghép một lô hóa đơn mới vào kho.
+
+        Lô phải có đủ các cột của dữ liệu gốc (cột thừa bị bỏ qua). Dòng trùng
+        hoàn toàn (mọi cột gốc) với một dòng đã có trong kho hoặc với dòng đứng
+        trước trong cùng lô (gửi lại) bị loại, như khi nạp file lần đầu. Khóa
+        InvoiceNo+StockCode không đủ: file export có các dòng khác nhau (số lượng,
+        đơn giá) của cùng sản phẩm trong một hóa đơn, loại chúng sẽ làm mất doanh thu.
+
+        Các dòng mới được lưu xuống đĩa theo dấu vân tay file nguồn trước khi ghép
+        và được ghép lại khi kho được nạp lại (khởi động lại server hoặc bị loại
+        khỏi cache). Chỉ các dòng mới được tính cột dẫn xuất và làm sạch; các view
+        đã dựng, CategoryIndex, khối quốc gia × ngày và tổng theo khách hàng/sản
+        phẩm × tháng được nối thêm phần của lô thay vì tính lại từ toàn bộ lịch sử.
+        """
+        batch = apply_types(batch.copy())
+        missing = [col for col in self.source_columns if col not in batch.columns]
+        if missing:
+            raise ValueError(f"Lô dữ liệu mới thiếu cột: {', '.join(missing)}")
+        batch = apply_schema(batch[self.source_columns])
+        rows_received = len(batch)
+
+        with self._lock:
+            if self._line_hashes is None:
+                # Một lần cho mỗi kho; các lần ghép sau chỉ băm dòng của lô
+                self._line_hashes = set(self._hash_lines(self.frame, self.source_columns).tolist())
+            batch_hashes = self._hash_lines(batch, self.source_columns)
+            is_new = ~pd.Series(batch_hashes).duplicated().to_numpy()
+            is_new &= np.fromiter((h not in self._line_hashes for h in batch_hashes.tolist()),
+                                  dtype=bool, count=len(batch_hashes))
+            batch = batch[is_new].reset_index(drop=True)
+            if len(batch):
+                self._persist_batch(batch)
+                self._line_hashes.update(batch_hashes[is_new].tolist())
+                self._ingest(batch)
+
+        return {
+            'rows_received': rows_received,
+            'rows_appended': len(batch),
+            'duplicates_skipped': rows_received - len(batch),
+        }
+
+    @property
+    def _manifest_key(self) -> str:
+        return f"{self.source_fingerprint}-batches-v{RAW_BATCH_VERSION}"
+
+    def _persist_batch(self, batch: pd.DataFrame):
+        """Lưu lô (cột gốc) và thêm vào danh sách lô của file nguồn; lỗi ghi dừng việc ghép"""
+        if self.source_fingerprint is None:
+            return
+        digest = hashlib.blake2b(pd.util.hash_pandas_object(batch, index=False).to_numpy().tobytes(),
+                                 digest_size=20).hexdigest()
+        key = f"{self.source_fingerprint}-batch-{digest}"
+        manifest = APPENDED_BATCHES.get_json(self._manifest_key) or []
+        if APPENDED_BATCHES.put_frame(key, batch) is None or \
+                APPENDED_BATCHES.put_json(self._manifest_key, manifest + [key]) is None:
+            raise ValueError("Không thể lưu lô dữ liệu mới xuống đĩa")
+
+    def replay_batches(self):
+        """Ghép lại các lô đã lưu của file nguồn theo thứ tự đã ghép (các lô đã được chống trùng)"""
+        if self.source_fingerprint is None:
+            return
+        for key in APPENDED_BATCHES.get_json(self._manifest_key) or []:
+            batch = APPENDED_BATCHES.get_frame(key)
+            if batch is None:
+                print(f"⚠️ Không đọc được lô dữ liệu đã ghép: {key}")
+                continue
+            with self._lock:
+                self._ingest(apply_schema(batch))
+                if self._line_hashes is not None:
+                    self._line_hashes.update(self._hash_lines(batch, self.source_columns).tolist())
+
+    def _ingest(self, batch: pd.DataFrame):
+        """Nối các dòng mới (đã chống trùng) vào bảng, các view và tổng hợp đã dựng"""
+        batch = self._add_derived_columns(batch)
+        first_row = len(self.frame)
+        self.frame = concat_frames([self.frame, batch])
+        if self.fingerprint is not None:
+            batch_digest = pd.util.hash_pandas_object(batch, index=False).to_numpy().tobytes()
+            self.fingerprint = hashlib.blake2b(
+                self.fingerprint.encode('utf-8') + batch_digest, digest_size=20
+            ).hexdigest()
+        self._extend_views(batch, first_row)
+        if self._max_invoice_date is not None and batch['InvoiceDate'].notna().any():
+            self._max_invoice_date = max(self._max_invoice_date, batch['InvoiceDate'].max())
+        self._memory_report = None
+
+    def _extend_views(self, batch: pd.DataFrame, first_row: int):
+        """Nối phần đã làm sạch của lô vào các view, báo cáo, CategoryIndex và khối đã dựng"""
+        row_builders = {'clean': self._clean_rows, 'revenue': self._revenue_rows}
+        batch_rows = {}
+        for name, view in list(self._views.items()):
+            if name == 'all':
+                self._views[name] = self.frame
+                continue
+            rows, report = row_builders[name](batch)
+            in_order = True
+            if name == 'clean':
+                # Nhãn dòng của view 'clean' là vị trí trong bảng gốc
+                rows.index = rows.index + first_row
+                if not rows['InvoiceDate'].is_monotonic_increasing:
+                    rows = rows.sort_values('InvoiceDate', kind='stable')
+                in_order = len(view) == 0 or len(rows) == 0 or rows['InvoiceDate'].iloc[0] >= view['InvoiceDate'].iloc[-1]
+            # Dòng đã có của các hóa đơn trong lô: để khối và tổng không đếm một hóa đơn hai lần
+            existing = None
+            if len(rows) and (any(key[0] == name for key in self._cubes) or (name == 'clean' and self._totals)):
+                invoices = self._category_indexes.get((name, 'InvoiceNo'))
+                if invoices is None:
+                    invoices = self._category_indexes[(name, 'InvoiceNo')] = CategoryIndex(view['InvoiceNo'])
+                existing = view.take(np.sort(invoices.positions_of(rows['InvoiceNo'].dropna().unique())))
+            extended = concat_frames([view, rows])
+            if name == 'clean':
+                extended.index = view.index.append(rows.index)
+                if not in_order:
+                    # Lô có ngày cũ hơn dữ liệu hiện có: sắp lại để view vẫn theo thứ tự ngày
+                    extended = extended.sort_values('InvoiceDate', kind='stable')
+            self._views[name] = extended
+            batch_rows[name] = (rows, existing)
+
+            previous = self._cleaning_reports.get(name)
+            if previous is not None:
+                self._cleaning_reports[name] = merge_reports(previous, report)
+            for key in [key for key in self._category_indexes if key[0] == name]:
+                index = self._category_indexes[key]
+                if in_order and index.n_segments < MAX_INDEX_SEGMENTS:
+                    index.append(rows[key[1]])
+                else:
+                    del self._category_indexes[key]
+
+        for key in list(self._cubes):
+            name, excluded_products = key
+            if name not in batch_rows:
+                del self._cubes[key]
+                continue
+            rows, existing = batch_rows[name]
+            if excluded_products:
+                rows = rows[~rows['StockCode'].isin(excluded_products)]
+            cube = self._cubes[key].merged(RevenueCube.from_frame(rows))
+            if existing is not None and len(existing):
+                if excluded_products:
+                    existing = existing[~existing['StockCode'].isin(excluded_products)]
+                cube = cube.merged(self._repeated_orders(existing, rows))
+            self._cubes[key] = cube
+
+        totals_keys = {'customers': CUSTOMER_KEYS, 'product_months': PRODUCT_MONTH_KEYS}
+        for name in list(self._totals):
+            if 'clean' not in batch_rows:
+                del self._totals[name]
+                continue
+            rows, existing = batch_rows['clean']
+            self._totals[name].add(group_totals(rows, totals_keys[name], existing))
+
+    @staticmethod
+    def _repeated_orders(existing: pd.DataFrame, rows: pd.DataFrame) -> RevenueCube:
+        """
+        Khối chỉ có Orders = -(số hóa đơn của lô đã có dòng trong cùng ô quốc gia × ngày),
+        cộng vào khối để bù phần đếm trùng khi ghép lô vào giữa một hóa đơn
+        """
+        def cell_invoices(df):
+            keys = pd.DataFrame({
+                'InvoiceNo': df['InvoiceNo'],
+                'Country': df['Country'],
+                'Day': df['InvoiceDate'].dt.normalize(),
+            })
+            return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+        repeated = RevenueCube.from_frame(rows[np.isin(cell_invoices(rows), cell_invoices(existing))])
+        measures = {name: np.zeros_like(values) for name, values in repeated.measures.items()}
+        measures['Orders'] = -repeated.measures['Orders']
+        return RevenueCube(repeated.countries, repeated.start_day, measures)
+
+    @staticmethod
+    def _clean_rows(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
+        """Làm sạch theo bộ quy tắc phân bổ ngân sách và chuẩn hóa tên quốc gia"""
+        df_clean, report = clean_frame(df, 'budget')
+        df_clean['Country'] = map_categories(df_clean['Country'], lambda c: c.str.strip().str.title())
+        return df_clean, report
+
+    @staticmethod
+    def _with_source_revenue(df: pd.DataFrame) -> pd.DataFrame:
+        """Bảng có Revenue là doanh thu ghi trong file nguồn (nếu có), như phân tích doanh thu vẫn dùng"""
+        if SOURCE_REVENUE not in df.columns:
+            return df
+        return df.drop(columns='Revenue').rename(columns={SOURCE_REVENUE: 'Revenue'})
+
+    @staticmethod
+    def _revenue_rows(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
+        """Làm sạch theo bộ quy tắc phân tích doanh thu và thêm nhãn MonthYear"""
+        df, report = clean_frame(TransactionStore._with_source_revenue(df), 'revenue')
+        month_labels = month_index_labels(df['MonthIndex'])
+        df['MonthYear'] = pd.Categorical(month_labels, categories=month_labels.unique().sort_values())
+        return df.reset_index(drop=True), report
+
+    def _build_clean_view(self) -> pd.DataFrame:
+        df_clean, self._cleaning_reports['clean'] = self._clean_rows(self.frame)
+        if not df_clean['InvoiceDate'].is_monotonic_increasing:
+            # Sắp ổn định theo ngày: khung thời gian chỉ là một lát cắt (xem view_since)
+            df_clean = df_clean.sort_values('InvoiceDate', kind='stable')
+        return df_clean
+
+    def _build_revenue_view(self) -> pd.DataFrame:
+        if 'Revenue' not in self.frame.columns:
+            raise ValueError("File cần có cột 'Revenue' hoặc cả 'Quantity' và 'UnitPrice'")
+        df, self._cleaning_reports['revenue'] = self._revenue_rows(self.frame)
+        return df
+
+
+@st.cache_resource(max_entries=4)
+def _load_store(fingerprint: str, _path: str, _progress_callback=None) -> TransactionStore:
+    """Mỗi dấu vân tay dataset chỉ được parse một lần cho toàn bộ process (kèm các lô đã ghép)"""
+    store = TransactionStore(fingerprint, read_table(_path, progress_callback=_progress_callback))
+    store.replay_batches()
+    return store
+
+
+def get_transaction_store(source, file_type: Optional[str] = None,
+                          progress_callback: Optional[Callable[[int, Optional[int]], None]] = None) -> TransactionStore:
+    """
+    Lấy TransactionStore dùng chung cho file nguồn (đường dẫn, thư mục/glob
+    nhiều file cùng cấu trúc, hoặc file object).
+
+    progress_callback(số dòng đã đọc, tổng số dòng hoặc None) chỉ được gọi khi
+    phải parse workbook Excel lần đầu.
+    """
+    path = resolve_source_path(source)
+    if path is None:
+        # File object chỉ có trong bộ nhớ: không có khóa ổn định để chia sẻ
+        return TransactionStore(None, parse_source(source, file_type, progress_callback))
+    return _load_store(source_fingerprint(path), path, progress_callback)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Chạy pytest từ thư mục gốc: các module được import như khi chạy ứng dụng Streamlit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from model.budget_solver import allocate_bounded, allocate_bounded_batch, feasible_bounds
+
+
+def bisection_reference(weights, total, lower, upper, iterations=200):
+    """Nghiệm tham chiếu: tìm λ bằng chia đôi sao cho sum(clip(λ·w, lower, upper)) = total"""
+    w = np.asarray(weights, dtype='float64')
+    lo, hi = 0.0, 1.0
+    while np.clip(hi * w, lower, upper).sum() < total:
+        hi *= 2
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        if np.clip(mid * w, lower, upper).sum() < total:
+            lo = mid
+        else:
+            hi = mid
+    return np.clip(hi * w, lower, upper)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_bisection_reference(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(2, 30))
+    weights = rng.lognormal(size=n)
+    lower = float(rng.uniform(0, 100))
+    upper = lower + float(rng.uniform(1, 500))
+    total = float(rng.uniform(n * lower, n * upper))
+
+    allocation = allocate_bounded(weights, total, lower, upper)
+
+    assert allocation.sum() == pytest.approx(total, rel=1e-12)
+    assert (allocation >= lower - 1e-9).all() and (allocation <= upper + 1e-9).all()
+    np.testing.assert_allclose(allocation, bisection_reference(weights, total, lower, upper), rtol=1e-7, atol=1e-6)
+
+
+def test_batch_matches_single_scenarios():
+    weights = np.array([5.0, 1.0, 0.0, 3.0, 8.0])
+    totals, lowers, uppers = [1000.0, 400.0, 2500.0], [50.0, 0.0, 100.0], [400.0, 200.0, 600.0]
+
+    batch = allocate_bounded_batch(weights, totals, lowers, uppers)
+
+    for row, args in zip(batch, zip(totals, lowers, uppers)):
+        np.testing.assert_allclose(row, allocate_bounded(weights, *args))
+        np.testing.assert_allclose(row, bisection_reference(weights, *args), rtol=1e-7, atol=1e-6)
+
+
+def test_proportional_when_bounds_inactive():
+    weights = np.array([1.0, 2.0, 3.0, 4.0])
+    np.testing.assert_allclose(allocate_bounded(weights, 100.0, 0.0, 1000.0), [10.0, 20.0, 30.0, 40.0])
+
+
+def test_infeasible_bounds_raise():
+    with pytest.raises(ValueError):
+        allocate_bounded([1.0, 1.0], 100.0, 60.0, 80.0)
+    with pytest.raises(ValueError):
+        allocate_bounded([1.0, 1.0], 100.0, 10.0, 40.0)
+
+
+def test_feasible_bounds_relaxes_to_nearest_feasible():
+    assert feasible_bounds(4, 1000.0, 300.0, 500.0) == (1000.0, 250.0, 500.0)
+    assert feasible_bounds(4, 1000.0, 10.0, 100.0) == (400.0, 10.0, 100.0)
+    assert feasible_bounds(4, 1000.0, 200.0, 100.0) == (800.0, 200.0, 200.0)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.revenue_cube import CUBE_MEASURES, RevenueCube
+
+
+@pytest.fixture
+def transactions():
+    rng = np.random.default_rng(7)
+    n = 400
+    invoice = rng.integers(0, 120, size=n)
+    # Mỗi hóa đơn thuộc một quốc gia và một thời điểm
+    countries = np.array(['France', 'Germany', 'Spain'])[invoice % 3]
+    dates = pd.Timestamp('2011-01-14') + pd.to_timedelta(invoice * 1.7, unit='D') + pd.to_timedelta(invoice % 5, unit='h')
+    quantity = rng.integers(1, 20, size=n)
+    price = rng.uniform(0.5, 10, size=n).round(2)
+    return pd.DataFrame({
+        'InvoiceNo': pd.Series(invoice).astype(str),
+        'Country': pd.Categorical(countries),
+        'InvoiceDate': dates,
+        'Quantity': quantity,
+        'Revenue': quantity * price,
+    })
+
+
+def expected_daily(df):
+    grouped = df.assign(Day=df['InvoiceDate'].dt.normalize()).groupby(['Country', 'Day'], observed=True)
+    return grouped.agg(Revenue=('Revenue', 'sum'), Orders=('InvoiceNo', 'nunique'),
+                       Quantity=('Quantity', 'sum'), Lines=('Revenue', 'size'))
+
+
+def cube_daily(cube):
+    rows = []
+    for measure in CUBE_MEASURES:
+        frame = pd.DataFrame(cube.measures[measure], index=cube.countries, columns=pd.DatetimeIndex(cube.days, name='Day'))
+        rows.append(frame.stack().rename(measure))
+    daily = pd.concat(rows, axis=1)
+    return daily[daily['Lines'] > 0]
+
+
+def assert_cube_matches(cube, df):
+    expected = expected_daily(df)
+    actual = cube_daily(cube).reindex(expected.index)
+    for measure in CUBE_MEASURES:
+        np.testing.assert_allclose(actual[measure].to_numpy(dtype='float64'), expected[measure].to_numpy(dtype='float64'))
+    assert cube_daily(cube)['Lines'].sum() == len(df)
+
+
+def test_from_frame_matches_groupby(transactions):
+    cube = RevenueCube.from_frame(transactions)
+    assert list(cube.countries) == ['France', 'Germany', 'Spain']
+    assert_cube_matches(cube, transactions)
+
+
+def test_merged_matches_cube_of_concatenation(transactions):
+    # Tách theo hóa đơn: không hóa đơn nào có dòng ở cả hai phần
+    first = transactions[transactions['InvoiceNo'].astype(int) < 70]
+    second = transactions[transactions['InvoiceNo'].astype(int) >= 70]
+    second = second[second['Country'] != 'Spain']
+
+    merged = RevenueCube.from_frame(first).merged(RevenueCube.from_frame(second))
+
+    assert_cube_matches(merged, pd.concat([first, second]))
+
+
+def test_monthly_matches_groupby(transactions):
+    cube = RevenueCube.from_frame(transactions)
+    month_index = transactions['InvoiceDate'].dt.year * 12 + transactions['InvoiceDate'].dt.month
+    expected = (transactions.assign(MonthIndex=month_index)
+                .pivot_table(index='MonthIndex', columns='Country', values='Revenue', aggfunc='sum', observed=True)
+                .reindex(cube.month_index(), fill_value=0).fillna(0))
+
+    monthly = cube.monthly('Revenue')
+
+    assert list(monthly.index) == list(cube.month_index())
+    np.testing.assert_allclose(monthly[expected.columns].to_numpy(), expected.to_numpy())
+
+
+def test_monthly_of_slice_covers_only_sliced_days(transactions):
+    cube = RevenueCube.from_frame(transactions).slice(['Germany', 'Italy'], start='2011-03-10', end='2011-05-20')
+    rows = transactions[(transactions['Country'] == 'Germany')
+                        & (transactions['InvoiceDate'] >= '2011-03-10')
+                        & (transactions['InvoiceDate'] < '2011-05-21')]
+
+    monthly = cube.monthly('Revenue')
+
+    assert list(monthly.columns) == ['Germany', 'Italy']
+    assert monthly['Germany'].sum() == pytest.approx(rows['Revenue'].sum())
+    assert (monthly['Italy'] == 0).all()
+
+
+def test_complete_months(transactions):
+    cube = RevenueCube.from_frame(transactions).slice(start='2011-02-01', end='2011-04-15')
+    month_index = cube.month_index()
+    expected = []
+    for index in month_index:
+        year, month = divmod(int(index) - 1, 12)
+        first = pd.Timestamp(year=year, month=month + 1, day=1)
+        last = first + pd.offsets.MonthEnd(0)
+        expected.append(first >= pd.Timestamp(cube.start_day) and last <= pd.Timestamp(cube.days[-1]))
+
+    assert list(month_index) == [2011 * 12 + 2, 2011 * 12 + 3, 2011 * 12 + 4]
+    assert list(cube.complete_months()) == expected == [True, True, False]
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from model import disk_cache, shared_columns
+from model.category_index import CategoryIndex
+from model.transaction_store import TransactionStore
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """View, cột memory-map và lô đã ghép được ghi vào thư mục tạm của test"""
+    monkeypatch.setattr(disk_cache.DATASET_CACHE, 'directory', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(shared_columns.COLUMN_CACHE, 'directory', str(tmp_path / 'columns'))
+    monkeypatch.setattr(disk_cache.APPENDED_BATCHES, 'directory', str(tmp_path / 'batches'))
+
+
+def make_lines(first_invoice, n_invoices, start, seed):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for offset in range(n_invoices):
+        invoice = first_invoice + offset
+        date = pd.Timestamp(start) + pd.Timedelta(hours=7 * offset)
+        country = ['France', 'germany ', 'Spain', 'France'][invoice % 4]
+        customer = None if invoice % 9 == 0 else float(12000 + invoice % 23)
+        # Mã sản phẩm khác nhau trong một hóa đơn: dữ liệu mẫu không có dòng trùng hoàn toàn
+        for product in rng.choice(12, size=int(rng.integers(1, 5)), replace=False):
+            code = f"P{int(product):02d}"
+            rows.append({
+                'InvoiceNo': str(invoice),
+                'StockCode': code,
+                'Description': f"ITEM {code}",
+                'Quantity': int(rng.choice([-2, 1, 3, 6, 12])),
+                'InvoiceDate': date,
+                'UnitPrice': float(rng.choice([0.0, 0.85, 1.65, 2.95])),
+                'CustomerID': customer,
+                'Country': country,
+            })
+    frame = pd.DataFrame(rows)
+    for column in ('InvoiceNo', 'StockCode', 'Description', 'Country'):
+        frame[column] = frame[column].astype('category')
+    return frame
+
+
+@pytest.fixture
+def lines():
+    base = make_lines(1000, 150, '2011-01-03', seed=1)
+    # Hóa đơn cuối của base có thêm dòng trong lô mới; lô có cả các dòng gửi lại
+    split = base[base['InvoiceNo'] == '1149'].copy()
+    split['StockCode'] = split['StockCode'].astype(str) + 'X'
+    batch = pd.concat([base.tail(5), split, make_lines(1150, 60, '2011-02-20', seed=2)], ignore_index=True)
+    for column in ('InvoiceNo', 'StockCode', 'Description', 'Country'):
+        batch[column] = batch[column].astype('category')
+    full = pd.concat([base, batch.iloc[5:]], ignore_index=True)
+    for column in ('InvoiceNo', 'StockCode', 'Description', 'Country'):
+        full[column] = full[column].astype('category')
+    return base, batch, full
+
+
+def build_everything(store):
+    for name in ('clean', 'revenue'):
+        store.view(name)
+        store.revenue_cube(name)
+        store.category_index(name, 'Country')
+    store.revenue_cube('clean', ('P01',))
+    store.customer_totals()
+    store.product_month_totals()
+
+
+def assert_same_store(actual, expected):
+    for name in ('all', 'clean', 'revenue'):
+        left, right = actual.view(name), expected.view(name)
+        assert list(left.index) == list(right.index)
+        pd.testing.assert_frame_equal(left.astype(str), right[left.columns].astype(str))
+    for name, excluded in (('clean', ()), ('revenue', ()), ('clean', ('P01',))):
+        left, right = actual.revenue_cube(name, excluded), expected.revenue_cube(name, excluded)
+        assert list(left.countries) == list(right.countries)
+        assert left.start_day == right.start_day
+        for measure, values in right.measures.items():
+            np.testing.assert_allclose(left.measures[measure], values, err_msg=f"{name} {measure}")
+    for name in ('clean', 'revenue'):
+        for country in expected.view(name)['Country'].dropna().unique():
+            np.testing.assert_array_equal(np.sort(actual.category_index(name, 'Country').positions_of([country])),
+                                          np.sort(expected.category_index(name, 'Country').positions_of([country])))
+    for totals in ('customer_totals', 'product_month_totals'):
+        pd.testing.assert_frame_equal(getattr(actual, totals)().sort_index(), getattr(expected, totals)().sort_index(),
+                                      check_dtype=False, check_index_type=False, check_categorical=False)
+
+
+def test_category_index_positions_match_row_scan():
+    values = pd.Series(pd.Categorical(['b', 'a', None, 'c', 'a', 'b', 'a']))
+    index = CategoryIndex(values)
+    index.append(pd.Series(['c', 'a', 'd']))
+
+    everything = pd.concat([values.astype(object), pd.Series(['c', 'a', 'd'])], ignore_index=True)
+    for wanted in (['a'], ['a', 'd'], ['c', 'x'], []):
+        expected = np.flatnonzero(everything.isin(wanted).to_numpy())
+        np.testing.assert_array_equal(np.sort(index.positions_of(wanted)), expected)
+        np.testing.assert_array_equal(np.sort(index.positions_of(wanted, 2, 8)), expected[(expected >= 2) & (expected < 8)])
+    assert index.n_segments == 2
+    assert index.mask(['a'], 1, 5).tolist() == [True, False, False, True]
+
+
+def test_append_matches_full_rebuild(lines):
+    base, batch, full = lines
+    store = TransactionStore('base', base.copy())
+    build_everything(store)
+
+    summary = store.append(batch.copy())
+
+    assert summary == {'rows_received': len(batch), 'rows_appended': len(batch) - 5, 'duplicates_skipped': 5}
+    assert_same_store(store, TransactionStore('full', full.copy()))
+
+
+def test_appended_batches_are_replayed_after_reload(lines):
+    base, batch, full = lines
+    store = TransactionStore('base', base.copy())
+    store.append(batch.copy())
+
+    reloaded = TransactionStore('base', base.copy())
+    reloaded.replay_batches()
+
+    assert reloaded.fingerprint == store.fingerprint
+    assert len(reloaded.frame) == len(full)
+    assert_same_store(reloaded, TransactionStore('full', full.copy()))
+    assert reloaded.append(batch.copy())['rows_appended'] == 0
+
+
+def test_duplicate_lines_dropped_on_load(lines):
+    base, _, _ = lines
+    with_duplicates = pd.concat([base, base.iloc[10:20]], ignore_index=True)
+    for column in ('InvoiceNo', 'StockCode', 'Description', 'Country'):
+        with_duplicates[column] = with_duplicates[column].astype('category')
+
+    store = TransactionStore(None, with_duplicates)
+
+    assert store.duplicate_lines == 10
+    assert len(store.frame) == len(base)
+    assert store.cleaning_report('clean')['rejected']['duplicate_line'] == 10
+    assert store.cleaning_report('clean')['rows_in'] == len(with_duplicates)
@@ -4,6 +4,15 @@ import plotly.graph_objects as go
 import numpy as np
 from typing import Any, Dict, List
 
+from model.classification_rules import classify, classify_value
+
+# Định hướng chiến lược theo độ nhạy cảm DOL
+STRATEGIC_FOCUS = {
+    'Cao': "Tăng trưởng mạnh - Mở rộng thị phần, quảng cáo tích cực",
+    'Trung bình': "Cân bằng - Kết hợp giữ chân KH cũ và mở rộng mới",
+    'Thấp': "Bền vững - Marketing tiết kiệm, tập trung giá trị cốt lõi",
+}
+
 class DolView:
     """View for DOL (Degree of Operating Leverage) analysis interface"""
     
@@ -32,7 +41,11 @@ class DolView:
         """Render input page header"""
         st.header("Nhập thông tin để tính DOL")
     
-    def render_input_form(self, available_products: List[str], available_years: List[int]) -> Dict[str, Any]:
+    def render_loading_progress(self, progress: float, status: str):
+        """Render data loading progress while the model loads in the background"""
+        st.progress(min(max(progress, 0.0), 1.0), text=f"⏳ {status}")
+    
+    def render_input_form(self, available_products: List[str], available_years: List[int], loading: bool = False) -> Dict[str, Any]:
         """Render input form and return collected data"""
         # Create three columns for better layout
         col1, col2, col3 = st.columns(3)
@@ -78,7 +91,10 @@ class DolView:
                 )
             else:
                 selected_year = None
-                st.warning("Không có dữ liệu theo năm")
+                if loading:
+                    st.info("Đang tải danh sách năm...")
+                else:
+                    st.warning("Không có dữ liệu theo năm")
         
         with col3:
             st.subheader("Chọn sản phẩm")
@@ -104,7 +120,9 @@ class DolView:
                     index=0
                 )
             else:
-                if search_term:
+                if loading:
+                    st.info("Đang tải danh sách sản phẩm...")
+                elif search_term:
                     st.warning("Không tìm thấy sản phẩm nào phù hợp.")
                 else:
                     st.warning("Không có sản phẩm nào.")
@@ -118,9 +136,9 @@ class DolView:
             'product_code': product_code
         }
     
-    def render_calculate_button(self) -> bool:
+    def render_calculate_button(self, loading: bool = False) -> bool:
         """Render calculate button and return if clicked"""
-        disabled = 'uploaded_data_path' not in st.session_state or not st.session_state['uploaded_data_path']
+        disabled = loading or 'uploaded_data_path' not in st.session_state or not st.session_state['uploaded_data_path']
         return st.button("Tính DOL", type="primary", use_container_width=True, disabled=disabled)
     
     def render_results_header(self):
@@ -163,28 +181,21 @@ class DolView:
         elif '2' in time_period:
             months_to_show = 2
         
-        # Create table data
+        # Create table data (sensitivity for all months in one rule-table pass)
+        months = np.arange(1, months_to_show + 1)
+        dol_values = base_dol * (1 + (months - 1) * 0.1)
+        sensitivities = classify({'DOL': dol_values}, 'dol_sensitivity')
         table_data = []
-        for month in range(1, months_to_show + 1):
+        for month, dol_value, sensitivity in zip(months.tolist(), dol_values.tolist(), sensitivities):
             time_text = f"{month} tháng tới"
-            dol_value = base_dol * (1 + (month - 1) * 0.1)
-            sensitivity = self._get_sensitivity_level(dol_value)
             comparison = self._get_comparison_text(month, dol_value, model, product_code, variable_cost, fixed_cost, selected_year)
             
-            # Get strategic focus based on DOL
-            if dol_value > 0.5:
-                analysis = "Tăng trưởng mạnh - Mở rộng thị phần, quảng cáo tích cực"
-            elif dol_value == 0.5:
-                analysis = "Cân bằng - Kết hợp giữ chân KH cũ và mở rộng mới"
-            else:
-                analysis = "Bền vững - Marketing tiết kiệm, tập trung giá trị cốt lõi"
-            
             table_data.append({
                 "Thời gian": time_text,
                 "DOL": f"{dol_value:.2f}",
                 "Độ nhạy cảm": sensitivity,
                 "So với tháng gần nhất": comparison,
-                "Định hướng chiến lược": analysis
+                "Định hướng chiến lược": STRATEGIC_FOCUS[sensitivity]
             })
         
         # Display table
@@ -295,12 +306,7 @@ class DolView:
     
     def _get_sensitivity_level(self, dol_value: float) -> str:
         """Determine sensitivity level based on DOL value"""
-        if dol_value > 0.5:
-            return "Cao"
-        elif dol_value == 0.5:
-            return "Trung bình"
-        else:
-            return "Thấp"
+        return classify_value('dol_sensitivity', DOL=dol_value)
     
     def _get_comparison_text(self, month: int, dol_value: float, model: Any, product_code: str, variable_cost: float, fixed_cost: float, selected_year: int) -> str:
         """Get comparison text by comparing with actual DOL from previous month"""
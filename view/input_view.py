@@ -3,6 +3,8 @@ from tkinter import ttk, messagebox
 import pandas as pd
 import os
 
+from model.snapshot_cache import read_header, read_table
+
 class DOLInputView:
     def __init__(self, parent, controller):
         self.parent = parent
@@ -140,8 +142,11 @@ class DOLInputView:
             excel_path = r"C:\Users\PC\Documents\DSS_MVC\online_retail.xlsx"
             
             if os.path.exists(excel_path):
-                # Read the Excel file
-                df = pd.read_excel(excel_path)
+                # Chỉ đọc các cột cần thiết; workbook được chuyển sang cache dạng cột
+                # ở lần đầu nên các lần mở sau gần như tức thì
+                header = read_header(excel_path)
+                columns = [col for col in ('StockCode', 'Description') if col in header]
+                df = read_table(excel_path, columns=columns or None)
                 
                 # Get unique products with both StockCode and Description
                 if 'StockCode' in df.columns:
@@ -153,9 +158,9 @@ class DOLInputView:
                         # Get unique combinations of StockCode and Description
                         unique_products = df[['StockCode', 'Description']].drop_duplicates()
                         
-                        for _, row in unique_products.iterrows():
-                            stock_code = str(row['StockCode']) if not pd.isna(row['StockCode']) else ""
-                            description = str(row['Description']) if not pd.isna(row['Description']) else ""
+                        for code, desc in zip(unique_products['StockCode'], unique_products['Description']):
+                            stock_code = str(code) if not pd.isna(code) else ""
+                            description = str(desc) if not pd.isna(desc) else ""
                             
                             # Create display text
                             display_text = f"{stock_code} - {description[:50]}{'...' if len(description) > 50 else ''}"
@@ -7,6 +7,8 @@ matplotlib.use('TkAgg')
 import numpy as np
 from typing import Dict, Any, List
 
+from model.classification_rules import classify, classify_value
+
 class DOLResultsView:
     def __init__(self, parent, controller, results_data: Dict[str, Any]):
         self.parent = parent
@@ -164,11 +166,11 @@ class DOLResultsView:
         """Generate table data based on results and selected months"""
         data = []
         base_dol = self.results_data.get('dol', 0)
-        months_to_show = self.get_selected_months()
-        for month in range(1, months_to_show + 1):
+        months = np.arange(1, self.get_selected_months() + 1)
+        dol_values = base_dol * (1 + (months - 1) * 0.1)
+        sensitivities = classify({'DOL': dol_values}, 'dol_sensitivity_report')
+        for month, dol_value, sensitivity in zip(months.tolist(), dol_values.tolist(), sensitivities):
             time_text = f"{month} tháng tới"
-            dol_value = base_dol * (1 + (month - 1) * 0.1)
-            sensitivity = self.get_sensitivity_level(dol_value)
             comparison = self.get_comparison_text(month, dol_value)
             analysis_ref = f"Xem phân tích tháng {month}"
             data.append([time_text, f"{dol_value:.2f}", sensitivity, comparison, analysis_ref])
@@ -176,12 +178,7 @@ class DOLResultsView:
     
     def get_sensitivity_level(self, dol_value: float) -> str:
         """Determine sensitivity level based on DOL value"""
-        if dol_value > 2.0:
-            return "Cao"
-        elif dol_value >= 1.2:
-            return "Trung bình"
-        else:
-            return "Thấp"
+        return classify_value('dol_sensitivity_report', DOL=dol_value)
     
     def get_comparison_text(self, month: int, dol_value: float) -> str:
         """Get comparison text for the period"""
@@ -4,6 +4,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 
+from model.cleaning import describe_rejections
+from model.horizon_metrics import STANDARD_HORIZONS
+
 class UIComponents:
     """View class chứa tất cả UI components và layout"""
     
@@ -157,6 +160,7 @@ class UIComponents:
                     <h4>🌍 {country}</h4>
                     <p><strong>Doanh thu:</strong> ${country_info['Total_Revenue']:,.0f}</p>
                     <p><strong>Đơn hàng:</strong> {country_info['Order_Count']:,}</p>
+                    <p><strong>Khách hàng:</strong> {country_info['Customer_Count']:,}</p>
                 </div>
                 """, unsafe_allow_html=True)
     
@@ -585,6 +589,148 @@ class UIComponents:
                 "text/csv"
             )
 
+    @staticmethod
+    def display_product_budget_table(product_budgets):
+        """Hiển thị ngân sách của từng sản phẩm top theo bậc trong mỗi quốc gia"""
+        if len(product_budgets) == 0:
+            return
+        st.markdown("## 🛍️ Phân Bổ Ngân Sách Theo Sản Phẩm")
+        st.markdown("*Ngân sách thực của mỗi quốc gia được chia cho sản phẩm chủ lực, tiềm năng và đa dạng hóa*")
+        
+        tier_labels = {'core': 'Chủ lực', 'growth': 'Tiềm năng', 'diversify': 'Đa dạng hóa'}
+        display_df = product_budgets[['Country', 'Rank', 'StockCode', 'Description', 'Tier', 'Tier_Percentage',
+                                      'Total_Revenue', 'Product_Budget']].copy()
+        display_df['Tier'] = display_df['Tier'].map(tier_labels)
+        display_df.columns = ['Quốc Gia', 'Hạng', 'Mã SP', 'Sản Phẩm', 'Bậc', 'Tỷ Trọng Bậc (%)',
+                              'Doanh Thu ($)', 'Ngân Sách Sản Phẩm ($)']
+        display_df['Tỷ Trọng Bậc (%)'] = display_df['Tỷ Trọng Bậc (%)'].apply(lambda x: f"{x:.1f}%")
+        display_df['Doanh Thu ($)'] = display_df['Doanh Thu ($)'].apply(lambda x: f"${x:,.0f}")
+        display_df['Ngân Sách Sản Phẩm ($)'] = display_df['Ngân Sách Sản Phẩm ($)'].apply(lambda x: f"${x:,.0f}")
+        st.dataframe(display_df, use_container_width=True, hide_index=True)
+    
+    @staticmethod
+    def display_horizon_comparison(horizon_df, time_frame_months):
+        """Hiển thị điểm và doanh thu của các quốc gia đã chọn theo mọi khung thời gian cạnh nhau"""
+        if len(horizon_df) == 0:
+            return
+        with st.expander("🔭 So sánh các khung thời gian", expanded=False):
+            st.markdown(f"*Khung đang chọn: {time_frame_months} tháng. Mỗi khung gồm các tháng trọn vẹn tính lùi từ tháng mới nhất*")
+            
+            fig = px.line(
+                horizon_df, x='Horizon_Months', y='Overall_Score', color='Country', markers=True,
+                title="Điểm tổng hợp theo khung thời gian",
+                labels={'Horizon_Months': 'Khung thời gian (tháng)', 'Overall_Score': 'Điểm tổng hợp', 'Country': 'Quốc gia'}
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            metrics = {
+                'Overall_Score': ('Điểm', lambda x: f"{x:.1f}"),
+                'Avg_Monthly_Revenue': ('Doanh thu/tháng', lambda x: f"${x:,.0f}"),
+                'Avg_Orders_Per_Month': ('Đơn/tháng', lambda x: f"{x:,.1f}"),
+                'Half_Period_Growth': ('Tăng trưởng nửa kỳ', lambda x: "-" if pd.isna(x) else f"{x:+.1f}%"),
+            }
+            display_df = horizon_df.pivot(index='Country', columns='Horizon_Months', values=list(metrics))
+            display_df = display_df.sort_values(('Overall_Score', time_frame_months), ascending=False) \
+                if ('Overall_Score', time_frame_months) in display_df.columns else display_df
+            for metric, (_, fmt) in metrics.items():
+                display_df[metric] = display_df[metric].map(fmt)
+            display_df.columns = [f"{metrics[metric][0]} ({horizon}T)" for metric, horizon in display_df.columns]
+            display_df.index.name = 'Quốc Gia'
+            st.dataframe(display_df, use_container_width=True)
+    
+    @staticmethod
+    def display_risk_simulation(risk_df):
+        """Hiển thị phân phối lợi nhuận mô phỏng theo quốc gia và cả danh mục"""
+        st.markdown("## 🎲 Mô Phỏng Rủi Ro Lợi Nhuận")
+        st.markdown("*Bootstrap doanh thu tháng lịch sử: khoảng P5–P95 của lợi nhuận và rủi ro sụt giảm*")
+        
+        portfolio = risk_df.iloc[-1]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Lợi nhuận P5", f"${portfolio['P5_Profit']:,.0f}")
+        col2.metric("Lợi nhuận P50", f"${portfolio['P50_Profit']:,.0f}")
+        col3.metric("Xác suất lỗ", f"{portfolio['Loss_Probability']:.1f}%")
+        col4.metric("CVaR 5%", f"${portfolio['CVaR_5']:,.0f}")
+        
+        countries = risk_df.iloc[:-1]
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=countries['Country'],
+            y=countries['P50_Profit'],
+            mode='markers',
+            marker=dict(size=12, color='#1f77b4'),
+            error_y=dict(
+                type='data', symmetric=False,
+                array=countries['P95_Profit'] - countries['P50_Profit'],
+                arrayminus=countries['P50_Profit'] - countries['P5_Profit']
+            ),
+            name='P50 (P5–P95)'
+        ))
+        fig.add_trace(go.Scatter(
+            x=countries['Country'],
+            y=countries['Expected_Profit'],
+            mode='markers',
+            marker=dict(size=10, symbol='diamond', color='#ff7f0e'),
+            name='Lợi nhuận dự kiến'
+        ))
+        fig.update_layout(
+            title="Khoảng lợi nhuận mô phỏng theo quốc gia",
+            xaxis_title="Quốc gia",
+            yaxis_title="Lợi nhuận ($)",
+            height=450
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        
+        display_df = risk_df.copy()
+        display_df.columns = [
+            'Quốc Gia', 'Ngân Sách ($)', 'Lợi Nhuận Dự Kiến ($)', 'P5 ($)', 'P50 ($)', 'P95 ($)',
+            'Xác Suất Lỗ (%)', 'Xác Suất Hụt Dự Kiến (%)', 'CVaR 5% ($)'
+        ]
+        for col in ['Ngân Sách ($)', 'Lợi Nhuận Dự Kiến ($)', 'P5 ($)', 'P50 ($)', 'P95 ($)', 'CVaR 5% ($)']:
+            display_df[col] = display_df[col].apply(lambda x: f"${x:,.0f}")
+        for col in ['Xác Suất Lỗ (%)', 'Xác Suất Hụt Dự Kiến (%)']:
+            display_df[col] = display_df[col].apply(lambda x: f"{x:.1f}%")
+        st.dataframe(display_df, use_container_width=True, hide_index=True)
+    
+    @staticmethod
+    def display_scenario_results(scenario_df, total_scenarios):
+        """Hiển thị bảng và biểu đồ độ nhạy phân bổ theo các kịch bản"""
+        solved = scenario_df['Scenario'].nunique()
+        if solved < total_scenarios:
+            st.warning(f"⚠️ Bỏ qua {total_scenarios - solved}/{total_scenarios} kịch bản có ràng buộc min/max không thể thỏa mãn")
+        if solved == 0:
+            return
+        
+        # Biểu đồ độ nhạy: ngân sách từng quốc gia theo tổng ngân sách, mỗi ô là một cặp ràng buộc
+        chart_df = scenario_df.drop_duplicates(['Total_Budget', 'Min_Per_Country', 'Max_Per_Country', 'Country']).copy()
+        chart_df['Ràng buộc'] = (
+            "$" + chart_df['Min_Per_Country'].map('{:,.0f}'.format) +
+            " – $" + chart_df['Max_Per_Country'].map('{:,.0f}'.format)
+        )
+        fig = px.line(
+            chart_df.sort_values('Total_Budget'),
+            x='Total_Budget', y='Allocated_Budget', color='Country',
+            facet_col='Ràng buộc', facet_col_wrap=2, markers=True,
+            labels={'Total_Budget': 'Tổng ngân sách ($)', 'Allocated_Budget': 'Ngân sách phân bổ ($)', 'Country': 'Quốc gia'},
+            title="Độ nhạy phân bổ theo tổng ngân sách"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Bảng tóm tắt: mỗi kịch bản một dòng, mỗi quốc gia một cột
+        summary = scenario_df.pivot_table(
+            index=['Scenario', 'Total_Budget', 'Expected_ROI', 'Min_Per_Country', 'Max_Per_Country'],
+            columns='Country', values='Allocated_Budget', observed=True
+        ).round(0).reset_index()
+        summary.insert(5, 'Expected_Profit', summary['Total_Budget'] * summary['Expected_ROI'] / 100)
+        st.dataframe(summary, use_container_width=True, hide_index=True)
+        
+        st.download_button(
+            "🧪 Tải Kết Quả Kịch Bản (CSV)",
+            scenario_df.to_csv(index=False),
+            f"budget_scenarios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            "text/csv"
+        )
+    
     @staticmethod
     def _parse_ai_content(content):
         """Parse nội dung AI thành các phần riêng biệt"""
@@ -745,7 +891,7 @@ class UIComponents:
         if not logic_lines:
             logic_lines = [
                 "• Dựa trên phân tích historical data và trend patterns",
-                "• Áp dụng mô hình 30-10-60 đã được validate trong industry",
+                "• Áp dụng mô hình phân bổ theo bậc sản phẩm đã cấu hình",
                 "• Tận dụng seasonal patterns và country-specific behaviors",
                 "• Sử dụng predictive analytics cho resource allocation",
                 "• Kết hợp market intelligence với performance metrics",
@@ -770,7 +916,7 @@ class MainPanelComponents:
         with col2:
             time_frame = st.selectbox(
                 "Khung thời gian phân tích:",
-                [3, 6, 9, 12, 18, 24],
+                list(STANDARD_HORIZONS),
                 index=1,
                 format_func=lambda x: f"{x} tháng gần nhất",
                 help="Hệ thống sẽ phân tích dữ liệu trong khoảng thời gian này"
@@ -780,6 +926,23 @@ class MainPanelComponents:
             
         return time_frame
     
+    @staticmethod
+    def display_memory_usage(memory_report):
+        """Hiển thị bộ nhớ của dataset trước và sau khi tối ưu kiểu dữ liệu"""
+        before_mb = memory_report['before'] / 1024 ** 2
+        after_mb = memory_report['after'] / 1024 ** 2
+        ratio = memory_report['before'] / memory_report['after'] if memory_report['after'] else 0
+        st.caption(f"💾 Bộ nhớ dữ liệu: {after_mb:,.1f} MB (trước tối ưu kiểu dữ liệu: {before_mb:,.1f} MB, giảm {ratio:.1f}x)")
+    
+    @staticmethod
+    def display_cleaning_report(cleaning_report):
+        """Hiển thị số dòng bị loại theo từng quy tắc làm sạch"""
+        rows_in = cleaning_report['rows_in']
+        rows_out = cleaning_report['rows_out']
+        with st.expander(f"🧹 Làm sạch dữ liệu: giữ {rows_out:,}/{rows_in:,} dòng", expanded=False):
+            st.dataframe(describe_rejections(cleaning_report), use_container_width=True, hide_index=True)
+            st.caption("Một dòng có thể vi phạm nhiều quy tắc cùng lúc.")
+    
     @staticmethod
     def display_exclusion_lists(available_countries):
         """Hiển thị danh sách loại trừ trong main panel"""
@@ -891,6 +1054,74 @@ class MainPanelComponents:
         
         return min_per_country, max_per_country
     
+    @staticmethod
+    def display_product_tier_weights():
+        """Tỷ trọng ngân sách (%) cho các bậc sản phẩm trong mỗi quốc gia"""
+        with st.expander("🛍️ Tỷ trọng ngân sách theo bậc sản phẩm", expanded=False):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                core = st.number_input("Chủ lực (%):", min_value=0.0, max_value=100.0, value=30.0, step=5.0,
+                                       help="Sản phẩm doanh thu cao nhất của quốc gia")
+            with col2:
+                growth = st.number_input("Tiềm năng (%):", min_value=0.0, max_value=100.0, value=10.0, step=5.0,
+                                         help="Sản phẩm xếp hạng thứ hai")
+            with col3:
+                diversify = st.number_input("Đa dạng hóa (%):", min_value=0.0, max_value=100.0, value=60.0, step=5.0,
+                                            help="Các sản phẩm top còn lại")
+            total = core + growth + diversify
+            if total > 0 and abs(total - 100) > 1e-9:
+                st.info(f"ℹ️ Tổng tỷ trọng là {total:.0f}%, sẽ được chuẩn hóa về 100%")
+        return {'core': core, 'growth': growth, 'diversify': diversify}
+    
+    @staticmethod
+    def _parse_number_list(label, text):
+        """Đọc danh sách số cách nhau bởi dấu phẩy (bỏ trùng, giữ thứ tự)"""
+        values = []
+        for part in text.replace(';', ',').split(','):
+            part = part.strip().replace('$', '').replace('_', '')
+            if not part:
+                continue
+            try:
+                value = float(part)
+            except ValueError:
+                st.error(f"❌ {label}: '{part}' không phải là số")
+                return None
+            if value not in values:
+                values.append(value)
+        if not values:
+            st.error(f"❌ {label}: cần ít nhất một giá trị")
+            return None
+        return values
+    
+    @staticmethod
+    def display_scenario_grid_parameters(total_budget, expected_roi, min_per_country, max_per_country):
+        """Nhập danh sách giá trị cho lưới kịch bản; trả về None nếu chưa hợp lệ"""
+        st.markdown("---")
+        st.markdown("### 🧪 Phân Tích Kịch Bản Ngân Sách")
+        st.markdown("*Mọi tổ hợp giá trị được phân bổ cùng lúc trên kết quả phân tích quốc gia đã có*")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            budgets = st.text_input(
+                "Tổng ngân sách ($):",
+                value=", ".join(f"{total_budget * factor:.0f}" for factor in (0.5, 0.75, 1, 1.25, 1.5)),
+                help="Các giá trị cách nhau bởi dấu phẩy"
+            )
+            mins = st.text_input("Ngân sách tối thiểu mỗi quốc gia ($):", value=f"{min_per_country:.0f}")
+        with col2:
+            rois = st.text_input("ROI mong muốn (%):", value=f"{expected_roi:g}")
+            maxs = st.text_input("Ngân sách tối đa mỗi quốc gia ($):", value=f"{max_per_country:.0f}")
+        
+        grid = [
+            MainPanelComponents._parse_number_list("Tổng ngân sách", budgets),
+            MainPanelComponents._parse_number_list("ROI", rois),
+            MainPanelComponents._parse_number_list("Ngân sách tối thiểu", mins),
+            MainPanelComponents._parse_number_list("Ngân sách tối đa", maxs),
+        ]
+        if any(values is None for values in grid):
+            return None
+        return grid
+    
     @staticmethod
     def display_analyze_button():
         """Hiển thị nút phân tích trong main panel"""